@@ -1,25 +1,20 @@
 import json
+import asyncio
 from Functions.functions import read_file, write_file, list_folder, handle_path
-from LLM_interface.query_llm import query_llm
-from LLM_interface.preprocess import preprocess_prompt_with_functions
+# Settings come from the shared config loader, read once at import in LLM_interface.config
+from LLM_interface.query_llm import API_URL, MODEL_NAME, preprocess_prompt_with_functions, query_llm_text
+from LLM_interface.llm_client import close_client
 import logging
 
-
-# Load configuration
-CONFIG_PATH = "LLM_interface/config.json"
-try:
-    with open(CONFIG_PATH, "r") as config_file:
-        config = json.load(config_file)
-except FileNotFoundError:
-    raise Exception(f"Configuration file not found at {CONFIG_PATH}")
-
-# Model and API settings
-MODEL_NAME = config.get("model_name", "llama3.1:70b")
-API_URL = config.get("api_url", "http://localhost:11434/api/generate")
-
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+async def _query_once(prompt):
+    """
+    Each asyncio.run gets a new event loop, and the shared client's pooled connections belong
+    to the loop that opened them, so the client is closed before this loop ends.
+    """
+    try:
+        return await query_llm_text(API_URL, MODEL_NAME, prompt)
+    finally:
+        await close_client()
 
 def llm_decision(user_prompt: str):
     """
@@ -32,7 +27,7 @@ def llm_decision(user_prompt: str):
         str: The output of the chosen function or a general text response.
     """
     enriched_prompt = preprocess_prompt_with_functions(user_prompt)
-    llm_response = query_llm(API_URL, MODEL_NAME, enriched_prompt, stream=False)
+    llm_response = asyncio.run(_query_once(enriched_prompt))
 
     try:
         # Try to parse the response as JSON
@@ -44,17 +39,16 @@ def llm_decision(user_prompt: str):
 
         if function_name == "handle_path":
             path = parameters.get("path")
-            action_response = handle_path(path)
+            action_response = handle_path(path, API_URL, MODEL_NAME)
+            action = action_response["function"][0]
+            action_param = action_response["parameters"][0]
 
-            if "action" in action_response:
-                if action_response["action"] == "read_file":
-                    return read_file(action_response["path"])
-                elif action_response["action"] == "list_folder":
-                    return list_folder(action_response["path"])
-                else:
-                    return "Error: Unknown action from handle_path."
+            if action == "read_file":
+                return read_file(**action_param)
+            elif action == "list_folder":
+                return list_folder(**action_param)
             else:
-                return action_response.get("error", "Error: Invalid response from handle_path.")
+                return action_param.get("error_message", "Error: Invalid response from handle_path.")
         elif function_name == "read_file":
             return read_file(**parameters)
         elif function_name == "write_file":
@@ -0,0 +1,161 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from LLM_interface.config import get_setting
+from LLM_interface.embeddings import EMBED_MODEL, embed_text
+from LLM_interface.metrics import CallbackMetric, Counter
+from Functions.decision_cache import normalize_prompt
+
+ANSWER_CACHE_ENABLED = get_setting("answer_cache_enabled", "ANSWER_CACHE_ENABLED", True,
+                                   lambda v: str(v).lower() in ("1", "true", "yes"))
+ANSWER_CACHE_DIR = get_setting("answer_cache_dir", "ANSWER_CACHE_DIR", ".cache/answers")
+# Cosine similarity a cached question needs to be served for a new one
+ANSWER_CACHE_THRESHOLD = get_setting("answer_cache_threshold", "ANSWER_CACHE_THRESHOLD", 0.92, float)
+ANSWER_CACHE_TTL = get_setting("answer_cache_ttl", "ANSWER_CACHE_TTL", 86400.0, float)
+ANSWER_CACHE_MAX_ENTRIES = get_setting("answer_cache_max_entries", "ANSWER_CACHE_MAX_ENTRIES", 5000, int)
+# Longer prompts carry their own context (file contents, retrieved excerpts) and are not cached
+ANSWER_CACHE_MAX_QUESTION_CHARS = get_setting("answer_cache_max_question_chars", "ANSWER_CACHE_MAX_QUESTION_CHARS", 2000, int)
+
+ANSWER_CACHE_LOOKUPS = Counter("answer_cache_lookups_total", "Semantic answer cache lookups by model and outcome.")
+
+
+class AnswerCache:
+    """
+    Semantic cache of rendered general_question answers. Questions are embedded and stored in a
+    VectorIndex under "<model>#<question hash>", so each model is its own namespace and a
+    paraphrase of a cached question finds it by cosine similarity. Entries expire after ttl
+    and the least recently used ones are evicted beyond max_entries.
+    """
+
+    def __init__(self, directory=ANSWER_CACHE_DIR, embed_model=EMBED_MODEL, threshold=ANSWER_CACHE_THRESHOLD,
+                 ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        from LLM_interface.vector_index import VectorIndex
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index = VectorIndex(os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", embed_model)))
+        # key -> stored_at (wall clock, so entries survive restarts), least recently used first
+        self.entries = OrderedDict(sorted(
+            ((key, float(self.index.version(key) or 0)) for key in self.index.keys()), key=lambda item: item[1]
+        ))
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(question, model):
+        digest = hashlib.sha1(normalize_prompt(question).lower().encode("utf-8")).hexdigest()
+        return f"{model}#{digest}"
+
+    def cacheable(self, question):
+        return 0 < len(question) <= ANSWER_CACHE_MAX_QUESTION_CHARS
+
+    async def lookup(self, question, model, api_url=None):
+        """
+        Returns (html, embedding). html is the cached answer of the most similar question above
+        the threshold, or None; the embedding is passed back to store() on a miss.
+        """
+        try:
+            vector = await embed_text(normalize_prompt(question), api_url, self.embed_model)
+        except Exception as e:
+            ANSWER_CACHE_LOOKUPS.inc(model=model, outcome="error")
+            logging.warning(f"AnswerCache: Could not embed question, skipping cache: {e}")
+            return None, None
+        hits = await asyncio.to_thread(self.index.search, vector, 1, f"{model}#", self.threshold)
+        if hits:
+            score, key, payload = hits[0]
+            with self.lock:
+                stored_at = self.entries.get(key)
+                expired = stored_at is None or time.time() - stored_at > self.ttl
+                if not expired:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+            if not expired:
+                ANSWER_CACHE_LOOKUPS.inc(model=model, outcome="hit")
+                logging.info(f"AnswerCache: Hit for model {model} (similarity {score:.3f}).")
+                return payload["html"], vector
+            await self._delete(key)
+            ANSWER_CACHE_LOOKUPS.inc(model=model, outcome="expired")
+        with self.lock:
+            self.misses += 1
+        ANSWER_CACHE_LOOKUPS.inc(model=model, outcome="miss")
+        return None, vector
+
+    async def store(self, question, model, vector, html):
+        if vector is None or not html or self.max_entries <= 0:
+            return
+        key = self.make_key(question, model)
+        stored_at = time.time()
+        payload = {"question": question, "model": model, "html": html}
+        await asyncio.to_thread(self.index.add, key, [vector], [payload], str(stored_at))
+        with self.lock:
+            self.entries[key] = stored_at
+            self.entries.move_to_end(key)
+            evicted = []
+            while len(self.entries) > self.max_entries:
+                evicted.append(self.entries.popitem(last=False)[0])
+                self.evictions += 1
+        for old_key in evicted:
+            await asyncio.to_thread(self.index.delete, old_key)
+
+    async def _delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+        await asyncio.to_thread(self.index.delete, key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        self.index.clear()
+
+    def entries_by_model(self):
+        with self.lock:
+            counts = {}
+            for key in self.entries:
+                model = key.rsplit("#", 1)[0]
+                counts[model] = counts.get(model, 0) + 1
+            return counts
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": ANSWER_CACHE_ENABLED,
+                "size": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+        return _answer_cache
+
+
+answer_cache_entries = CallbackMetric(
+    "answer_cache_entries", "Answers currently cached per model.",
+    lambda: [({"model": model}, count) for model, count in (_answer_cache.entries_by_model() if _answer_cache else {}).items()],
+)
+answer_cache_hit_ratio = CallbackMetric(
+    "answer_cache_hit_ratio", "Share of answer cache lookups served from the cache.",
+    lambda: [] if _answer_cache is None else _answer_cache.stats()["hit_rate"],
+)
@@ -0,0 +1,183 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from LLM_interface.config import get_setting
+from LLM_interface.metrics import CallbackMetric
+
+CONTENT_INDEX_PATH = get_setting("content_index_path", "CONTENT_INDEX_PATH", ".cache/content_index.sqlite3")
+CONTENT_INDEX_MAX_BYTES = get_setting("content_index_max_bytes", "CONTENT_INDEX_MAX_BYTES", 256 * 1024 * 1024, int)
+CONTENT_INDEX_VERIFY_HASH = get_setting("content_index_verify_hash", "CONTENT_INDEX_VERIFY_HASH", False,
+                                        lambda v: str(v).lower() in ("1", "true", "yes"))
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ContentIndex:
+    """
+    On-disk cache of extracted file text, keyed by path and validated by mtime, size and optionally a hash.
+    Entries are evicted least-recently-used first once the stored text exceeds max_bytes.
+    """
+
+    def __init__(self, db_path=CONTENT_INDEX_PATH, max_bytes=CONTENT_INDEX_MAX_BYTES, verify_hash=CONTENT_INDEX_VERIFY_HASH):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.verify_hash = verify_hash
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha1 TEXT,
+                content TEXT NOT NULL,
+                content_bytes INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_last_access ON files(last_access)")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                path TEXT NOT NULL,
+                model TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                summary TEXT NOT NULL,
+                PRIMARY KEY (path, model)
+            )
+            """
+        )
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(content_bytes), 0) FROM files").fetchone()[0]
+        logging.info(f"ContentIndex: Opened {db_path} ({self.total_bytes} bytes indexed).")
+
+    def lookup(self, path: str, stat_result=None):
+        """
+        Returns the indexed text for path if the file is unchanged, otherwise None.
+        """
+        stat_result = stat_result or os.stat(path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT mtime_ns, size, sha1, content FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        if (row is None or row[0] != stat_result.st_mtime_ns or row[1] != stat_result.st_size
+                or (self.verify_hash and row[2] != file_hash(path))):
+            self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+            self.conn.execute("UPDATE files SET last_access = ? WHERE path = ?", (time.time(), path))
+            self.conn.commit()
+        return row[3]
+
+    def store(self, path: str, content: str, stat_result=None):
+        stat_result = stat_result or os.stat(path)
+        sha1 = file_hash(path) if self.verify_hash else None
+        content_bytes = len(content.encode("utf-8"))
+        if content_bytes > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.conn.execute("SELECT content_bytes FROM files WHERE path = ?", (path,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, sha1, content, content_bytes, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, stat_result.st_mtime_ns, stat_result.st_size, sha1, content, content_bytes, time.time()),
+            )
+            self.total_bytes += content_bytes - (previous[0] if previous else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT path, content_bytes FROM files ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for path, content_bytes in rows:
+                self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                self.conn.execute("DELETE FROM summaries WHERE path = ?", (path,))
+                self.total_bytes -= content_bytes
+                if self.total_bytes <= self.max_bytes:
+                    break
+            logging.info(f"ContentIndex: Evicted entries, {self.total_bytes} bytes remain.")
+
+    def lookup_summary(self, path: str, model: str, mtime_ns: int, size: int):
+        """
+        Returns the cached summary of this exact file version produced by model, otherwise None.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT mtime_ns, size, summary FROM summaries WHERE path = ? AND model = ?", (path, model)
+            ).fetchone()
+        if row is None or row[0] != mtime_ns or row[1] != size:
+            return None
+        return row[2]
+
+    def store_summary(self, path: str, model: str, mtime_ns: int, size: int, summary: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries (path, model, mtime_ns, size, summary) VALUES (?, ?, ?, ?, ?)",
+                (path, model, mtime_ns, size, summary),
+            )
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_content_index = None
+_content_index_lock = threading.Lock()
+
+
+def get_content_index():
+    global _content_index
+    with _content_index_lock:
+        if _content_index is None:
+            _content_index = ContentIndex()
+        return _content_index
+
+
+def _index_stats(*keys):
+    # Scrapes must not open the index as a side effect
+    if _content_index is None:
+        return []
+    stats = _content_index.stats()
+    return [({"kind": key}, stats[key]) for key in keys]
+
+
+content_index_lookups = CallbackMetric(
+    "content_index_lookups_total", "Content index lookups by result.", lambda: _index_stats("hits", "misses"), kind="counter"
+)
+content_index_size = CallbackMetric(
+    "content_index_size", "Content index entries and stored bytes.", lambda: _index_stats("entries", "bytes")
+)
@@ -0,0 +1,131 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from LLM_interface.config import get_setting
+from LLM_interface.metrics import CallbackMetric
+
+DECISION_CACHE_SIZE = get_setting("decision_cache_size", "DECISION_CACHE_SIZE", 512, int)
+DECISION_CACHE_TTL = get_setting("decision_cache_ttl", "DECISION_CACHE_TTL", 600.0, float)
+
+# "read X" / "list Y" style prompts that can be answered without asking the model
+READ_PATTERN = re.compile(r"^(?:read|open|show|cat|view|display)\s+(?:the\s+)?(?:file\s+)?(?P<path>.+)$", re.IGNORECASE)
+LIST_PATTERN = re.compile(r"^(?:list|ls|tree|explain|describe)\s+(?:the\s+)?(?:folder\s+|directory\s+|dir\s+|project\s+)?(?P<path>.+)$", re.IGNORECASE)
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split())
+
+
+def _clean_path(text: str) -> str:
+    return os.path.expanduser(text.strip().strip("'\"`").rstrip("?.!"))
+
+
+def fast_route(user_prompt: str):
+    """
+    Resolves obvious file/folder prompts locally.
+    Returns a decision dict in the same shape the LLM produces, or None if the model is needed.
+    """
+    prompt = normalize_prompt(user_prompt)
+    if not prompt:
+        return None
+
+    path = _clean_path(prompt)
+    if os.path.isabs(path) and os.path.exists(path):
+        logging.info(f"fast_route: Bare path prompt routed to handle_path: {path}")
+        return {"function": ["handle_path"], "parameters": [{"path": path}]}
+
+    match = READ_PATTERN.match(prompt)
+    if match:
+        path = _clean_path(match.group("path"))
+        if os.path.isfile(path):
+            logging.info(f"fast_route: Prompt routed to read_file: {path}")
+            return {"function": ["read_file"], "parameters": [{"path": path}]}
+
+    match = LIST_PATTERN.match(prompt)
+    if match:
+        path = _clean_path(match.group("path"))
+        if os.path.isdir(path):
+            logging.info(f"fast_route: Prompt routed to list_folder: {path}")
+            return {"function": ["list_folder"], "parameters": [{"path": path}]}
+
+    return None
+
+
+class DecisionCache:
+    """
+    LRU cache with a TTL for parsed LLM decisions, keyed on (normalized prompt, model name).
+    """
+
+    def __init__(self, max_entries=DECISION_CACHE_SIZE, ttl=DECISION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fast_path_hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(user_prompt: str, model_name: str):
+        return (normalize_prompt(user_prompt), model_name)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                stored_at, decision = entry
+                if time.monotonic() - stored_at <= self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return decision
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, decision):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic(), decision)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_fast_path(self):
+        with self.lock:
+            self.fast_path_hits += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fast_path_hits": self.fast_path_hits,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+decision_cache = DecisionCache()
+decision_cache_metrics = CallbackMetric(
+    "decision_cache_events_total",
+    "Decision cache lookups by outcome.",
+    lambda: [({"outcome": outcome}, decision_cache.stats()[outcome]) for outcome in ("hits", "misses", "fast_path_hits", "evictions")],
+    kind="counter",
+)
+decision_cache_size = CallbackMetric(
+    "decision_cache_entries", "Decisions currently cached.", lambda: decision_cache.stats()["size"]
+)
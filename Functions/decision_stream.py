@@ -0,0 +1,226 @@
+import json
+from LLM_interface.query_llm import AVAILABLE_FUNCTIONS
+
+DECISION_KEYS = ("function", "parameters")
+# Parameters each of AVAILABLE_FUNCTIONS cannot run without
+REQUIRED_PARAMETERS = {
+    "handle_path": ("path",),
+    "read_file": ("path",),
+    "write_file": ("path", "content"),
+    "list_folder": ("path",),
+    "folder_question": ("path", "question"),
+    "general_question": ("general_question",),
+}
+
+
+class InvalidDecision(ValueError):
+    pass
+
+
+def validate_step(func, param):
+    """
+    Returns why a step does not match the AVAILABLE_FUNCTIONS schema, or None if it does.
+    """
+    if func not in AVAILABLE_FUNCTIONS:
+        return f"unknown function {func!r}"
+    if not isinstance(param, dict):
+        return f"parameters of {func} are not an object"
+    for name in REQUIRED_PARAMETERS.get(func, ()):
+        if not isinstance(param.get(name), str) or (name == "path" and not param[name].strip()):
+            return f"{func} is missing {name!r}"
+    return None
+
+
+def validate_decision(decision):
+    """
+    Raises InvalidDecision unless every step names a known function with its required parameters.
+    """
+    if not isinstance(decision, dict):
+        raise InvalidDecision("the decision is not an object")
+    functions = decision.get("function", [])
+    parameters = decision.get("parameters", [])
+    if isinstance(functions, str):
+        functions = [functions]
+    if isinstance(parameters, dict):
+        parameters = [parameters]
+    if not isinstance(functions, list) or not isinstance(parameters, list) or not functions:
+        raise InvalidDecision("the decision has no function list")
+    if len(functions) != len(parameters):
+        raise InvalidDecision("functions and parameters differ in length")
+    for func, param in zip(functions, parameters):
+        reason = validate_step(func, param)
+        if reason is not None:
+            raise InvalidDecision(reason)
+
+
+class DecisionStreamParser:
+    """
+    Incremental scanner for the decision object streamed by the model.
+
+    Text before the first '{' (prose, code fences) is skipped. Every element of the top-level
+    "function" and "parameters" arrays is reported as soon as its closing character arrives,
+    and `complete` turns True when the top-level object closes, so generation can be stopped.
+    A scalar "function" or an object "parameters" is reported as element 0, matching how
+    llm_decision normalizes them.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.started = False
+        self.complete = False
+        self.object_start = None
+        self.object_end = None
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        # Top-level key/value tracking
+        self.expect_key = False
+        self.string_start = None
+        self.current_key = None
+        self.value_start = None
+        self.value_is_array = False
+        self.element_start = None
+        self.element_index = 0
+        self.values = {key: [] for key in DECISION_KEYS}
+
+    @property
+    def raw(self):
+        return self.text
+
+    def feed(self, chunk: str):
+        """
+        Consumes more model output and returns the newly completed (key, index, value) elements.
+        """
+        events = []
+        if self.complete or not chunk:
+            return events
+        self.text += chunk
+        text = self.text
+        i = self.position
+        length = len(text)
+
+        while i < length and not self.complete:
+            char = text[i]
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.object_start = i
+                    self.depth = 1
+                    self.expect_key = True
+                i += 1
+                continue
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    self._string_closed(i, events)
+                i += 1
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = i
+                self._value_begins(i)
+            elif char in "{[":
+                self._value_begins(i)
+                self.depth += 1
+                if self.depth == 2 and char == "[" and self.current_key is not None:
+                    self.value_is_array = True
+            elif char in "}]":
+                if self.depth == 2 and self.value_is_array:
+                    self._close_scalar(i, events)
+                self.depth -= 1
+                if self.depth == 0:
+                    self._close_scalar(i, events)
+                    self.complete = True
+                    self.object_end = i + 1
+                elif self.depth == 1:
+                    self._container_closed(i, events)
+                elif self.depth == 2 and self.value_is_array and self.element_start is not None:
+                    self._emit_element(self.element_start, i + 1, events)
+            elif char == ",":
+                if self.depth == 1:
+                    self._close_scalar(i, events)
+                    self.expect_key = True
+                    self.current_key = None
+                elif self.depth == 2 and self.value_is_array:
+                    self._close_scalar(i, events)
+            elif char == ":" and self.depth == 1:
+                self.expect_key = False
+            elif not char.isspace():
+                self._value_begins(i)
+            i += 1
+
+        self.position = i
+        return events
+
+    def _value_begins(self, i):
+        if self.depth == 1 and not self.expect_key and self.value_start is None:
+            self.value_start = i
+            self.value_is_array = False
+            self.element_index = 0
+            self.element_start = None
+        elif self.depth == 2 and self.value_is_array and self.element_start is None:
+            self.element_start = i
+
+    def _string_closed(self, i, events):
+        if self.depth == 1 and self.expect_key:
+            self.current_key = json.loads(self.text[self.string_start:i + 1])
+            self.value_start = None
+        elif self.depth == 1 and self.value_start is not None:
+            self._emit_value(self.value_start, i + 1, events)
+        elif self.depth == 2 and self.value_is_array and self.element_start == self.string_start:
+            self._emit_element(self.element_start, i + 1, events)
+
+    def _container_closed(self, i, events):
+        """
+        A container directly under the top-level object closed: either a whole array value
+        (its elements were already reported) or an object value such as a single parameters dict.
+        """
+        if self.value_start is None:
+            return
+        if not self.value_is_array:
+            self._emit_value(self.value_start, i + 1, events)
+        self.value_start = None
+        self.value_is_array = False
+
+    def _close_scalar(self, i, events):
+        """
+        Bare literals (numbers, true/false/null) end at the next ',' or closing bracket.
+        """
+        if self.depth == 2 and self.value_is_array and self.element_start is not None:
+            self._emit_element(self.element_start, i, events)
+        elif self.depth <= 1 and self.value_start is not None and not self.value_is_array:
+            self._emit_value(self.value_start, i, events)
+
+    def _emit_value(self, start, end, events):
+        # A whole non-array value: reported once as element 0
+        if self.value_start is None:
+            return
+        self.value_start = None
+        if self.current_key in self.values and not self.values[self.current_key]:
+            value = json.loads(self.text[start:end])
+            self.values[self.current_key].append(value)
+            events.append((self.current_key, 0, value))
+
+    def _emit_element(self, start, end, events):
+        self.element_start = None
+        if self.current_key in self.values:
+            value = json.loads(self.text[start:end])
+            self.values[self.current_key].append(value)
+            events.append((self.current_key, self.element_index, value))
+        self.element_index += 1
+
+    def decision(self):
+        """
+        Returns the complete decision object, raising json.JSONDecodeError like json.loads would
+        if the model never produced one.
+        """
+        if not self.complete:
+            return json.loads(self.text)
+        return json.loads(self.text[self.object_start:self.object_end])
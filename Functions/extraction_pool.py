@@ -0,0 +1,255 @@
+import os
+import time
+import logging
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from LLM_interface.config import get_setting
+from Functions.extractors import extract_text
+
+EXTRACTION_WORKERS = get_setting("extraction_workers", "EXTRACTION_WORKERS", os.cpu_count() or 2, int)
+EXTRACTION_TIMEOUT = get_setting("extraction_timeout", "EXTRACTION_TIMEOUT", 60.0, float)
+
+# How often a caller checks whether its queued tasks have started in a worker
+START_POLL_SECONDS = 0.5
+
+_executor = None
+_executor_lock = threading.Lock()
+# Workers report (task id, wall-clock start) here, so timeouts count running time only
+_starts = None
+_started = {}
+_watched = set()
+_starts_lock = threading.Lock()
+_task_ids = itertools.count()
+_worker_starts = None
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+def get_executor():
+    """
+    Returns the shared extraction pool. Workers are spawned (not forked) so they
+    never inherit the server's threads, sockets or SQLite handles.
+    """
+    global _executor, _starts
+    with _executor_lock:
+        if _executor is None:
+            context = multiprocessing.get_context("spawn")
+            # Written synchronously, so a start is recorded even if the parser then crashes the worker.
+            # A fresh queue per pool: a worker killed mid-write can leave the old one unusable.
+            starts = context.SimpleQueue()
+            _executor = ProcessPoolExecutor(
+                max_workers=EXTRACTION_WORKERS,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(starts,),
+            )
+            with _starts_lock:
+                _starts = starts
+            logging.info(f"get_executor: Started extraction pool with {EXTRACTION_WORKERS} workers.")
+        return _executor
+
+
+def _init_worker(starts):
+    global _worker_starts
+    _worker_starts = starts
+
+
+def _run_task(task_id, func, *args):
+    _worker_starts.put((task_id, time.time()))
+    return func(*args)
+
+
+def _submit(executor, func, *args):
+    """
+    Submits func(*args) and returns (future, task id); the task reports when a worker starts it.
+    """
+    task_id = next(_task_ids)
+    with _starts_lock:
+        _watched.add(task_id)
+    try:
+        return executor.submit(_run_task, task_id, func, *args), task_id
+    except BaseException:
+        _forget(task_id)
+        raise
+
+
+def _started_at(task_id):
+    """
+    Wall-clock time a worker started the task, or None while it is still queued behind other callers' work.
+    """
+    with _starts_lock:
+        while _starts is not None:
+            try:
+                if _starts.empty():
+                    break
+                started_id, started = _starts.get()
+            except (EOFError, OSError, ValueError):
+                break
+            if started_id in _watched:
+                _started[started_id] = started
+        return _started.get(task_id)
+
+
+def _forget(task_id):
+    with _starts_lock:
+        _watched.discard(task_id)
+        _started.pop(task_id, None)
+
+
+def _recycle_executor(executor):
+    """
+    Kills every worker of a pool that holds a hung extraction and lets the next caller start a fresh one.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    if hasattr(executor, "terminate_workers"):
+        executor.terminate_workers()
+        return
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    logging.warning(f"_recycle_executor: Terminated {len(processes)} extraction workers.")
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_many(paths, timeout=EXTRACTION_TIMEOUT):
+    """
+    Extracts documents on the process pool and yields (path, text, error) as each one finishes.
+    At most one file per worker is in flight, and the per-file timeout starts when a worker picks
+    the file up, so time spent queued behind other requests' files does not count. Only a file
+    that has really run past the timeout recycles the pool. Closing the generator cancels
+    everything that has not finished.
+    """
+    pending = list(reversed(paths))
+    running = {}
+    retried = set()
+    executor = get_executor()
+
+    def submit(path):
+        nonlocal executor
+        try:
+            future, task_id = _submit(executor, extract_text, path)
+        except (BrokenProcessPool, RuntimeError):
+            # The pool died or was shut down since we last looked at it
+            _recycle_executor(executor)
+            executor = get_executor()
+            future, task_id = _submit(executor, extract_text, path)
+        running[future] = (path, task_id)
+
+    try:
+        while pending and len(running) < EXTRACTION_WORKERS:
+            submit(pending.pop())
+
+        while running:
+            starts = [_started_at(task_id) for _, task_id in running.values()]
+            wait_seconds = START_POLL_SECONDS
+            if all(started is not None for started in starts):
+                wait_seconds = max(0.0, min(starts) + timeout - time.time())
+            else:
+                known = [started for started in starts if started is not None]
+                if known:
+                    wait_seconds = max(0.0, min(wait_seconds, min(known) + timeout - time.time()))
+            done, _ = wait(list(running), timeout=wait_seconds, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                path, task_id = running.pop(future)
+                started = _started_at(task_id)
+                _forget(task_id)
+                try:
+                    yield path, future.result(), None
+                except BrokenProcessPool as e:
+                    # Another caller recycled the pool under us. A file that never started is simply
+                    # resubmitted; one that was running is retried once on the new pool.
+                    if started is None:
+                        pending.append(path)
+                    elif path in retried:
+                        yield path, None, e
+                    else:
+                        retried.add(path)
+                        pending.append(path)
+                except Exception as e:
+                    yield path, None, e
+
+            now = time.time()
+            expired = []
+            for future, (_, task_id) in running.items():
+                started = _started_at(task_id)
+                if started is not None and now - started >= timeout:
+                    expired.append(future)
+            if expired:
+                for future in expired:
+                    path, task_id = running.pop(future)
+                    _forget(task_id)
+                    logging.warning(f"extract_many: Extraction of {path} ran past {timeout}s, cancelling.")
+                    yield path, None, ExtractionTimeout(f"Extraction timed out after {timeout:.0f}s")
+                # A running task cannot be interrupted, so the workers are replaced and the survivors resubmitted
+                survivors = [path for path, _ in running.values()]
+                for _, task_id in running.values():
+                    _forget(task_id)
+                running.clear()
+                _recycle_executor(executor)
+                executor = get_executor()
+                pending.extend(reversed(survivors))
+
+            if running or pending:
+                executor = get_executor()
+            while pending and len(running) < EXTRACTION_WORKERS:
+                submit(pending.pop())
+    finally:
+        for future, (_, task_id) in running.items():
+            future.cancel()
+            _forget(task_id)
+
+
+def extract_one(path, timeout=EXTRACTION_TIMEOUT):
+    """
+    Extracts a single document on the pool, raising ExtractionTimeout if it takes too long.
+    """
+    for _, text, error in extract_many([path], timeout=timeout):
+        if error is not None:
+            raise error
+        return text
+
+
+def run_on_pool(func, *args, timeout=EXTRACTION_TIMEOUT):
+    """
+    Runs another module-level parsing function (such as a document preview) on the pool with
+    the same timeout handling as extract_one: the timeout counts from when a worker starts it.
+    """
+    executor = get_executor()
+    try:
+        future, task_id = _submit(executor, func, *args)
+    except (BrokenProcessPool, RuntimeError):
+        _recycle_executor(executor)
+        executor = get_executor()
+        future, task_id = _submit(executor, func, *args)
+    try:
+        while True:
+            started = _started_at(task_id)
+            wait_seconds = START_POLL_SECONDS if started is None else max(0.0, started + timeout - time.time())
+            done, _ = wait([future], timeout=wait_seconds)
+            if done:
+                return future.result()
+            started = _started_at(task_id)
+            if started is not None and time.time() - started >= timeout:
+                logging.warning(f"run_on_pool: {func.__name__} ran past {timeout}s, cancelling.")
+                _recycle_executor(executor)
+                raise ExtractionTimeout(f"Extraction timed out after {timeout:.0f}s")
+    finally:
+        future.cancel()
+        _forget(task_id)
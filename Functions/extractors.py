@@ -0,0 +1,40 @@
+import os
+
+TEXT_EXTENSIONS = {'.txt', '.py', '.js', '.html', '.md'}
+DOCUMENT_EXTENSIONS = {'.pdf', '.docx'}
+
+
+def is_supported(file_path: str) -> bool:
+    _, ext = os.path.splitext(file_path)
+    ext = ext.lower()
+    return ext in TEXT_EXTENSIONS or ext in DOCUMENT_EXTENSIONS
+
+
+def is_document(file_path: str) -> bool:
+    """
+    True for formats whose extraction is CPU-bound and belongs on the extraction pool.
+    """
+    _, ext = os.path.splitext(file_path)
+    return ext.lower() in DOCUMENT_EXTENSIONS
+
+
+def extract_text(file_path: str):
+    """
+    Extracts the text of a supported file. Returns None for unsupported types; read errors propagate.
+    """
+    _, ext = os.path.splitext(file_path)
+    ext = ext.lower()
+    if ext == '.pdf':
+        # Parsers are imported on first use; most requests never see a document
+        from PyPDF2 import PdfReader
+        with open(file_path, 'rb') as f:
+            reader = PdfReader(f)
+            return "\n".join(page.extract_text() for page in reader.pages if page.extract_text())
+    elif ext in TEXT_EXTENSIONS:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+    elif ext == '.docx':
+        from docx import Document
+        d = Document(file_path)
+        return "\n".join(paragraph.text for paragraph in d.paragraphs)
+    return None
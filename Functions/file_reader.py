@@ -0,0 +1,230 @@
+import os
+import mmap
+import logging
+from LLM_interface.config import get_setting
+from Functions.extractors import TEXT_EXTENSIONS
+
+# Files up to this size are returned whole by read_file; larger ones get a preview
+READ_FILE_MAX_BYTES = get_setting("read_file_max_bytes", "READ_FILE_MAX_BYTES", 2 * 1024 * 1024, int)
+# Documents are parsed whole up to this size, above it only the previewed pages are
+READ_DOCUMENT_MAX_BYTES = get_setting("read_document_max_bytes", "READ_DOCUMENT_MAX_BYTES", 20 * 1024 * 1024, int)
+READ_BLOCK_BYTES = get_setting("read_block_bytes", "READ_BLOCK_BYTES", 1024 * 1024, int)
+READ_PREVIEW_BYTES = get_setting("read_preview_bytes", "READ_PREVIEW_BYTES", 32 * 1024, int)
+READ_PREVIEW_SAMPLES = get_setting("read_preview_samples", "READ_PREVIEW_SAMPLES", 8, int)
+
+# Logs and data files are readable too, but never indexed or walked by list_folder
+READ_TEXT_EXTENSIONS = TEXT_EXTENSIONS | {".log", ".csv", ".json", ".jsonl"}
+PREVIEW_MODES = ("head", "tail", "sample")
+
+
+def file_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        return "pdf"
+    if ext == ".docx":
+        return "docx"
+    if ext in READ_TEXT_EXTENSIONS:
+        return "text"
+    return None
+
+
+def sample_ranges(size, window, count):
+    """
+    Returns count evenly spaced (start, stop) byte ranges of length window covering [0, size).
+    """
+    if count <= 1 or size <= window * count:
+        return [(0, min(size, window * max(count, 1)))]
+    step = (size - window) / (count - 1)
+    return [(int(i * step), int(i * step) + window) for i in range(count)]
+
+
+def _decode_window(mapped, start, stop):
+    """
+    Decodes mapped[start:stop], moved inward to line boundaries where the window has one.
+    """
+    if start > 0:
+        newline = mapped.find(b"\n", start, stop)
+        if newline != -1:
+            start = newline + 1
+    if stop < len(mapped):
+        newline = mapped.rfind(b"\n", start, stop)
+        if newline > start:
+            stop = newline + 1
+    return mapped[start:stop].decode("utf-8", errors="replace")
+
+
+def _mapped(f):
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_text_blocks(path, block_bytes=READ_BLOCK_BYTES):
+    """
+    Yields a text file as decoded blocks of about block_bytes, split at line ends. The file is
+    memory-mapped, so only the block being decoded is held in memory.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with _mapped(f) as mapped:
+            position = 0
+            while position < size:
+                stop = min(position + block_bytes, size)
+                if stop < size:
+                    newline = mapped.rfind(b"\n", position, stop)
+                    if newline >= position:
+                        stop = newline + 1
+                yield mapped[position:stop].decode("utf-8", errors="replace")
+                position = stop
+
+
+def iter_pdf_pages(path, pages=None):
+    """
+    Yields (page number, text) for the given 0-based page numbers, or for every page.
+    """
+    from PyPDF2 import PdfReader
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        for number in (range(len(reader.pages)) if pages is None else pages):
+            yield number, reader.pages[number].extract_text() or ""
+
+
+def pdf_page_count(path):
+    from PyPDF2 import PdfReader
+    with open(path, "rb") as f:
+        return len(PdfReader(f).pages)
+
+
+def docx_text(path):
+    from docx import Document
+    return "\n".join(paragraph.text for paragraph in Document(path).paragraphs)
+
+
+def iter_blocks(path, block_chars=READ_BLOCK_BYTES):
+    """
+    Streams any readable file as text blocks: byte blocks for text, pages grouped up to
+    block_chars for PDFs, paragraphs for DOCX (which python-docx loads whole anyway).
+    """
+    kind = file_kind(path)
+    if kind == "text":
+        yield from iter_text_blocks(path, block_chars)
+    elif kind == "pdf":
+        block = []
+        length = 0
+        for _, text in iter_pdf_pages(path):
+            block.append(text)
+            length += len(text)
+            if length >= block_chars:
+                yield "\n".join(block)
+                block, length = [], 0
+        if block:
+            yield "\n".join(block)
+    elif kind == "docx":
+        text = docx_text(path)
+        for start in range(0, len(text), block_chars):
+            yield text[start:start + block_chars]
+
+
+def iter_chunks(path, chunk_chars, max_chunks):
+    """
+    Like iter_blocks, but never more than max_chunks chunks: a file too long for that is
+    covered by evenly spaced samples instead, each labelled with where it came from.
+    """
+    kind = file_kind(path)
+    if kind == "text":
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= chunk_chars * max_chunks:
+                yield from iter_text_blocks(path, chunk_chars)
+                return
+            with _mapped(f) as mapped:
+                for start, stop in sample_ranges(size, chunk_chars, max_chunks):
+                    yield f"[bytes {start}-{stop} of {size}]\n" + _decode_window(mapped, start, stop)
+    elif kind == "pdf":
+        count = pdf_page_count(path)
+        pages = sorted({int(i * count / max_chunks) for i in range(max_chunks)}) if count > max_chunks else None
+        for number, text in iter_pdf_pages(path, pages):
+            label = f"[page {number + 1} of {count}]\n" if pages is not None else ""
+            yield label + text[:chunk_chars]
+    elif kind == "docx":
+        text = docx_text(path)
+        for start, stop in sample_ranges(len(text), chunk_chars, max_chunks):
+            yield text[start:stop]
+
+
+def document_chunks(path, chunk_chars, max_chunks):
+    """
+    iter_chunks of a PDF or DOCX as a list, at most max_chunks chunks of chunk_chars.
+    Module level so document parsing can run on the extraction pool with its timeout.
+    """
+    return list(iter_chunks(path, chunk_chars, max_chunks))
+
+
+def text_preview(path, mode="head", max_bytes=READ_PREVIEW_BYTES, samples=READ_PREVIEW_SAMPLES):
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ""
+        with _mapped(f) as mapped:
+            if size <= max_bytes:
+                return mapped[:].decode("utf-8", errors="replace")
+            if mode == "tail":
+                return _decode_window(mapped, size - max_bytes, size)
+            if mode == "sample":
+                window = max(1, max_bytes // samples)
+                return "\n...\n".join(
+                    f"[bytes {start}-{stop} of {size}]\n" + _decode_window(mapped, start, stop)
+                    for start, stop in sample_ranges(size, window, samples)
+                )
+            return _decode_window(mapped, 0, max_bytes)
+
+
+def pdf_preview(path, mode="head", max_chars=READ_PREVIEW_BYTES, samples=READ_PREVIEW_SAMPLES):
+    """
+    Extracts only the pages the preview needs: the first or last pages up to max_chars, or
+    evenly spaced pages for a sample.
+    """
+    count = pdf_page_count(path)
+    if mode == "sample":
+        pages = sorted({int(i * count / samples) for i in range(min(samples, count))})
+        per_page = max(1, max_chars // max(1, len(pages)))
+        return "\n...\n".join(
+            f"[page {number + 1} of {count}]\n{text[:per_page]}" for number, text in iter_pdf_pages(path, pages)
+        )
+    order = range(count - 1, -1, -1) if mode == "tail" else range(count)
+    parts = []
+    length = 0
+    for _, text in iter_pdf_pages(path, order):
+        parts.append(text[:max_chars - length])
+        length += len(parts[-1])
+        if length >= max_chars:
+            break
+    if mode == "tail":
+        parts.reverse()
+    return "\n".join(parts)
+
+
+def preview(path, mode="head", max_bytes=READ_PREVIEW_BYTES):
+    """
+    Returns the head, the tail or evenly spaced samples of a file, at most about max_bytes.
+    Module level so it can run on the extraction pool.
+    """
+    if mode not in PREVIEW_MODES:
+        raise ValueError(f"Unknown preview mode '{mode}', expected one of {', '.join(PREVIEW_MODES)}.")
+    kind = file_kind(path)
+    logging.info(f"preview: {mode} of {path} ({kind}).")
+    if kind == "text":
+        return text_preview(path, mode, max_bytes)
+    if kind == "pdf":
+        return pdf_preview(path, mode, max_bytes)
+    if kind == "docx":
+        text = docx_text(path)
+        if len(text) <= max_bytes:
+            return text
+        if mode == "tail":
+            return text[-max_bytes:]
+        if mode == "sample":
+            window = max(1, max_bytes // READ_PREVIEW_SAMPLES)
+            return "\n...\n".join(text[start:stop] for start, stop in sample_ranges(len(text), window, READ_PREVIEW_SAMPLES))
+        return text[:max_bytes]
+    return None
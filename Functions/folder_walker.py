@@ -0,0 +1,220 @@
+import os
+import re
+import time
+import logging
+from html import escape
+from LLM_interface.config import get_setting
+
+
+def _patterns(value):
+    # config.json holds a list, the environment a comma separated string
+    if isinstance(value, str):
+        value = value.split(",")
+    return [pattern.strip() for pattern in value if pattern.strip()]
+
+
+# gitignore-style patterns applied to every walk, before the folder's own .gitignore
+LIST_FOLDER_IGNORE = get_setting(
+    "list_folder_ignore", "LIST_FOLDER_IGNORE", ["__pycache__", "node_modules"], _patterns
+)
+LIST_FOLDER_USE_GITIGNORE = get_setting(
+    "list_folder_use_gitignore", "LIST_FOLDER_USE_GITIGNORE", True, lambda v: str(v).lower() in ("1", "true", "yes")
+)
+LIST_FOLDER_MAX_DEPTH = get_setting("list_folder_max_depth", "LIST_FOLDER_MAX_DEPTH", 16, int)
+LIST_FOLDER_MAX_ENTRIES = get_setting("list_folder_max_entries", "LIST_FOLDER_MAX_ENTRIES", 20000, int)
+# Outline fragments are sent after this many entries or this many seconds, whichever comes first
+LIST_FOLDER_FRAGMENT_ENTRIES = get_setting("list_folder_fragment_entries", "LIST_FOLDER_FRAGMENT_ENTRIES", 500, int)
+LIST_FOLDER_FRAGMENT_SECONDS = get_setting("list_folder_fragment_seconds", "LIST_FOLDER_FRAGMENT_SECONDS", 0.05, float)
+
+HTML_INDENT = "&nbsp;&nbsp;&nbsp;&nbsp;"
+
+
+def _translate(pattern):
+    """
+    Turns a gitignore glob into a regex over '/'-separated paths: * and ? stay inside one
+    path segment, ** spans any number of segments.
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            body = pattern[i + 1:end]
+            # Only a leading ! negates the class; elsewhere it is a literal character
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append("[" + body + "]")
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(parts) + r"\Z")
+
+
+class IgnoreRules:
+    """
+    A subset of .gitignore semantics: blank lines and # comments are skipped, ! re-includes,
+    a trailing / matches directories only, and a pattern containing / is anchored to the
+    walk root while one without matches the name at any depth. The last matching rule wins.
+    """
+
+    def __init__(self, patterns=()):
+        self.rules = []
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern):
+        pattern = pattern.rstrip("\n").rstrip()
+        if not pattern or pattern.startswith("#"):
+            return
+        negate = pattern.startswith("!")
+        if negate:
+            pattern = pattern[1:]
+        directory_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        self.rules.append((_translate(pattern.lstrip("/")), negate, directory_only, anchored))
+
+    @classmethod
+    def for_root(cls, root, patterns=None, use_gitignore=None):
+        """
+        The configured patterns followed by the root folder's own .gitignore, if any.
+        """
+        rules = cls(LIST_FOLDER_IGNORE if patterns is None else patterns)
+        use_gitignore = LIST_FOLDER_USE_GITIGNORE if use_gitignore is None else use_gitignore
+        gitignore = os.path.join(root, ".gitignore")
+        if use_gitignore and os.path.isfile(gitignore):
+            try:
+                with open(gitignore, "r", encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        rules.add(line)
+            except OSError as e:
+                logging.warning(f"IgnoreRules: Could not read {gitignore}: {e}")
+        return rules
+
+    def ignored(self, relative_path, name, is_dir):
+        result = False
+        for regex, negate, directory_only, anchored in self.rules:
+            if directory_only and not is_dir:
+                continue
+            if regex.match(relative_path if anchored else name):
+                result = not negate
+        return result
+
+
+class TreeWalker:
+    """
+    Iterative, depth-first walk of a folder with os.scandir, in name order like the old
+    recursive listing. Yields (depth, name, path, is_dir) with the root itself at depth 0.
+    Folders below max_depth are listed but not entered, and the walk stops after max_entries
+    entries; both are counted in skipped_depth and truncated. Symlinked folders are not entered.
+    """
+
+    def __init__(self, root, rules=None, max_depth=LIST_FOLDER_MAX_DEPTH, max_entries=LIST_FOLDER_MAX_ENTRIES):
+        self.root = root
+        self.rules = rules if rules is not None else IgnoreRules.for_root(root)
+        self.max_depth = max_depth
+        self.max_entries = max_entries
+        self.entries = 0
+        self.ignored = 0
+        self.skipped_depth = 0
+        self.truncated = False
+
+    def _children(self, path, relative):
+        try:
+            with os.scandir(path) as it:
+                children = []
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    child_relative = f"{relative}/{entry.name}" if relative else entry.name
+                    if self.rules.ignored(child_relative, entry.name, is_dir):
+                        self.ignored += 1
+                        continue
+                    children.append((entry.name, entry.path, is_dir, is_dir and not entry.is_symlink(), child_relative))
+        except OSError as e:
+            logging.warning(f"TreeWalker: Could not list {path}: {e}")
+            return iter(())
+        children.sort()
+        return iter(children)
+
+    def __iter__(self):
+        yield 0, os.path.basename(os.path.normpath(self.root)), self.root, True
+        stack = [(1, self._children(self.root, ""))]
+        while stack:
+            depth, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                continue
+            if self.entries >= self.max_entries:
+                self.truncated = True
+                return
+            name, path, is_dir, enterable, relative = child
+            self.entries += 1
+            yield depth, name, path, is_dir
+            if enterable:
+                if depth < self.max_depth:
+                    stack.append((depth + 1, self._children(path, relative)))
+                else:
+                    self.skipped_depth += 1
+
+
+def render_tree(root, on_fragment=None, walker=None):
+    """
+    Walks root and returns (plain text tree, file paths). Lines are collected in lists and
+    joined once. If on_fragment is given it is called with each new piece of the HTML outline
+    while the walk is still running, so a client can show the tree as it is discovered.
+    """
+    walker = walker or TreeWalker(root)
+    plain_lines = []
+    file_paths = []
+    pending_html = []
+    last_flush = time.perf_counter()
+
+    for depth, name, path, is_dir in walker:
+        if is_dir:
+            plain_lines.append(f"{'    ' * depth}├── {name}/\n")
+            pending_html.append(f"{HTML_INDENT * depth}<strong>{escape(name)}/</strong><br>")
+        else:
+            plain_lines.append(f"{'    ' * depth}├── {name}\n")
+            pending_html.append(f"{HTML_INDENT * depth}{escape(name)}<br>")
+            file_paths.append(path)
+        if on_fragment is not None and (
+            len(pending_html) >= LIST_FOLDER_FRAGMENT_ENTRIES
+            or time.perf_counter() - last_flush >= LIST_FOLDER_FRAGMENT_SECONDS
+        ):
+            on_fragment("".join(pending_html))
+            pending_html = []
+            last_flush = time.perf_counter()
+
+    notes = []
+    if walker.truncated:
+        notes.append(f"(listing stopped after {walker.max_entries} entries)")
+    if walker.skipped_depth:
+        notes.append(f"({walker.skipped_depth} folders deeper than {walker.max_depth} levels not expanded)")
+    for note in notes:
+        plain_lines.append(f"{note}\n")
+        pending_html.append(f"<em>{escape(note)}</em><br>")
+    if on_fragment is not None and pending_html:
+        on_fragment("".join(pending_html))
+
+    logging.info(
+        f"render_tree: {walker.entries} entries, {len(file_paths)} files, {walker.ignored} ignored, "
+        f"truncated={walker.truncated} under {root}."
+    )
+    return "".join(plain_lines), file_paths
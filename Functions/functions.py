@@ -1,26 +1,107 @@
 import os
 import json
+import time
+import asyncio
 import logging
-from docx import Document
-from PyPDF2 import PdfReader
+import httpx
 from LLM_interface.query_llm import (
-    preprocess_prompt_with_functions,
-    query_llm_function_decision,
+    MODEL_NAME,
+    decision_prompt,
+    stream_llm_decision,
     query_llm_marked_response
 )
 from Functions.local_formatter import LocalFormatter
+from Functions.decision_cache import decision_cache, fast_route
+from Functions.content_index import get_content_index
+from Functions.extractors import extract_text, is_document, is_supported
+from Functions.extraction_pool import extract_many, extract_one, run_on_pool
+from Functions.folder_walker import render_tree
+from Functions.file_reader import READ_DOCUMENT_MAX_BYTES, READ_FILE_MAX_BYTES, file_kind, preview as read_preview
+from Functions.summarize import SUMMARY_MAX_PROMPT_TOKENS, Summarizer, estimate_tokens, file_entry, fits_in_budget
+from Functions.decision_stream import DecisionStreamParser, InvalidDecision, validate_decision
+from Functions.model_tiers import router_state
+from LLM_interface.backend_pool import NoBackendAvailable
+from Functions.plan_executor import PlanExecutor, READ_ONLY_FUNCTIONS, run_blocking
+from LLM_interface.rag_operations import get_rag_index
+from Functions.answer_cache import ANSWER_CACHE_ENABLED, get_answer_cache
+from Functions.sessions import SESSION_TURNS, session_store
+from Functions.speculation import SpeculativeAnswer, should_speculate
+from LLM_interface.metrics import span, observe_stage, record_error
+from LLM_interface.log_setup import sampled_logger
 
-def llm_decision(user_prompt: str, api_url: str = None, model_name: str = None):
+chunk_log = sampled_logger("llm.format")
+
+async def llm_decision(
+    user_prompt: str, api_url: str = None, model_name: str = None, use_cache: bool = True, session=None, progress=None
+):
+    """
+    session (see Functions/sessions.py) carries the conversation so far into the decision and the answer.
+    progress(event, html), if given, receives partial output such as the folder outline before the
+    decision completes; it may be called from worker threads.
+    """
     logging.info("llm_decision: Starting decision-making process.")
-    enriched_prompt = preprocess_prompt_with_functions(user_prompt)
-    logging.debug(f"llm_decision: Enriched prompt: {enriched_prompt}")
+    llm_response = None
+    model = model_name or MODEL_NAME
+    cache_key = decision_cache.make_key(user_prompt, model)
+    # A follow-up is decided with this conversation's history, so its decision is not shared
+    use_decision_cache = session is None or not session.turns
+
+    # Obvious path prompts and repeated prompts never reach the model
+    response_data = fast_route(user_prompt)
+    if response_data is not None:
+        decision_cache.record_fast_path()
+    elif use_decision_cache:
+        response_data = decision_cache.get(cache_key)
+        if response_data is not None:
+            logging.info("llm_decision: Decision served from cache.")
+
+    async def run_step(func, param):
+        step_progress = progress
+        if progress is not None:
+            generation = executor.generation
+
+            def step_progress(event, html):
+                # A step discarded on escalation keeps running in its thread; its output is dropped
+                if executor.generation == generation:
+                    progress(event, html)
 
-    llm_response = query_llm_function_decision(api_url, model_name, enriched_prompt, stream=False)
-    logging.debug(f"llm_decision: Raw LLM Decision Response: {llm_response}")
+        with span("function", function=func, model=model):
+            return await execute_function(func, param, api_url, model_name, use_cache, session, step_progress)
+
+    executor = PlanExecutor(run_step, model=model)
+    speculation = None
 
     try:
-        response_data = json.loads(llm_response)
-        logging.info("llm_decision: Successfully parsed LLM response as JSON.")
+        if response_data is None:
+            with span("prompt_build", model=model):
+                enriched_prompt = decision_prompt(user_prompt)
+                if session is not None and session.turns:
+                    # Lets the decision resolve follow-ups such as "explain that in more detail"
+                    enriched_prompt = f"{session.decision_hint()}\n\n{enriched_prompt}"
+            logging.debug("llm_decision: Enriched prompt: %s", enriched_prompt)
+
+            # Likely general questions start answering while the decision is generated
+            early = READ_ONLY_FUNCTIONS
+            if should_speculate(user_prompt, model):
+                speculative_stats = {}
+                kept = asyncio.get_running_loop().create_future()
+                speculation = SpeculativeAnswer(
+                    general_question(
+                        user_prompt, api_url, model_name, stream=True, stats=speculative_stats,
+                        use_cache=use_cache, session=session, kept=kept,
+                    ),
+                    speculative_stats,
+                    model,
+                    kept,
+                )
+                early = READ_ONLY_FUNCTIONS - {"general_question"}
+
+            with span("decision", model=model):
+                response_data, llm_response = await tiered_decision(
+                    api_url, model, enriched_prompt, executor, early, progress
+                )
+            logging.debug("llm_decision: Raw LLM Decision Response: %s", llm_response)
+            logging.info("llm_decision: Successfully parsed LLM response as JSON.")
 
         functions = response_data.get("function", [])
         parameters = response_data.get("parameters", [])
@@ -31,42 +112,62 @@ def llm_decision(user_prompt: str, api_url: str = None, model_name: str = None):
             parameters = [parameters]
         if len(functions) != len(parameters):
             raise ValueError("Mismatch between number of functions and parameters.")
+        if llm_response is not None and use_decision_cache:
+            decision_cache.put(cache_key, response_data)
 
-        results = []
-        for func, param in zip(functions, parameters):
-            logging.info(f"llm_decision: Processing function: {func} with parameters: {param}")
-            path = param.get("path", "")
-
-            if func == "handle_path":
-                action_response = handle_path(path, api_url, model_name)
-                for action_func, action_param in zip(action_response.get("function", []), action_response.get("parameters", [])):
-                    if action_func == "read_file":
-                        results.append(read_file(**action_param))
-                    elif action_func == "list_folder":
-                        results.append(list_folder(**action_param))
-                    else:
-                        results.append({"html_response": f"<p>Unknown action '{action_func}'</p>"})
-            elif func == "read_file":
-                results.append(read_file(**param))
-            elif func == "write_file":
-                results.append(write_file(**param))
-            elif func == "list_folder":
-                results.append(list_folder(**param))
-            elif func == "general_question":
-                # This should return a generator for streaming
-                gen = general_question(param.get("general_question", ""), api_url, model_name, stream=True)
-                results.append({"stream_generator": gen})
-            else:
-                logging.warning(f"llm_decision: Unknown function '{func}'.")
-                results.append({"html_response": f"<p>Error: Unknown function '{func}'</p>"})
+        if speculation is not None and functions == ["general_question"]:
+            # The speculative answer to the user's own prompt becomes the answer
+            results = [speculation.commit()]
+        else:
+            if speculation is not None:
+                speculation.cancel()
+            for index, (func, param) in enumerate(zip(functions, parameters)):
+                executor.dispatch(index, func, param)
+            results = await executor.results()
+
+        # Folders too large for one prompt get a budgeted explanation prompt from map-reduce summaries.
+        # Only the first explanation prompt is streamed, and none when a general_question step answers,
+        # so summaries nobody would read are skipped.
+        streamed = any("stream_generator" in res for res in results)
+        explanation_prompt = None
+        for res in results:
+            files = res.pop("files", None)
+            large_file = res.pop("large_file", None)
+            if streamed or explanation_prompt is not None:
+                continue
+            if files is not None:
+                with span("summarize", model=model):
+                    res["detailed_info"]["explanation_prompt"] = await Summarizer(api_url, model_name).build_explanation_prompt(
+                        res["detailed_info"]["folder_structure"], files
+                    )
+            if large_file is not None:
+                # Streamed from disk chunk by chunk; the file is never loaded whole
+                with span("summarize", model=model):
+                    res["detailed_info"]["explanation_prompt"] = await Summarizer(api_url, model_name).build_file_explanation_prompt(
+                        large_file
+                    )
+            if isinstance(res.get("detailed_info"), dict):
+                explanation_prompt = res["detailed_info"].get("explanation_prompt")
+
+        # Without an explicit general_question step, the folder explanation is the streamed answer
+        if explanation_prompt and not streamed:
+            stream_stats = {}
+            # The session records the user's own prompt, so "explain that" can follow a listing or a file
+            gen = general_question(
+                explanation_prompt, api_url, model_name, stream=True, stats=stream_stats, session=session,
+                turn_question=user_prompt,
+            )
+            results.append({"stream_generator": gen, "stream_stats": stream_stats})
 
         combined_html_response = ""
         stream_generator = None
+        stream_stats = None
         combined_detailed_info = []
         for res in results:
             if "stream_generator" in res:
                 logging.debug("llm_decision: Found stream_generator in results.")
                 stream_generator = res["stream_generator"]
+                stream_stats = res.get("stream_stats")
             else:
                 html_response = res.get("html_response")
                 if html_response:
@@ -79,27 +180,195 @@ def llm_decision(user_prompt: str, api_url: str = None, model_name: str = None):
             logging.info("llm_decision: Returning stream generator for streaming response.")
             return {
                 "stream_generator": stream_generator,
-                "detailed_info": combined_detailed_info
+                "stream_stats": stream_stats,
+                "detailed_info": combined_detailed_info,
+                "step_timings": executor.step_timings(),
             }
         else:
             logging.info("llm_decision: Returning standard HTML response.")
+            if session is not None:
+                session_store.finish_turn(session, user_prompt, turn_answer(results), model, api_url)
             return {
                 "html_response": combined_html_response,
                 "detailed_info": combined_detailed_info,
+                "step_timings": executor.step_timings(),
             }
 
-    except json.JSONDecodeError:
+    except json.JSONDecodeError as e:
+        executor.cancel()
+        record_error("decision_parse", model=model)
+        llm_response = getattr(e, "doc", llm_response)
         logging.error(f"llm_decision: Error decoding LLM response as JSON: {llm_response}")
         return {
             "html_response": f"<p>Error: Invalid JSON response from LLM. Raw output: {llm_response}</p>",
             "detailed_info": {},
         }
     except Exception as e:
+        executor.cancel()
         logging.error(f"llm_decision: Error in llm_decision function: {e}")
         return {
             "html_response": f"<p>Error executing function: {e}</p>",
             "detailed_info": {},
         }
+    finally:
+        # Errors and cancelled requests must not leave a speculative answer generating
+        if speculation is not None:
+            speculation.cancel()
+
+def turn_answer(results):
+    """
+    Plain text of results that were not streamed, recorded as the answer of a session turn.
+    """
+    parts = []
+    for res in results:
+        detailed_info = res.get("detailed_info")
+        detailed_info = detailed_info if isinstance(detailed_info, dict) else {}
+        message = res.get("plain_text_response") or res.get("plain_text") or res.get("html_response")
+        if message:
+            parts.append(message)
+        if detailed_info.get("contents"):
+            parts.append(f"Contents of {detailed_info.get('name', 'the file')}:\n{detailed_info['contents']}")
+        elif detailed_info.get("folder_structure"):
+            parts.append(f"Folder structure:\n{detailed_info['folder_structure']}")
+    return "\n\n".join(parts)
+
+async def tiered_decision(api_url, model, enriched_prompt, executor, early=READ_ONLY_FUNCTIONS, progress=None):
+    """
+    Routes with the small router model and escalates to the answer model when the router's
+    output does not parse, does not validate against AVAILABLE_FUNCTIONS or the request fails.
+    Both tiers dispatch read-only steps early; on escalation the router's steps are discarded
+    (they have no side effects) and progress gets "outline_reset" so their output is cleared.
+    Returns (decision, raw_text) like stream_decision.
+    """
+    router = router_state.router_for(model)
+    if router is not None:
+        started = time.perf_counter()
+        try:
+            decision, raw = await stream_decision(api_url, router, enriched_prompt, executor, early)
+            validate_decision(decision)
+            router_state.record("router", router, time.perf_counter() - started, "ok")
+            return decision, raw
+        except json.JSONDecodeError:
+            outcome = "parse"
+        except InvalidDecision as e:
+            outcome = "validation"
+            logging.info(f"llm_decision: Router decision rejected, {e}.")
+        except (httpx.HTTPError, NoBackendAvailable) as e:
+            outcome = "error"
+            logging.warning(f"llm_decision: Router request failed: {e}")
+        router_state.record("router", router, time.perf_counter() - started, outcome)
+        logging.info(f"llm_decision: Escalating decision from {router} to {model} ({outcome}).")
+        if executor.tasks:
+            executor.discard()
+            if progress is not None:
+                progress("outline_reset", "")
+
+    started = time.perf_counter()
+    try:
+        decision, raw = await stream_decision(api_url, model, enriched_prompt, executor, early)
+    except json.JSONDecodeError:
+        router_state.record("answer", model, time.perf_counter() - started, "parse")
+        raise
+    except Exception:
+        router_state.record("answer", model, time.perf_counter() - started, "error")
+        raise
+    try:
+        validate_decision(decision)
+        outcome = "ok"
+    except InvalidDecision:
+        # The answer model has the last word; its steps run and fail individually as before
+        outcome = "validation"
+    router_state.record("answer", model, time.perf_counter() - started, outcome)
+    return decision, raw
+
+async def stream_decision(api_url, model_name, enriched_prompt, executor, early=READ_ONLY_FUNCTIONS):
+    """
+    Streams the decision through an incremental parser. Steps whose function is in early are
+    dispatched as soon as both their function name and parameters are parsed, and generation
+    stops once the top-level object is complete. Returns (decision, raw_text).
+    """
+    parser = DecisionStreamParser()
+    tokens = stream_llm_decision(api_url, model_name, enriched_prompt)
+    try:
+        async for token in tokens:
+            for _ in parser.feed(token):
+                functions = parser.values["function"]
+                parameters = parser.values["parameters"]
+                for index in range(min(len(functions), len(parameters))):
+                    if not executor.is_dispatched(index) and functions[index] in early:
+                        logging.info(f"llm_decision: Early dispatch of step {index} ({functions[index]}).")
+                        executor.dispatch(index, functions[index], parameters[index])
+                    if not executor.is_dispatched(index):
+                        # Steps with side effects wait for the whole, validated decision
+                        break
+            if parser.complete:
+                logging.info("llm_decision: Decision object complete, stopping generation.")
+                break
+    finally:
+        await tokens.aclose()
+    return parser.decision(), parser.raw
+
+async def execute_function(func, param, api_url, model_name, use_cache=False, session=None, progress=None):
+    """
+    Runs one decision step and returns its list of results (handle_path may expand to several).
+    File functions are blocking, so they run on the step pool to keep the event loop free.
+    use_cache lets general_question answer from the semantic answer cache, and a session
+    makes it answer as a follow-up in that conversation.
+    """
+    logging.info("llm_decision: Processing function: %s with parameters: %s", func, param)
+    path = param.get("path", "")
+    on_fragment = (lambda html: progress("outline", html)) if progress is not None else None
+
+    if func == "handle_path":
+        results = []
+        action_response = handle_path(path, api_url, model_name)
+        for action_func, action_param in zip(action_response.get("function", []), action_response.get("parameters", [])):
+            if action_func == "read_file":
+                results.append(await run_blocking(read_file, **action_param))
+            elif action_func == "list_folder":
+                results.append(await run_blocking(list_folder, on_fragment=on_fragment, **action_param))
+            else:
+                results.append({"html_response": f"<p>Unknown action '{action_func}'</p>"})
+        return results
+    elif func == "read_file":
+        return [await run_blocking(read_file, **param)]
+    elif func == "write_file":
+        return [await run_blocking(write_file, **param)]
+    elif func == "list_folder":
+        return [await run_blocking(list_folder, on_fragment=on_fragment, **param)]
+    elif func == "general_question":
+        # This should return an async generator for streaming
+        stream_stats = {}
+        gen = general_question(
+            param.get("general_question", ""), api_url, model_name, stream=True, stats=stream_stats, use_cache=use_cache,
+            session=session,
+        )
+        return [{"stream_generator": gen, "stream_stats": stream_stats}]
+    elif func == "folder_question":
+        return [await folder_question(path, param.get("question", ""), api_url, model_name)]
+    else:
+        logging.warning(f"llm_decision: Unknown function '{func}'.")
+        return [{"html_response": f"<p>Error: Unknown function '{func}'</p>"}]
+
+async def folder_question(path, question, api_url, model_name):
+    """
+    Answers a question about a folder from the chunks most similar to it instead of
+    sending every file to the model. The folder's embeddings are refreshed first.
+    """
+    if not os.path.isdir(path):
+        return {"html_response": f"<p>Error: '{path}' is not a folder.</p>"}
+    model = model_name or MODEL_NAME
+    try:
+        with span("retrieve", function="folder_question", model=model):
+            prompt, hits = await get_rag_index().build_prompt(path, question, api_url)
+    except Exception as e:
+        record_error("retrieve", function="folder_question", model=model)
+        logging.error(f"folder_question: Retrieval failed for {path}: {e}")
+        return {"html_response": f"<p>Error searching folder '{path}': {e}</p>"}
+    logging.info("folder_question: Retrieved %d chunks from %s.", len(hits), sorted({hit["path"] for hit in hits}))
+    stream_stats = {}
+    gen = general_question(prompt, api_url, model_name, stream=True, stats=stream_stats)
+    return {"stream_generator": gen, "stream_stats": stream_stats}
 
 def handle_path(path, api_url, model_name):
     logging.info(f"handle_path: Handling path: {path}")
@@ -121,40 +390,60 @@ def handle_path(path, api_url, model_name):
             ]
         }
 
-def read_file(path: str):
+def read_file(path: str, explain: bool = False, preview: str = None):
+    """
+    Reads a file for display. Files over the size caps (READ_FILE_MAX_BYTES for text,
+    READ_DOCUMENT_MAX_BYTES for documents), or any file when preview is given, are returned
+    as a head/tail/sample preview instead of whole. With explain, the result also carries an
+    explanation prompt, or a "large_file" entry that llm_decision summarizes chunk by chunk.
+    """
     logging.info(f"read_file: Reading file at path: {path}")
     try:
         file_metadata = {"name": os.path.basename(path), "contents": None}
-        if path.endswith(".docx"):
-            doc = Document(path)
-            file_metadata["contents"] = "\n".join([para.text for para in doc.paragraphs])
-        elif path.endswith(".pdf"):
-            pdf_text = ""
-            with open(path, "rb") as pdf_file:
-                pdf_reader = PdfReader(pdf_file)
-                for page in pdf_reader.pages:
-                    pdf_text += page.extract_text() or ""
-            file_metadata["contents"] = pdf_text.strip()
-        elif any(path.endswith(ext) for ext in [".py", ".md", ".txt"]):
-            with open(path, "r", encoding="utf-8") as f:
-                file_metadata["contents"] = f.read()
-        else:
+        kind = file_kind(path)
+        if kind is None:
             return {
                 "plain_text_response": f"Unsupported file type: {file_metadata['name']}",
                 "detailed_info": file_metadata
             }
 
+        stat_result = os.stat(path)
+        file_metadata["size"] = stat_result.st_size
+        limit = READ_FILE_MAX_BYTES if kind == "text" else READ_DOCUMENT_MAX_BYTES
+        if preview or stat_result.st_size > limit:
+            mode = preview or "head"
+            if kind == "text":
+                # Memory-mapped: only the previewed bytes are read
+                file_metadata["contents"] = read_preview(path, mode)
+            else:
+                file_metadata["contents"] = (run_on_pool(read_preview, path, mode) or "").strip()
+            file_metadata["preview"] = mode
+            file_metadata["truncated"] = stat_result.st_size > limit or len(file_metadata["contents"]) < stat_result.st_size
+        elif kind == "text":
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                file_metadata["contents"] = f.read()
+        else:
+            # Document parsing runs on the extraction pool with a per-file timeout
+            file_metadata["contents"] = (extract_one(path) or "").strip()
+
         if not file_metadata["contents"]:
             raise Exception("Failed to extract file content.")
 
-        enriched_prompt = f"Explain the following content:\n\n{file_metadata['contents']}"
-        logging.debug("read_file: Enriched prompt prepared. The explanation will be handled separately if needed.")
-        # Since read_file does not know api_url/model_name from this scope directly,
-        # we'll handle explanation separately if needed by the LLM decision logic.
-        return {
+        result = {
             "plain_text_response": "File content read successfully. Use 'general_question' function to explain.",
             "detailed_info": file_metadata
         }
+        if str(explain).lower() in ("1", "true", "yes"):
+            if not file_metadata.get("truncated") and estimate_tokens(file_metadata["contents"]) < SUMMARY_MAX_PROMPT_TOKENS:
+                file_metadata["explanation_prompt"] = f"Explain the following content:\n\n{file_metadata['contents']}"
+            else:
+                result["large_file"] = {
+                    "path": path,
+                    "name": file_metadata["name"],
+                    "mtime_ns": stat_result.st_mtime_ns,
+                    "size": stat_result.st_size,
+                }
+        return result
 
     except FileNotFoundError:
         logging.error(f"read_file: File not found at {path}")
@@ -173,6 +462,7 @@ def write_file(path: str, content: str):
     logging.info(f"write_file: Writing to file at path: {path}")
     try:
         if path.endswith(".docx"):
+            from docx import Document
             doc = Document()
             for line in content.split("\n"):
                 doc.add_paragraph(line)
@@ -197,58 +487,52 @@ def write_file(path: str, content: str):
         logging.error(f"write_file: Error writing file: {e}")
         return {"plain_text": f"Error writing file: {e}", "detailed_info": {"path": path}}
 
-def list_folder(path: str) -> dict:
+def list_folder(path: str, on_fragment=None) -> dict:
+    """
+    on_fragment, if given, receives the HTML outline piece by piece while the folder is walked.
+    """
     logging.info(f"list_folder: Listing folder at path: {path}")
-    import os
-    from html import escape
 
-    def read_file_content(file_path: str) -> str:
-        try:
-            _, ext = os.path.splitext(file_path)
-            ext = ext.lower()
-            if ext == '.pdf':
-                with open(file_path, 'rb') as f:
-                    reader = PdfReader(f)
-                    return "\n".join(page.extract_text() for page in reader.pages if page.extract_text())
-            elif ext in {'.txt', '.py', '.js', '.html', '.md'}:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    return f.read()
-            elif ext == '.docx':
-                d = Document(file_path)
-                return "\n".join(paragraph.text for paragraph in d.paragraphs)
-            return "Unsupported file type for preview."
-        except Exception as e:
-            logging.error(f"list_folder: Error reading file {file_path}: {e}")
-            return f"Error reading file: {e}"
-
-    def build_tree_and_content(path, level=0):
-        indent = "    " * level
-        tree_prefix = f"{indent}├── "
-        html_indent = "&nbsp;&nbsp;&nbsp;&nbsp;" * level
-        plain_text_structure = ""
-        html_tree_structure = ""
-        aggregated_content = ""
-
-        if os.path.isdir(path):
-            dir_name = os.path.basename(path)
-            plain_text_structure += f"{tree_prefix}{dir_name}/\n"
-            html_tree_structure += f"{html_indent}<strong>{escape(dir_name)}/</strong><br>"
-            for item in sorted(os.listdir(path)):
-                if item.startswith('.') or item == "__pycache__":
+    index = get_content_index()
+
+    def read_file_contents(file_paths):
+        """
+        Serves unchanged files from the on-disk index. Plain text is read inline,
+        documents are extracted in parallel on the process pool.
+        """
+        contents = {}
+        stats = {}
+        documents = []
+        for file_path in file_paths:
+            try:
+                if not is_supported(file_path):
+                    contents[file_path] = "Unsupported file type for preview."
                     continue
-                item_path = os.path.join(path, item)
-                sub_plain, sub_html, sub_content = build_tree_and_content(item_path, level + 1)
-                plain_text_structure += sub_plain
-                html_tree_structure += sub_html
-                aggregated_content += sub_content
-        else:
-            file_name = os.path.basename(path)
-            plain_text_structure += f"{tree_prefix}{file_name}\n"
-            html_tree_structure += f"{html_indent}{escape(file_name)}<br>"
-            file_content = read_file_content(path)
-            aggregated_content += f"\n# {file_name}\n{file_content}\n"
+                stats[file_path] = os.stat(file_path)
+                cached = index.lookup(file_path, stats[file_path])
+                if cached is not None:
+                    contents[file_path] = cached
+                elif is_document(file_path):
+                    documents.append(file_path)
+                else:
+                    contents[file_path] = extract_text(file_path)
+                    index.store(file_path, contents[file_path], stats[file_path])
+            except Exception as e:
+                logging.error(f"list_folder: Error reading file {file_path}: {e}")
+                contents[file_path] = f"Error reading file: {e}"
 
-        return plain_text_structure, html_tree_structure, aggregated_content
+        for file_path, text, error in extract_many(documents):
+            if error is not None:
+                logging.error(f"list_folder: Error reading file {file_path}: {error}")
+                contents[file_path] = f"Error reading file: {error}"
+            else:
+                contents[file_path] = text
+                index.store(file_path, text, stats[file_path])
+        for file_path in list(stats):
+            if contents[file_path] is None or contents[file_path].startswith("Error reading file"):
+                del stats[file_path]
+                contents[file_path] = contents[file_path] or ""
+        return contents, stats
 
     # Path validation
     if not os.path.exists(path):
@@ -259,7 +543,20 @@ def list_folder(path: str) -> dict:
         return {"html_response": "<p>Error: Path is not a folder.</p>", "detailed_info": {"error": "Path is not a folder"}}
 
     try:
-        folder_structure, html_tree_structure, aggregated_content = build_tree_and_content(path)
+        folder_structure, file_paths = render_tree(path, on_fragment)
+        contents, stats = read_file_contents(file_paths)
+        files = [file_entry(file_path, contents[file_path], stats.get(file_path)) for file_path in file_paths]
+
+        if not fits_in_budget(folder_structure, files):
+            # Too large for one prompt: llm_decision builds the explanation prompt through map-reduce summaries
+            logging.info(f"list_folder: {len(files)} files exceed the prompt budget, deferring to summarization.")
+            return {
+                "plain_text_response": "Folder structure read successfully. Use 'general_question' function to explain.",
+                "detailed_info": {"folder_structure": folder_structure},
+                "files": [entry for entry in files if entry["mtime_ns"] is not None],
+            }
+
+        aggregated_content = "".join(f"\n# {entry['name']}\n{entry['content']}\n" for entry in files)
 
         # Prepare the prompt for explanation
         enriched_prompt = (
@@ -278,36 +575,110 @@ def list_folder(path: str) -> dict:
         logging.error(f"list_folder: Error processing folder: {e}")
         return {"html_response": f"<p>Error: {e}</p>", "detailed_info": {"error": str(e)}}
 
-def general_question(user_prompt, api_url, model_name, stream=False):
-    logging.info(f"general_question: Handling prompt: {user_prompt}, stream={stream}")
-    response_chunks = query_llm_marked_response(api_url, model_name, user_prompt, stream=stream)
-
+def general_question(
+    user_prompt, api_url, model_name, stream=False, stats=None, use_cache=False, session=None, turn_question=None,
+    kept=None,
+):
+    """
+    Returns an async generator of HTML chunks when stream=True,
+    otherwise a coroutine resolving to the full HTML response.
+    With use_cache, a close enough earlier question is answered from the semantic answer cache.
+    With a session, the answer continues that conversation and is recorded in it, under
+    turn_question when the prompt was built for the user (such as a file explanation).
+    kept, for speculative answers, is a future the finished answer waits on before it is
+    cached or recorded; it resolves False when the answer is discarded.
+    """
+    logging.info("general_question: Handling prompt: %s, stream=%s", user_prompt, stream)
     if stream:
-        formatter = LocalFormatter()
-        chunk_index = 0
-        try:
-            for chunk in response_chunks:
-                chunk_index += 1
-                logging.debug(f"general_question: Received chunk #{chunk_index}: {chunk[:100]}...")
-                html = formatter.feed_text(chunk)
-                if html:
-                    logging.debug(f"general_question: Yielding formatted HTML chunk of length {len(html)}.")
-                    yield html
-            final_html = formatter.close()
-            if final_html:
-                logging.debug("general_question: Yielding final formatted HTML after close.")
-                yield final_html
-        except Exception as e:
-            logging.error(f"general_question: Error during streaming: {e}")
-            yield f"<p>Error during streaming: {e}</p>"
-    else:
-        all_text = ""
-        for chunk in response_chunks:
+        return _general_question_stream(user_prompt, api_url, model_name, stats, use_cache, session, turn_question, kept)
+    return _general_question_full(user_prompt, api_url, model_name)
+
+async def _general_question_stream(
+    user_prompt, api_url, model_name, stats=None, use_cache=False, session=None, turn_question=None, kept=None
+):
+    model = model_name or MODEL_NAME
+    stats = stats if stats is not None else {}
+    cache = None
+    # A follow-up depends on the conversation, so only opening questions use the answer cache
+    if use_cache and ANSWER_CACHE_ENABLED and (session is None or not session.turns):
+        cache = get_answer_cache()
+        if not cache.cacheable(user_prompt):
+            cache = None
+    vector = None
+    if cache is not None:
+        with span("answer_cache", function="general_question", model=model):
+            cached_html, vector = await cache.lookup(user_prompt, model, api_url)
+        if cached_html is not None:
+            stats["answer_cache"] = "hit"
+            yield cached_html
+            return
+
+    prompt = user_prompt
+    context = None
+    if session is not None:
+        # The backend context already holds the conversation, so only the new question is prefilled
+        context = session.reusable_context(model, api_url)
+        if context is not None:
+            stats["session"] = "context"
+        else:
+            stats["session"] = "history" if session.turns else "new"
+            prompt = session.history_prompt(user_prompt)
+        SESSION_TURNS.inc(outcome=stats["session"], model=model)
+    response_chunks = query_llm_marked_response(api_url, model_name, prompt, stream=True, stats=stats, context=context)
+    formatter = LocalFormatter()
+    rendered = []
+    answer_text = []
+    chunk_index = 0
+    format_seconds = 0.0
+    try:
+        async for chunk in response_chunks:
+            chunk_index += 1
+            chunk_log.debug("general_question: Received chunk #%d: %.100s", chunk_index, chunk)
+            answer_text.append(chunk)
+            format_started = time.perf_counter()
+            html = formatter.feed_text(chunk)
+            format_seconds += time.perf_counter() - format_started
+            if html:
+                chunk_log.debug("general_question: Yielding formatted HTML chunk of length %d.", len(html))
+                rendered.append(html)
+                yield html
+        final_html = formatter.close()
+        if final_html:
+            logging.debug("general_question: Yielding final formatted HTML after close.")
+            rendered.append(final_html)
+            yield final_html
+        if kept is not None and not await kept:
+            logging.info("general_question: Speculative answer discarded, not cached or recorded.")
+            return
+        # Only answers the backend finished are cached; request errors arrive as text too
+        if vector is not None and "finished_at" in stats:
+            try:
+                await cache.store(user_prompt, model, vector, "".join(rendered))
+            except Exception as e:
+                logging.warning(f"general_question: Could not cache answer: {e}")
+        if session is not None and "finished_at" in stats:
+            session_store.finish_turn(
+                session, turn_question or user_prompt, "".join(answer_text), model, api_url, stats.get("context")
+            )
+    except Exception as e:
+        record_error("answer", function="general_question", model=model)
+        logging.error(f"general_question: Error during streaming: {e}")
+        yield f"<p>Error during streaming: {e}</p>"
+    finally:
+        observe_stage("format", format_seconds, function="general_question", model=model)
+        await response_chunks.aclose()
+
+async def _general_question_full(user_prompt, api_url, model_name):
+    all_text = ""
+    model = model_name or MODEL_NAME
+    with span("answer", function="general_question", model=model):
+        async for chunk in query_llm_marked_response(api_url, model_name, user_prompt, stream=False):
             all_text += chunk
+    with span("format", function="general_question", model=model):
         formatter = LocalFormatter()
         html = formatter.feed_text(all_text)
         html += formatter.close()
-        return {
-            "html_response": html,
-            "detailed_info": {"type": "general_question", "prompt": user_prompt},
-        }
\ No newline at end of file
+    return {
+        "html_response": html,
+        "detailed_info": {"type": "general_question", "prompt": user_prompt},
+    }
@@ -1,84 +1,522 @@
+import re
 import html
 
+# Characters that may start inline markup; everything else is copied through in runs
+INLINE_SPECIAL = re.compile(r"[*_`\[\\]")
+CODE_SPAN_SPECIAL = re.compile(r"`")
+TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+SAFE_URL = re.compile(r"^(https?://|mailto:|/|#|\./|\.\./)", re.IGNORECASE)
+
+MAX_LINK_LENGTH = 512
+MAX_LINE_PREFIX = 32
+
+INLINE_TAGS = {"**": "strong", "*": "em", "_": "em", "`": "code"}
+
+
+def escape(text: str) -> str:
+    return html.escape(text, quote=False)
+
+
+class InlineRenderer:
+    """
+    Incremental renderer for inline markup: **bold**, *italic*, _italic_, `code`, [links](url)
+    and backslash escapes. Every input character is looked at a constant number of times.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.stack = []
+        self.run = []
+        self.prev_char = " "
+        self.pending = ""
+        self.link = None
+        self.link_phase = None
+        self.link_label_end = 0
+
+    def _flush_run(self):
+        if self.run:
+            self.out.append(escape("".join(self.run)))
+            self.run = []
+
+    def _text(self, text: str):
+        if text:
+            self.run.append(text)
+            self.prev_char = text[-1]
+
+    def _toggle(self, marker: str):
+        self._flush_run()
+        if marker in self.stack:
+            # Close everything opened after the marker, close it, then reopen the rest
+            position = self.stack.index(marker)
+            reopen = self.stack[position + 1:]
+            for open_marker in reversed(self.stack[position:]):
+                self.out.append(f"</{INLINE_TAGS[open_marker]}>")
+            del self.stack[position:]
+            for open_marker in reopen:
+                self.out.append(f"<{INLINE_TAGS[open_marker]}>")
+                self.stack.append(open_marker)
+        else:
+            self.out.append(f"<{INLINE_TAGS[marker]}>")
+            self.stack.append(marker)
+
+    def _resolve_pending(self, next_char):
+        """
+        Decides what a held-back '*', '**', '***', '_' or '\\' means once the following character is known.
+        next_char is None at the end of the line.
+        """
+        pending, self.pending = self.pending, ""
+        if pending == "\\":
+            if next_char is None:
+                self._text("\\")
+                return False
+            self._text(next_char)
+            return True
+        if pending == "**":
+            if next_char == "*" and "*" in self.stack and "**" in self.stack:
+                # '***' closes both spans, innermost first
+                self._toggle(self.stack[-1] if self.stack[-1] in ("*", "**") else "**")
+                self._toggle("*" if "*" in self.stack else "**")
+                return True
+            if next_char == "*" and "*" not in self.stack and "**" not in self.stack:
+                # A '***' run may open bold and italic together; wait for the character after it
+                self.pending = "***"
+                return True
+            if "**" not in self.stack and (next_char is None or next_char.isspace()):
+                self._text("**")
+            else:
+                self._toggle("**")
+            return False
+        if pending == "***":
+            if next_char is not None and not next_char.isspace():
+                self._toggle("**")
+                self._toggle("*")
+            else:
+                self._text("***")
+            return False
+        if pending == "*":
+            if next_char == "*":
+                # The second star of '**' arrived in a later chunk
+                self.pending = "**"
+                return True
+            if "*" in self.stack:
+                self._toggle("*")
+            elif next_char is not None and not next_char.isspace():
+                self._toggle("*")
+            else:
+                self._text("*")
+            return False
+        if pending == "_":
+            if "_" in self.stack and (next_char is None or not next_char.isalnum()):
+                self._toggle("_")
+            elif ("_" not in self.stack and not self.prev_char.isalnum()
+                  and next_char is not None and not next_char.isspace()):
+                self._toggle("_")
+            else:
+                self._text("_")
+            return False
+        return False
+
+    def _feed_link(self, char: str):
+        """
+        Collects '[label](url)' one character at a time. Returns False as soon as the
+        buffer can no longer be a link.
+        """
+        self.link.append(char)
+        if len(self.link) > MAX_LINK_LENGTH:
+            return False
+        if self.link_phase == "label":
+            if char == "]":
+                self.link_phase = "after_label"
+                self.link_label_end = len(self.link) - 1
+            return True
+        if self.link_phase == "after_label":
+            if char != "(":
+                return False
+            self.link_phase = "url"
+            return True
+        if char == ")":
+            text = "".join(self.link)
+            label = text[1:self.link_label_end]
+            url = text[self.link_label_end + 2:-1].strip()
+            self.link = None
+            self._flush_run()
+            if SAFE_URL.match(url):
+                self.out.append(
+                    f'<a href="{html.escape(url, quote=True)}" target="_blank" rel="noopener noreferrer">'
+                    f"{escape(label)}</a>"
+                )
+            else:
+                self.out.append(escape(text))
+            self.prev_char = ")"
+        return True
+
+    def _abandon_link(self):
+        text = "".join(self.link)
+        self.link = None
+        self._text(text)
+
+    def feed(self, text: str):
+        i = 0
+        length = len(text)
+        while i < length:
+            if self.link is not None:
+                char = text[i]
+                i += 1
+                if not self._feed_link(char):
+                    # Not a link: emit the bracketed text literally and re-scan the last character
+                    self.link.pop()
+                    self._abandon_link()
+                    i -= 1
+                continue
+
+            if self.pending:
+                if self._resolve_pending(text[i]):
+                    i += 1
+                continue
+
+            in_code = bool(self.stack) and self.stack[-1] == "`"
+            match = (CODE_SPAN_SPECIAL if in_code else INLINE_SPECIAL).search(text, i)
+            end = match.start() if match else length
+            self._text(text[i:end])
+            if not match:
+                break
+            char = text[end]
+            i = end + 1
+
+            if char == "`":
+                self._toggle("`")
+            elif char == "\\":
+                self.pending = "\\"
+            elif char == "[":
+                self.link = ["["]
+                self.link_phase = "label"
+            elif char == "*":
+                if i < length and text[i] == "*":
+                    self.pending = "**"
+                    i += 1
+                else:
+                    self.pending = "*"
+            elif char == "_":
+                self.pending = "_"
+
+    def finish(self):
+        """
+        Ends the line: resolves held-back markers and closes every open tag.
+        """
+        if self.pending:
+            self._resolve_pending(None)
+        if self.link is not None:
+            self._abandon_link()
+        self._flush_run()
+        for marker in reversed(self.stack):
+            self.out.append(f"</{INLINE_TAGS[marker]}>")
+        self.stack = []
+        self.prev_char = " "
+
+    def flush(self):
+        self._flush_run()
+
+
+def render_inline(text: str) -> str:
+    out = []
+    renderer = InlineRenderer(out)
+    renderer.feed(text)
+    renderer.finish()
+    return "".join(out)
+
+
+def split_table_row(line: str):
+    row = line.strip()
+    if row.startswith("|"):
+        row = row[1:]
+    if row.endswith("|") and not row.endswith("\\|"):
+        row = row[:-1]
+    return [cell.strip().replace("\\|", "|") for cell in re.split(r"(?<!\\)\|", row)]
+
+
 class LocalFormatter:
     """
     Stateful formatter to convert plain text into HTML incrementally.
+
+    Single-pass state machine: each call to feed_text only looks at the new text, so the
+    work is amortized O(1) per character. Inline text is emitted as soon as it arrives;
+    only the few characters that decide a line's block type, a pending link, and table rows
+    are held back. Supports headings, paragraphs, bullet and ordered lists, fenced code,
+    tables, inline code, links, and bold/italic spans. All text outside tags is escaped.
     """
 
     def __init__(self):
-        self.buffer = ""
+        self.out = []
+        self.inline = InlineRenderer(self.out)
+        self.line_state = "start"   # start, inline, code, buffered
+        self.prefix = []
+        self.buffered_line = []
+        self.block_close = ""
         self.in_code_block = False
-        self.in_list = False
+        self.list_type = None
+        self.pending_blank = False
+        self.in_table = False
+        self.table_alignments = []
+        self.table_candidate = None
 
     def feed_text(self, text: str):
-        self.buffer += text
-        output = []
-        lines = self.buffer.split("\n")
-        self.buffer = lines.pop()
+        i = 0
+        length = len(text)
+        while i < length:
+            newline = text.find("\n", i)
+            end = newline if newline != -1 else length
+            if end > i:
+                self._feed_line_part(text, i, end)
+            if newline == -1:
+                break
+            self._end_line()
+            i = newline + 1
+        self.inline.flush()
+        output = "".join(self.out)
+        self.out.clear()
+        return output
 
-        for line in lines:
-            formatted = self.format_line(line.rstrip())
-            if formatted:
-                output.append(formatted)
+    def close(self):
+        if self.line_state != "start" or self.prefix:
+            self._end_line()
+        self._flush_table_candidate()
+        self._close_table()
+        if self.in_code_block:
+            self.out.append("</code></pre>")
+            self.in_code_block = False
+        self._close_list()
+        self.pending_blank = False
+        output = "".join(self.out)
+        self.out.clear()
+        return output
 
-        return "".join(output)
+    # Line handling
 
-    def close(self):
-        output = []
+    def _feed_line_part(self, text, start, end):
+        if self.line_state == "start":
+            # Hold back just enough characters to know what kind of line this is
+            while start < end and self.line_state == "start":
+                self.prefix.append(text[start])
+                start += 1
+                self._classify(at_eol=False)
+            if start >= end:
+                return
+        if self.line_state == "inline":
+            self.inline.feed(text[start:end])
+        elif self.line_state == "code":
+            self.out.append(escape(text[start:end]))
+        else:
+            self.buffered_line.append(text[start:end])
 
-        if self.buffer.strip():
-            formatted = self.format_line(self.buffer.strip())
-            if formatted:
-                output.append(formatted)
+    def _end_line(self):
+        if self.line_state == "start":
+            self._classify(at_eol=True)
+        if self.line_state == "inline":
+            self.inline.finish()
+            self.out.append(self.block_close)
+        elif self.line_state == "code":
+            self.out.append("\n")
+        elif self.line_state == "buffered":
+            self._finish_buffered_line("".join(self.buffered_line))
+        self.line_state = "start"
+        self.prefix = []
+        self.buffered_line = []
 
-        if self.in_code_block:
-            output.append("</code></pre>")
-            self.in_code_block = False
+    def _classify(self, at_eol):
+        prefix = "".join(self.prefix)
+        kind = self._code_line_kind(prefix, at_eol) if self.in_code_block else self._line_kind(prefix, at_eol)
+        if kind is None:
+            return
+        name = kind[0]
+
+        if name == "blank":
+            self.line_state = "blank"
+            self._start_blank()
+            return
+        if name == "code":
+            self.line_state = "code"
+            self.out.append(escape(prefix))
+            return
+        if name in ("fence", "table"):
+            self.line_state = "buffered"
+            self.buffered_line = [prefix]
+            return
 
-        if self.in_list:
-            output.append("</ul>")
-            self.in_list = False
+        self._flush_table_candidate()
+        self._close_table()
+        if name in ("ul", "ol"):
+            self._open_list_item(name, kind[1] if name == "ol" else None)
+            self.block_close = "</li>"
+            content = prefix[kind[-1]:]
+        else:
+            self._resolve_blank()
+            self._close_list()
+            if name == "heading":
+                level = kind[1]
+                self.out.append(f"<h{level}>")
+                self.block_close = f"</h{level}>"
+            else:
+                self.out.append("<p>")
+                self.block_close = "</p>"
+            content = prefix[kind[-1]:]
+        self.line_state = "inline"
+        self.inline.feed(content)
 
-        self.buffer = ""
-        return "".join(output)
+    @staticmethod
+    def _code_line_kind(prefix, at_eol):
+        stripped = prefix.lstrip(" \t")
+        if stripped.startswith("```"):
+            return ("fence",)
+        if not at_eol and len(prefix) < MAX_LINE_PREFIX and "```".startswith(stripped):
+            return None
+        return ("code",)
 
-    def format_line(self, line: str):
-        if line.strip() == "":
-            return "<br>"
+    @staticmethod
+    def _line_kind(prefix, at_eol):
+        """
+        Returns the block type of a line from its first characters, or None if more are needed.
+        The last element of heading/list/paragraph kinds is where the inline content starts.
+        """
+        stripped = prefix.lstrip(" \t")
+        lead = len(prefix) - len(stripped)
+        if not stripped:
+            if at_eol:
+                return ("blank",)
+            return None if len(prefix) < MAX_LINE_PREFIX else ("p", lead)
+        first = stripped[0]
+        if first == "`":
+            if stripped.startswith("```"):
+                return ("fence",)
+            if not at_eol and "```".startswith(stripped):
+                return None
+            return ("p", lead)
+        if first == "|":
+            return ("table",)
+        if first == "#":
+            hashes = len(stripped) - len(stripped.lstrip("#"))
+            rest = stripped[hashes:]
+            if hashes <= 6 and rest[:1] in (" ", "\t"):
+                return ("heading", hashes, lead + hashes + 1)
+            if not at_eol and not rest and hashes <= 6:
+                return None
+            return ("p", lead)
+        if first in "-*+":
+            if len(stripped) == 1 and not at_eol:
+                return None
+            if stripped[1:2] in (" ", "\t"):
+                return ("ul", lead + 2)
+            return ("p", lead)
+        if first.isdigit():
+            digits = len(stripped) - len(stripped.lstrip("0123456789"))
+            rest = stripped[digits:]
+            if digits <= 9:
+                if rest[:1] in (".", ")") and rest[1:2] in (" ", "\t"):
+                    return ("ol", int(stripped[:digits]), lead + digits + 2)
+                if not at_eol and (not rest or rest in (".", ")")):
+                    return None
+            return ("p", lead)
+        return ("p", lead)
 
-        if line.strip() == "```":
-            if self.in_code_block:
+    def _finish_buffered_line(self, line):
+        stripped = line.strip()
+        if self.in_code_block:
+            if stripped == "```":
+                self.out.append("</code></pre>")
                 self.in_code_block = False
-                return "</code></pre>"
             else:
-                self.in_code_block = True
-                return "<pre><code>"
+                self.out.append(escape(line) + "\n")
+            return
 
-        if self.in_code_block:
-            return html.escape(line) + "\n"
+        if stripped.startswith("```"):
+            self._flush_table_candidate()
+            self._close_table()
+            self._resolve_blank()
+            self._close_list()
+            language = stripped[3:].strip().split(" ")[0]
+            if language:
+                self.out.append(f'<pre><code class="language-{html.escape(language, quote=True)}">')
+            else:
+                self.out.append("<pre><code>")
+            self.in_code_block = True
+            return
+
+        # Table rows need the whole line; a header row waits for its separator line
+        if self.in_table:
+            self._append_table_row(line, "td")
+            return
+        if self.table_candidate is not None and TABLE_SEPARATOR.match(line):
+            self._open_table(self.table_candidate, line)
+            self.table_candidate = None
+            return
+        self._flush_table_candidate()
+        self._resolve_blank()
+        self._close_list()
+        self.table_candidate = line
+
+    # Blocks
 
-        if line.startswith(("- ", "* ")):
-            if not self.in_list:
-                self.in_list = True
-                return f"<ul><li>{line[2:].strip()}</li>"
-            return f"<li>{line[2:].strip()}</li>"
+    def _start_blank(self):
+        self._flush_table_candidate()
+        self._close_table()
+        if self.list_type:
+            # Blank lines between list items keep the list open
+            self.pending_blank = True
+        else:
+            self.out.append("<br>")
 
-        if self.in_list:
-            self.in_list = False
-            return f"</ul>{self.format_regular_line(line)}"
+    def _resolve_blank(self):
+        if self.pending_blank:
+            self.pending_blank = False
+            self._close_list()
+            self.out.append("<br>")
 
-        if line.startswith("## "):
-            return f"<h2>{line[3:].strip()}</h2>"
-        elif line.startswith("# "):
-            return f"<h1>{line[2:].strip()}</h1>"
+    def _open_list_item(self, list_type, number):
+        if self.list_type != list_type:
+            self._resolve_blank()
+            self._close_list()
+            if list_type == "ol" and number not in (None, 1):
+                self.out.append(f'<ol start="{number}">')
+            else:
+                self.out.append(f"<{list_type}>")
+            self.list_type = list_type
+        self.pending_blank = False
+        self.out.append("<li>")
+
+    def _close_list(self):
+        if self.list_type:
+            self.out.append(f"</{self.list_type}>")
+            self.list_type = None
 
-        if "**" in line:
-            line = self.format_bold_text(line)
+    def _flush_table_candidate(self):
+        if self.table_candidate is not None:
+            line, self.table_candidate = self.table_candidate, None
+            self.out.append(f"<p>{render_inline(line.strip())}</p>")
 
-        return self.format_regular_line(line)
+    def _open_table(self, header, separator):
+        self.table_alignments = []
+        for cell in split_table_row(separator):
+            if cell.startswith(":") and cell.endswith(":"):
+                self.table_alignments.append("center")
+            elif cell.endswith(":"):
+                self.table_alignments.append("right")
+            elif cell.startswith(":"):
+                self.table_alignments.append("left")
+            else:
+                self.table_alignments.append(None)
+        self.out.append("<table><thead>")
+        self._append_table_row(header, "th")
+        self.out.append("</thead><tbody>")
+        self.in_table = True
 
-    def format_bold_text(self, line: str):
-        return line.replace("**", "<strong>", 1).replace("**", "</strong>", 1)
+    def _append_table_row(self, line, cell_tag):
+        cells = []
+        for index, cell in enumerate(split_table_row(line)):
+            alignment = self.table_alignments[index] if index < len(self.table_alignments) else None
+            style = f' style="text-align:{alignment}"' if alignment else ""
+            cells.append(f"<{cell_tag}{style}>{render_inline(cell)}</{cell_tag}>")
+        self.out.append("<tr>" + "".join(cells) + "</tr>")
 
-    def format_regular_line(self, line: str):
-        return f"<p>{line}</p>"
\ No newline at end of file
+    def _close_table(self):
+        if self.in_table:
+            self.out.append("</tbody></table>")
+            self.in_table = False
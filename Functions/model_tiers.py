@@ -0,0 +1,70 @@
+import time
+import logging
+from LLM_interface.config import get_setting
+from LLM_interface.metrics import CallbackMetric, Counter, Histogram
+
+# Small model that picks the functions; the request's model_name (or model_name in config.json)
+# answers. Empty routes with the answer model, as before.
+ROUTER_MODEL = get_setting("router_model", "ROUTER_MODEL", "llama3.2:3b")
+# After a request error (for example the router model is not pulled) the router is skipped this long
+ROUTER_RETRY_SECONDS = get_setting("router_retry_seconds", "ROUTER_RETRY_SECONDS", 300.0, float)
+
+DECISION_TIER_SECONDS = Histogram("llm_decision_tier_seconds", "Decision latency per model tier.")
+DECISION_TIER_OUTCOMES = Counter(
+    "llm_decision_tier_total", "Decisions per model tier by outcome (ok, parse, validation, error)."
+)
+
+
+class RouterState:
+    """
+    Tracks router decisions and escalations, and keeps a failing router model out of the path
+    for ROUTER_RETRY_SECONDS.
+    """
+
+    def __init__(self):
+        self.unavailable_until = {}
+        self.attempts = 0
+        self.escalations = 0
+
+    def router_for(self, answer_model):
+        if not ROUTER_MODEL or ROUTER_MODEL == answer_model:
+            return None
+        if time.monotonic() < self.unavailable_until.get(ROUTER_MODEL, 0.0):
+            return None
+        return ROUTER_MODEL
+
+    def record(self, tier, model, seconds, outcome):
+        DECISION_TIER_SECONDS.observe(seconds, tier=tier, model=model)
+        DECISION_TIER_OUTCOMES.inc(tier=tier, model=model, outcome=outcome)
+        if tier == "router":
+            self.attempts += 1
+            if outcome != "ok":
+                self.escalations += 1
+        if tier == "router" and outcome == "error":
+            self.mark_unavailable(model)
+
+    def mark_unavailable(self, model):
+        self.unavailable_until[model] = time.monotonic() + ROUTER_RETRY_SECONDS
+        logging.warning(f"RouterState: Router model {model} failed, routing with the answer model for {ROUTER_RETRY_SECONDS:.0f}s.")
+
+    def escalation_rate(self):
+        return self.escalations / self.attempts if self.attempts else 0.0
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "router_model": ROUTER_MODEL or None,
+            "router_attempts": self.attempts,
+            "escalations": self.escalations,
+            "escalation_rate": round(self.escalation_rate(), 3),
+            "router_unavailable_for": {
+                model: round(until - now, 1) for model, until in self.unavailable_until.items() if until > now
+            },
+        }
+
+
+router_state = RouterState()
+
+decision_escalation_rate = CallbackMetric(
+    "llm_decision_escalation_ratio", "Share of router decisions escalated to the answer model.", router_state.escalation_rate
+)
@@ -0,0 +1,137 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from LLM_interface.config import get_setting
+from LLM_interface.metrics import observe_stage
+
+PLAN_WORKERS = get_setting("plan_workers", "PLAN_WORKERS", 8, int)
+
+# Steps without side effects may start while the rest of the decision is still being generated
+READ_ONLY_FUNCTIONS = {"handle_path", "read_file", "list_folder", "folder_question", "general_question"}
+# Steps that touch the filesystem at param["path"]
+FILE_FUNCTIONS = {"handle_path", "read_file", "write_file", "list_folder", "folder_question"}
+WRITE_FUNCTIONS = {"write_file"}
+
+_step_pool = ThreadPoolExecutor(max_workers=PLAN_WORKERS, thread_name_prefix="plan-step")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking step function on the shared step pool without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_step_pool, lambda: func(*args, **kwargs))
+
+
+def step_resource(func, param):
+    """
+    Returns (touches_files, writes, normalized_path). A file step without a usable path
+    gets path None, which conflicts with every write.
+    """
+    if func not in FILE_FUNCTIONS:
+        return False, False, None
+    path = param.get("path") if isinstance(param, dict) else None
+    if isinstance(path, str) and path:
+        path = os.path.abspath(os.path.expanduser(path))
+    else:
+        path = None
+    return True, func in WRITE_FUNCTIONS, path
+
+
+def paths_overlap(first, second):
+    if first is None or second is None:
+        return True
+    return first == second or first.startswith(second + os.sep) or second.startswith(first + os.sep)
+
+
+def steps_conflict(earlier, later):
+    """
+    Conservative ordering rule: two file steps must keep their order when at least one of them
+    writes and their paths are the same or one contains the other (a list_folder reads its subtree).
+    """
+    earlier_files, earlier_writes, earlier_path = earlier
+    later_files, later_writes, later_path = later
+    if not (earlier_files and later_files) or not (earlier_writes or later_writes):
+        return False
+    return paths_overlap(earlier_path, later_path)
+
+
+class PlanExecutor:
+    """
+    Runs the steps of a decision as a dependency graph. A step waits only for the earlier
+    steps it conflicts with (see steps_conflict); independent steps run concurrently.
+    Results are still returned in the original step order.
+    """
+
+    def __init__(self, run_step, model=""):
+        self.run_step = run_step
+        self.model = model
+        self.tasks = {}
+        self.resources = {}
+        self.timings = {}
+        # Incremented by discard(), so steps can tell whether they still belong to the plan
+        self.generation = 0
+
+    def is_dispatched(self, index):
+        return index in self.tasks
+
+    def dispatch(self, index, func, param):
+        if index in self.tasks:
+            return
+        resource = step_resource(func, param)
+        dependencies = [
+            self.tasks[earlier] for earlier in sorted(self.tasks)
+            if earlier < index and steps_conflict(self.resources[earlier], resource)
+        ]
+        self.resources[index] = resource
+        self.tasks[index] = asyncio.create_task(self._run(index, func, param, dependencies))
+        if dependencies:
+            logging.info(f"PlanExecutor: Step {index} ({func}) waits for {len(dependencies)} earlier step(s).")
+
+    async def _run(self, index, func, param, dependencies):
+        timings = self.timings
+        queued = time.perf_counter()
+        if dependencies:
+            await asyncio.wait(dependencies)
+        started = time.perf_counter()
+        observe_stage("queue", started - queued, function=func, model=self.model)
+        try:
+            return await self.run_step(func, param)
+        finally:
+            timings[index] = {
+                "function": func,
+                "wait_ms": round((started - queued) * 1000, 1),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+            logging.info(
+                f"PlanExecutor: Step {index} ({func}) finished in {timings[index]['duration_ms']} ms "
+                f"after waiting {timings[index]['wait_ms']} ms."
+            )
+
+    async def results(self):
+        """
+        Waits for every dispatched step and returns their results flattened in step order.
+        """
+        results = []
+        for index in sorted(self.tasks):
+            results.extend(await self.tasks[index])
+        return results
+
+    def step_timings(self):
+        return [self.timings[index] for index in sorted(self.timings)]
+
+    def cancel(self):
+        for task in self.tasks.values():
+            task.cancel()
+
+    def discard(self):
+        """
+        Cancels and forgets every dispatched step, so the plan can be dispatched again from scratch.
+        """
+        self.cancel()
+        self.tasks = {}
+        self.resources = {}
+        self.timings = {}
+        self.generation += 1
@@ -0,0 +1,205 @@
+import time
+import asyncio
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from LLM_interface.config import get_setting
+from LLM_interface.metrics import CallbackMetric, Counter
+from LLM_interface.query_llm import query_llm_text
+from Functions.summarize import SUMMARY_OUTPUT_TOKENS, estimate_tokens, truncate_to_tokens
+
+SESSION_IDLE_SECONDS = get_setting("session_idle_seconds", "SESSION_IDLE_SECONDS", 1800.0, float)
+SESSION_MAX_SESSIONS = get_setting("session_max_sessions", "SESSION_MAX_SESSIONS", 1000, int)
+# Approximate memory for all sessions together (history text plus backend context)
+SESSION_MAX_BYTES = get_setting("session_max_bytes", "SESSION_MAX_BYTES", 64 * 1024 * 1024, int)
+# Recent turns kept verbatim; older ones are folded into the running summary
+SESSION_HISTORY_TOKENS = get_setting("session_history_tokens", "SESSION_HISTORY_TOKENS", 1500, int)
+SESSION_TURN_MAX_CHARS = get_setting("session_turn_max_chars", "SESSION_TURN_MAX_CHARS", 4000, int)
+# A longer backend context is dropped and the conversation re-sent from the compact history
+SESSION_CONTEXT_MAX_TOKENS = get_setting("session_context_max_tokens", "SESSION_CONTEXT_MAX_TOKENS", 6000, int)
+
+SESSION_TURNS = Counter("session_turns_total", "Session turns by how the conversation reached the backend.")
+
+SUMMARY_INSTRUCTION = (
+    "Update the summary of a conversation between a user and an assistant with the new exchanges below. "
+    "Keep facts, names, decisions and open questions. Answer with the summary only.\n\n"
+)
+
+
+class Session:
+    """
+    One conversation: a running summary, the recent turns verbatim and the backend context
+    (token ids) returned by the last answer, stored as a compact int32 array.
+    """
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.summary = ""
+        self.turns = []
+        self.context = None
+        self.context_key = None
+        self.last_used = time.monotonic()
+        self.summarizing = None
+
+    @property
+    def size_bytes(self):
+        text = len(self.summary) + sum(len(question) + len(answer) for question, answer in self.turns)
+        return text + (self.context.itemsize * len(self.context) if self.context is not None else 0)
+
+    def reusable_context(self, model, api_url):
+        """
+        The stored context if it came from the same model and endpoint choice, otherwise None.
+        """
+        if self.context is not None and self.context_key == (model, api_url or ""):
+            return self.context.tolist()
+        return None
+
+    def history_prompt(self, question):
+        """
+        The whole conversation as one prompt, for when no backend context can be reused.
+        """
+        if not self.summary and not self.turns:
+            return question
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the conversation so far:\n{self.summary}")
+        for past_question, answer in self.turns:
+            parts.append(f"User: {past_question}\nAssistant: {answer}")
+        parts.append(f"User: {question}")
+        return "\n\n".join(parts)
+
+    def decision_hint(self, max_tokens=200):
+        """
+        A short reminder of the last exchange, so the decision can resolve "that" or "it".
+        """
+        if not self.turns:
+            return ""
+        question, answer = self.turns[-1]
+        return truncate_to_tokens(f"Previous question: {question}\nPrevious answer: {answer}", max_tokens)
+
+    def record_turn(self, question, answer, model, api_url, context=None):
+        self.turns.append((question[:SESSION_TURN_MAX_CHARS], answer[:SESSION_TURN_MAX_CHARS]))
+        if context and len(context) <= SESSION_CONTEXT_MAX_TOKENS:
+            self.context = array("i", context)
+            self.context_key = (model, api_url or "")
+        else:
+            self.context = None
+            self.context_key = None
+        self.last_used = time.monotonic()
+
+    def history_tokens(self):
+        return sum(estimate_tokens(question) + estimate_tokens(answer) for question, answer in self.turns)
+
+    async def compact(self, api_url, model):
+        """
+        Folds the oldest turns into the summary until the verbatim history fits its budget.
+        The last turn is always kept verbatim. If summarizing fails the old turns are dropped.
+        """
+        while len(self.turns) > 1 and self.history_tokens() > SESSION_HISTORY_TOKENS:
+            count = max(1, len(self.turns) // 2)
+            folded = self.turns[:count]
+            text = "\n\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in folded)
+            previous = f"Current summary:\n{self.summary}\n\n" if self.summary else ""
+            try:
+                summary = await query_llm_text(
+                    api_url, model, SUMMARY_INSTRUCTION + previous + "New exchanges:\n" + text,
+                    {"num_predict": SUMMARY_OUTPUT_TOKENS},
+                )
+                self.summary = truncate_to_tokens(summary.strip(), SUMMARY_OUTPUT_TOKENS * 2)
+            except Exception as e:
+                logging.warning(f"Session: Could not summarize history of {self.id}, dropping old turns: {e}")
+            del self.turns[:count]
+
+    def stats(self):
+        return {
+            "id": self.id,
+            "turns": len(self.turns),
+            "summary_chars": len(self.summary),
+            "context_tokens": len(self.context) if self.context is not None else 0,
+            "bytes": self.size_bytes,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+        }
+
+
+class SessionStore:
+    """
+    Sessions by id, least recently used first. Idle sessions expire after idle_seconds and the
+    least recently used are evicted beyond max_sessions or max_bytes.
+    """
+
+    def __init__(self, idle_seconds=SESSION_IDLE_SECONDS, max_sessions=SESSION_MAX_SESSIONS, max_bytes=SESSION_MAX_BYTES):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, session_id):
+        """
+        Returns the session for session_id, creating it if it is new or has expired.
+        """
+        with self.lock:
+            self._expire_locked()
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = Session(session_id)
+            self.sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            return session
+
+    def finish_turn(self, session, question, answer, model, api_url, context=None):
+        """
+        Records a completed turn, starts history compaction in the background when the verbatim
+        history is over budget, and applies the memory cap.
+        """
+        with self.lock:
+            session.record_turn(question, answer, model, api_url, context)
+            self._evict_locked()
+        if session.history_tokens() > SESSION_HISTORY_TOKENS and (session.summarizing is None or session.summarizing.done()):
+            session.summarizing = asyncio.create_task(session.compact(api_url, model))
+
+    def delete(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def _expire_locked(self):
+        now = time.monotonic()
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if now - session.last_used <= self.idle_seconds:
+                break
+            del self.sessions[session_id]
+            self.expired += 1
+
+    def _evict_locked(self):
+        total = sum(session.size_bytes for session in self.sessions.values())
+        while self.sessions and (len(self.sessions) > self.max_sessions or total > self.max_bytes):
+            session_id, session = self.sessions.popitem(last=False)
+            total -= session.size_bytes
+            self.evicted += 1
+            logging.info(f"SessionStore: Evicted session {session_id} to stay under the memory cap.")
+
+    def total_bytes(self):
+        with self.lock:
+            return sum(session.size_bytes for session in self.sessions.values())
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "bytes": sum(session.size_bytes for session in self.sessions.values()),
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "idle_seconds": self.idle_seconds,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+session_store = SessionStore()
+
+sessions_active = CallbackMetric("sessions_active", "Chat sessions held in memory.", lambda: len(session_store.sessions))
+session_store_bytes = CallbackMetric("session_store_bytes", "Approximate memory held by chat sessions.", session_store.total_bytes)
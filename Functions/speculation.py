@@ -0,0 +1,194 @@
+import re
+import time
+import asyncio
+import logging
+from collections import deque
+from LLM_interface.config import get_setting
+from LLM_interface.admission import get_admission_queue
+from LLM_interface.metrics import Counter, Histogram
+
+SPECULATION_ENABLED = get_setting("speculation_enabled", "SPECULATION_ENABLED", True,
+                                  lambda v: str(v).lower() in ("1", "true", "yes"))
+# Prompts scoring below this are unlikely to become a general_question and are not speculated on
+SPECULATION_MIN_CONFIDENCE = get_setting("speculation_min_confidence", "SPECULATION_MIN_CONFIDENCE", 0.6, float)
+# At most this share of the last speculation_window decisions may start a speculative answer
+SPECULATION_MAX_SHARE = get_setting("speculation_max_share", "SPECULATION_MAX_SHARE", 0.5, float)
+SPECULATION_WINDOW = get_setting("speculation_window", "SPECULATION_WINDOW", 100, int)
+# Chunks held for a speculative answer before its stream is paused until the client reads them
+SPECULATION_MAX_BUFFER = get_setting("speculation_max_buffer", "SPECULATION_MAX_BUFFER", 256, int)
+
+SPECULATION_OUTCOMES = Counter(
+    "llm_speculation_total", "Decisions by what happened to the speculative answer (committed, cancelled or skipped)."
+)
+SPECULATION_TOKENS_SAVED = Counter(
+    "llm_speculation_tokens_saved_total", "Answer tokens already generated when a speculative answer was committed."
+)
+SPECULATION_TOKENS_WASTED = Counter(
+    "llm_speculation_tokens_wasted_total", "Answer tokens generated by speculative answers that were cancelled."
+)
+SPECULATION_HEAD_START = Histogram(
+    "llm_speculation_head_start_seconds", "How long a committed speculative answer had been running when the decision arrived."
+)
+
+PATH_HINT = re.compile(r"(^|\s)(~?/|\.{1,2}/|[A-Za-z]:\\)|\w\.(py|js|ts|md|txt|json|csv|log|pdf|docx|html|css|ya?ml)\b", re.I)
+QUESTION_WORDS = {
+    "what", "why", "how", "who", "when", "where", "which", "is", "are", "can", "could", "should", "does", "do",
+    "explain", "tell", "describe", "define", "compare", "give", "write",
+}
+FILE_WORDS = {
+    "file", "files", "folder", "folders", "directory", "directories", "path", "read", "save", "open",
+    "list", "project", "repo", "repository", "document", "pdf", "docx",
+}
+
+
+def general_confidence(user_prompt):
+    """
+    A cheap guess in [0, 1] of how likely the decision is a single general_question:
+    anything that looks like a path rules it out, question phrasing raises it and
+    file or folder vocabulary lowers it.
+    """
+    if PATH_HINT.search(user_prompt):
+        return 0.0
+    words = re.findall(r"[a-z]+", user_prompt.lower())
+    if not words:
+        return 0.0
+    score = 0.6
+    if words[0] in QUESTION_WORDS or user_prompt.rstrip().endswith("?"):
+        score += 0.3
+    score -= 0.25 * sum(1 for word in words if word in FILE_WORDS)
+    return max(0.0, min(1.0, score))
+
+
+class SpeculationBudget:
+    """
+    Caps the share of recent decisions that speculate, since every speculation that is
+    cancelled costs backend time.
+    """
+
+    def __init__(self, max_share=SPECULATION_MAX_SHARE, window=SPECULATION_WINDOW):
+        self.max_share = max_share
+        self.recent = deque(maxlen=max(1, window))
+
+    def allow(self):
+        speculated = sum(self.recent)
+        return speculated < self.max_share * (len(self.recent) + 1)
+
+    def record(self, speculated):
+        self.recent.append(bool(speculated))
+
+
+speculation_budget = SpeculationBudget()
+
+
+def should_speculate(user_prompt, model):
+    """
+    Returns True if a speculative answer should start alongside the decision, and records why not otherwise.
+    """
+    if not SPECULATION_ENABLED:
+        return False
+    if general_confidence(user_prompt) < SPECULATION_MIN_CONFIDENCE:
+        outcome = "skipped_confidence"
+    elif get_admission_queue(model).waiting:
+        # Requests are already queueing for this model; extra generations would only slow them down
+        outcome = "skipped_load"
+    elif not speculation_budget.allow():
+        outcome = "skipped_budget"
+    else:
+        speculation_budget.record(True)
+        return True
+    speculation_budget.record(False)
+    SPECULATION_OUTCOMES.inc(outcome=outcome, model=model)
+    return False
+
+
+class SpeculativeAnswer:
+    """
+    An answer stream started before the decision is known. Its output is buffered, not sent:
+    commit() replays the buffer and follows the live stream, cancel() stops the generation.
+    At most max_buffer unread chunks are held; beyond that the source is not read, so an
+    uncommitted answer or a stalled client pauses the backend instead of growing the buffer.
+    kept is the future the source waits on before caching or recording the finished answer
+    (general_question's kept); it is resolved True on commit and False on cancel.
+    """
+
+    def __init__(self, source, stats, model, kept=None, max_buffer=SPECULATION_MAX_BUFFER):
+        self.source = source
+        self.stats = stats
+        self.model = model
+        self.kept = kept
+        self.max_buffer = max(1, max_buffer)
+        self.buffer = deque()
+        self.done = False
+        self.error = None
+        self.committed = False
+        self.cancelled = False
+        self.updated = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.started_at = time.perf_counter()
+        self.task = asyncio.create_task(self._pump())
+
+    async def _pump(self):
+        try:
+            async for chunk in self.source:
+                self.buffer.append(chunk)
+                self._notify()
+                while len(self.buffer) >= self.max_buffer:
+                    await self.drained.wait()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            await self.source.aclose()
+
+    def _resolve(self, kept):
+        if self.kept is not None and not self.kept.done():
+            self.kept.set_result(kept)
+
+    def _notify(self):
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    def _drain(self):
+        self.drained.set()
+        self.drained = asyncio.Event()
+
+    def commit(self):
+        """
+        Returns the step result for the general_question the decision asked for.
+        """
+        self.committed = True
+        self._resolve(True)
+        SPECULATION_OUTCOMES.inc(outcome="committed", model=self.model)
+        SPECULATION_TOKENS_SAVED.inc(self.stats.get("tokens", 0), model=self.model)
+        SPECULATION_HEAD_START.observe(time.perf_counter() - self.started_at, model=self.model)
+        logging.info(f"SpeculativeAnswer: Committed with {self.stats.get('tokens', 0)} tokens already generated.")
+        return {"stream_generator": self._follow(), "stream_stats": self.stats}
+
+    async def _follow(self):
+        try:
+            while True:
+                if self.buffer:
+                    # There is one reader, so a chunk is dropped once it has been handed out
+                    chunk = self.buffer.popleft()
+                    self._drain()
+                    yield chunk
+                    continue
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self.updated.wait()
+        finally:
+            if not self.done:
+                self.task.cancel()
+
+    def cancel(self):
+        if self.committed or self.cancelled:
+            return
+        self.cancelled = True
+        self._resolve(False)
+        self.task.cancel()
+        SPECULATION_OUTCOMES.inc(outcome="cancelled", model=self.model)
+        SPECULATION_TOKENS_WASTED.inc(self.stats.get("tokens", 0), model=self.model)
+        logging.info(f"SpeculativeAnswer: Cancelled after {self.stats.get('tokens', 0)} wasted tokens.")
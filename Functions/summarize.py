@@ -0,0 +1,234 @@
+import os
+import asyncio
+import logging
+from LLM_interface.config import get_setting
+from LLM_interface.query_llm import MODEL_NAME, query_llm_text
+from Functions.content_index import get_content_index
+from Functions.extraction_pool import run_on_pool
+from Functions.file_reader import document_chunks, file_kind, iter_chunks
+
+# Hard cap on the prompt tokens of every stage (map, intermediate reduce, final explanation)
+SUMMARY_MAX_PROMPT_TOKENS = get_setting("summary_max_prompt_tokens", "SUMMARY_MAX_PROMPT_TOKENS", 6000, int)
+SUMMARY_CHUNK_TOKENS = get_setting("summary_chunk_tokens", "SUMMARY_CHUNK_TOKENS", 2000, int)
+SUMMARY_OUTPUT_TOKENS = get_setting("summary_output_tokens", "SUMMARY_OUTPUT_TOKENS", 256, int)
+SUMMARY_CONCURRENCY = get_setting("summary_concurrency", "SUMMARY_CONCURRENCY", 4, int)
+# Files streamed from disk are summarized from at most this many chunks (evenly spaced samples beyond)
+SUMMARY_MAX_FILE_CHUNKS = get_setting("summary_max_file_chunks", "SUMMARY_MAX_FILE_CHUNKS", 32, int)
+
+CHARS_PER_TOKEN = 4
+
+CHUNK_INSTRUCTION = (
+    "Summarize the following part of the file '{name}' in a few sentences. "
+    "Focus on its purpose, key components and functionality.\n\n"
+)
+MERGE_INSTRUCTION = (
+    "Combine the following summaries into one concise summary. "
+    "Keep the purpose, key components and functionality of every part.\n\n"
+)
+EXPLANATION_HEADER = "Here is the folder structure of a programming project:\n\n"
+EXPLANATION_FOOTER = "\n\nExplain the overall purpose of the project, key components, and functionality."
+FILE_EXPLANATION_HEADER = "Here is a summary of the file '{name}' ({size} bytes), built from its parts:\n\n"
+FILE_EXPLANATION_FOOTER = "\n\nExplain the purpose and content of this file."
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (about four characters per token for English text and code).
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+TRUNCATION_MARKER = "\n... (truncated)"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts text to at most max_tokens (estimated), the truncation marker included.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= len(TRUNCATION_MARKER):
+        return text[:max(0, max_chars)]
+    return text[:max_chars - len(TRUNCATION_MARKER)] + TRUNCATION_MARKER
+
+
+def chunk_text(text: str, max_tokens: int):
+    """
+    Splits text into chunks of at most max_tokens, preferring line boundaries.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    chunks = []
+    current = []
+    current_len = 0
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                chunks.append("".join(current))
+                current, current_len = [], 0
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if current_len + len(line) > max_chars and current:
+            chunks.append("".join(current))
+            current, current_len = [], 0
+        current.append(line)
+        current_len += len(line)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def fits_in_budget(folder_structure: str, files) -> bool:
+    total_chars = len(EXPLANATION_HEADER) + len(folder_structure) + len(EXPLANATION_FOOTER)
+    total_chars += sum(len(entry["name"]) + len(entry["content"]) + 4 for entry in files)
+    return total_chars <= SUMMARY_MAX_PROMPT_TOKENS * CHARS_PER_TOKEN
+
+
+class Summarizer:
+    """
+    Map-reduce summarization against the LLM backend with bounded concurrency.
+    """
+
+    def __init__(self, api_url, model_name, max_prompt_tokens=SUMMARY_MAX_PROMPT_TOKENS):
+        self.api_url = api_url
+        self.model_name = model_name or MODEL_NAME
+        self.max_prompt_tokens = max_prompt_tokens
+        self.semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+        self.options = {"num_predict": SUMMARY_OUTPUT_TOKENS}
+
+    async def complete(self, prompt: str) -> str:
+        prompt = truncate_to_tokens(prompt, self.max_prompt_tokens)
+        async with self.semaphore:
+            return (await query_llm_text(self.api_url, self.model_name, prompt, self.options)).strip()
+
+    async def merge(self, summaries):
+        """
+        Reduces summaries to one, in as many rounds as needed to keep every prompt under the cap.
+        """
+        budget = self.max_prompt_tokens - estimate_tokens(MERGE_INSTRUCTION)
+        # Any two summaries fit in one merge prompt, so every round at least halves the list
+        per_summary = budget // 3
+        while len(summaries) > 1:
+            batches = [[]]
+            for summary in summaries:
+                summary = truncate_to_tokens(summary, per_summary)
+                if batches[-1] and estimate_tokens("\n\n".join(batches[-1] + [summary])) > budget:
+                    batches.append([])
+                batches[-1].append(summary)
+            summaries = await asyncio.gather(*(self.merge_batch(batch) for batch in batches))
+        return summaries[0] if summaries else ""
+
+    async def merge_batch(self, batch):
+        if len(batch) == 1:
+            return batch[0]
+        return await self.complete(MERGE_INSTRUCTION + "\n\n".join(batch))
+
+    async def summarize_chunks(self, instruction, chunks):
+        """
+        Summarizes chunks from a blocking generator, reading only as many as are being summarized,
+        so a file streamed from disk is never held in memory whole.
+        """
+        loop = asyncio.get_running_loop()
+        summaries = []
+        reading = None
+        try:
+            while True:
+                batch = []
+                for _ in range(SUMMARY_CONCURRENCY):
+                    reading = loop.run_in_executor(None, next, chunks, None)
+                    # Shielded, so a cancel leaves reading pending until next() really returns
+                    chunk = await asyncio.shield(reading)
+                    if chunk is None:
+                        break
+                    batch.append(chunk)
+                if batch:
+                    summaries.extend(await asyncio.gather(*(self.complete(instruction + chunk) for chunk in batch)))
+                if len(batch) < SUMMARY_CONCURRENCY:
+                    return summaries
+        finally:
+            if reading is not None and not reading.done():
+                # A running generator cannot be closed; close it once the thread is out of next()
+                reading.add_done_callback(lambda _: chunks.close())
+            else:
+                chunks.close()
+
+    async def summarize_file(self, entry):
+        """
+        Summarizes one file, reusing the cached summary of the same file version when there is one.
+        An entry without "content" is streamed from entry["path"] chunk by chunk.
+        """
+        index = get_content_index()
+        cached = None
+        if entry.get("mtime_ns") is not None:
+            cached = await asyncio.to_thread(
+                index.lookup_summary, entry["path"], self.model_name, entry["mtime_ns"], entry["size"]
+            )
+        if cached is not None:
+            return cached
+
+        instruction = CHUNK_INSTRUCTION.format(name=entry["name"])
+        chunk_tokens = min(SUMMARY_CHUNK_TOKENS, self.max_prompt_tokens - estimate_tokens(instruction))
+        if entry.get("content") is not None:
+            chunks = chunk_text(entry["content"], chunk_tokens)
+            chunk_summaries = await asyncio.gather(*(self.complete(instruction + chunk) for chunk in chunks))
+        elif file_kind(entry["path"]) == "text":
+            chunk_summaries = await self.summarize_chunks(
+                instruction, iter_chunks(entry["path"], chunk_tokens * CHARS_PER_TOKEN, SUMMARY_MAX_FILE_CHUNKS)
+            )
+        else:
+            # Document parsing runs on the extraction pool with its per-file timeout, like read_file
+            chunks = await asyncio.to_thread(
+                run_on_pool, document_chunks, entry["path"], chunk_tokens * CHARS_PER_TOKEN, SUMMARY_MAX_FILE_CHUNKS
+            )
+            chunk_summaries = await asyncio.gather(*(self.complete(instruction + chunk) for chunk in chunks))
+        summary = await self.merge(list(chunk_summaries))
+
+        if entry.get("mtime_ns") is not None and summary:
+            await asyncio.to_thread(
+                index.store_summary, entry["path"], self.model_name, entry["mtime_ns"], entry["size"], summary
+            )
+        return summary
+
+    async def build_explanation_prompt(self, folder_structure: str, files):
+        """
+        Map: summarize every file concurrently. Reduce: fold the summaries until the final
+        explanation prompt (folder structure included) fits in the token cap.
+        """
+        logging.info(f"Summarizer: Summarizing {len(files)} files with {self.model_name}.")
+        tree_budget = self.max_prompt_tokens // 4
+        folder_structure = truncate_to_tokens(folder_structure, tree_budget)
+        fixed_tokens = estimate_tokens(EXPLANATION_HEADER + folder_structure + EXPLANATION_FOOTER) + 16
+
+        summaries = await asyncio.gather(*(self.summarize_file(entry) for entry in files))
+        sections = [f"# {entry['name']}\n{summary}" for entry, summary in zip(files, summaries) if summary]
+
+        budget = self.max_prompt_tokens - fixed_tokens
+        if estimate_tokens("\n\n".join(sections)) > budget:
+            merged = await self.merge(sections)
+            sections = [truncate_to_tokens(merged, budget)]
+
+        return (
+            f"{EXPLANATION_HEADER}{folder_structure}\n\n"
+            "Below are summaries of the files:\n\n" + "\n\n".join(sections) + EXPLANATION_FOOTER
+        )
+
+
+    async def build_file_explanation_prompt(self, entry):
+        """
+        Explanation prompt for a single file too large for one prompt, from its streamed summary.
+        """
+        logging.info(f"Summarizer: Summarizing large file {entry['path']} with {self.model_name}.")
+        header = FILE_EXPLANATION_HEADER.format(name=entry["name"], size=entry["size"])
+        budget = self.max_prompt_tokens - estimate_tokens(header + FILE_EXPLANATION_FOOTER)
+        summary = truncate_to_tokens(await self.summarize_file(entry), budget)
+        return f"{header}{summary}{FILE_EXPLANATION_FOOTER}"
+
+
+def file_entry(path: str, content: str, stat_result=None):
+    return {
+        "path": path,
+        "name": os.path.basename(path),
+        "content": content,
+        "mtime_ns": stat_result.st_mtime_ns if stat_result else None,
+        "size": stat_result.st_size if stat_result else None,
+    }
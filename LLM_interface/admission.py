@@ -0,0 +1,175 @@
+import math
+import time
+import bisect
+import asyncio
+import logging
+import itertools
+from LLM_interface.config import get_setting
+from LLM_interface.metrics import CallbackMetric, Counter, Histogram
+
+# Concurrent requests per model; models not listed get the total capacity of the backends serving them
+ADMISSION_LIMITS = get_setting("admission_limits", default={})
+# Requests allowed to wait for a slot; beyond that new requests get 429
+ADMISSION_QUEUE_SIZE = get_setting("admission_queue_size", "ADMISSION_QUEUE_SIZE", 32, int)
+
+ADMISSION_WAIT_SECONDS = Histogram("llm_admission_wait_seconds", "Time requests waited for a backend slot.")
+ADMISSION_REJECTED = Counter("llm_admission_rejected_total", "Requests rejected because the wait queue was full.")
+
+
+class QueueFull(Exception):
+    def __init__(self, model, retry_after):
+        super().__init__(f"The queue for model '{model}' is full.")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self, queue, priority, sequence):
+        self.queue = queue
+        self.priority = priority
+        self.sequence = sequence
+        self.enqueued_at = time.perf_counter()
+        self.granted_at = None
+        self.released = False
+
+    @property
+    def sort_key(self):
+        # Higher priority first, then arrival order
+        return (-self.priority, self.sequence)
+
+    @property
+    def granted(self):
+        return self.granted_at is not None
+
+    def wait_seconds(self):
+        return (self.granted_at or time.perf_counter()) - self.enqueued_at
+
+    async def positions(self):
+        """
+        Yields this ticket's 1-based queue position whenever it changes, until a slot is granted.
+        """
+        last = None
+        while not self.granted:
+            position = self.queue.position(self)
+            if position != last:
+                last = position
+                yield position
+            await self.queue.changed.wait()
+
+    async def wait(self):
+        while not self.granted:
+            await self.queue.changed.wait()
+
+    def release(self):
+        self.queue.release(self)
+
+
+class AdmissionQueue:
+    """
+    A concurrency limit with a bounded priority wait queue for one model. Slots are handed
+    directly to the next waiter on release, so a burst cannot overtake queued requests.
+    """
+
+    def __init__(self, model, limit, max_queue=ADMISSION_QUEUE_SIZE):
+        self.model = model
+        self.limit = max(1, int(limit))
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.changed = asyncio.Event()
+        # Running average of how long a request holds its slot, for Retry-After
+        self.average_hold = 5.0
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def enqueue(self, priority=0):
+        """
+        Returns a ticket that is either granted right away or waiting in the queue.
+        Raises QueueFull when the queue is at capacity.
+        """
+        ticket = Ticket(self, priority, next(self.sequence))
+        if self.active < self.limit and not self.waiting:
+            self._grant(ticket)
+            return ticket
+        if len(self.waiting) >= self.max_queue:
+            ADMISSION_REJECTED.inc(model=self.model)
+            raise QueueFull(self.model, self.retry_after())
+        bisect.insort(self.waiting, ticket, key=lambda waiting: waiting.sort_key)
+        logging.info(f"AdmissionQueue: {self.model} at capacity, request queued at position {self.position(ticket)}.")
+        self._notify()
+        return ticket
+
+    def _grant(self, ticket):
+        self.active += 1
+        ticket.granted_at = time.perf_counter()
+        ADMISSION_WAIT_SECONDS.observe(ticket.wait_seconds(), model=self.model)
+
+    def position(self, ticket):
+        try:
+            return self.waiting.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def release(self, ticket):
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted:
+            self.active -= 1
+            held = time.perf_counter() - ticket.granted_at
+            self.average_hold = 0.8 * self.average_hold + 0.2 * held
+            while self.waiting and self.active < self.limit:
+                self._grant(self.waiting.pop(0))
+        elif ticket in self.waiting:
+            # The client left while queued
+            self.waiting.remove(ticket)
+        self._notify()
+
+    def retry_after(self):
+        return max(1, math.ceil(self.average_hold * (len(self.waiting) + 1) / self.limit))
+
+    def stats(self):
+        return {
+            "model": self.model,
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self.waiting),
+            "max_queue": self.max_queue,
+            "average_hold_seconds": round(self.average_hold, 2),
+        }
+
+
+_queues = {}
+
+
+def model_limit(model):
+    if model in ADMISSION_LIMITS:
+        return ADMISSION_LIMITS[model]
+    from LLM_interface.backend_pool import BACKEND_DEFAULT_CAPACITY, get_backend_pool
+    capacity = sum(backend.capacity for backend in get_backend_pool().backends if backend.serves(model))
+    # No backend serves the model: its requests fail fast, one default backend's worth is plenty
+    return capacity or BACKEND_DEFAULT_CAPACITY
+
+
+def get_admission_queue(model):
+    queue = _queues.get(model)
+    if queue is None:
+        queue = _queues[model] = AdmissionQueue(model, model_limit(model))
+        logging.info(f"get_admission_queue: {model} admits {queue.limit} concurrent requests.")
+    return queue
+
+
+def admission_stats():
+    return [queue.stats() for queue in _queues.values()]
+
+
+admission_queue_depth = CallbackMetric(
+    "llm_admission_queue_depth", "Requests waiting for a slot per model.",
+    lambda: [({"model": queue.model}, len(queue.waiting)) for queue in _queues.values()],
+)
+admission_active = CallbackMetric(
+    "llm_admission_active_requests", "Requests holding a slot per model.",
+    lambda: [({"model": queue.model}, queue.active) for queue in _queues.values()],
+)
@@ -0,0 +1,298 @@
+import json
+import time
+import asyncio
+import logging
+import itertools
+import threading
+import httpx
+from LLM_interface.config import get_setting
+from LLM_interface.llm_client import get_client, post_json as client_post_json, stream_lines as client_stream_lines
+from LLM_interface.metrics import CallbackMetric, Counter
+
+
+def _backends(value):
+    """
+    config.json holds a list; LLM_BACKENDS holds the same list as JSON, or comma separated URLs.
+    Each entry is a URL or a dict with a "url".
+    """
+    if isinstance(value, str):
+        if value.strip().startswith(("[", "{")):
+            value = json.loads(value)
+        else:
+            value = [url.strip() for url in value.split(",") if url.strip()]
+    if not isinstance(value, list):
+        raise ValueError("expected a list of backends")
+    for entry in value:
+        url = entry.get("url") if isinstance(entry, dict) else entry
+        if not isinstance(url, str) or not url:
+            raise ValueError(f"backend entry {entry!r} has no url")
+    return value or None
+
+
+# Example: [{"url": "http://gpu-1:11434", "models": ["llama3.1:70b"], "capacity": 2}, {"url": "http://gpu-2:11434"}]
+# Without it, the pool holds the single api_url endpoint.
+BACKENDS = get_setting("backends", "LLM_BACKENDS", None, _backends)
+BACKEND_DEFAULT_CAPACITY = get_setting("backend_default_capacity", "BACKEND_DEFAULT_CAPACITY", 4, int)
+BACKEND_HEALTH_INTERVAL = get_setting("backend_health_interval", "BACKEND_HEALTH_INTERVAL", 15.0, float)
+BACKEND_HEALTH_TIMEOUT = get_setting("backend_health_timeout", "BACKEND_HEALTH_TIMEOUT", 3.0, float)
+# A backend that failed is skipped for this long unless a health check clears it sooner
+BACKEND_FAILURE_COOLDOWN = get_setting("backend_failure_cooldown", "BACKEND_FAILURE_COOLDOWN", 30.0, float)
+# A stream with no first line after this many seconds is abandoned and retried on another backend
+BACKEND_FIRST_TOKEN_TIMEOUT = get_setting("backend_first_token_timeout", "BACKEND_FIRST_TOKEN_TIMEOUT", 60.0, float)
+
+BACKEND_FAILOVERS = Counter("llm_backend_failovers_total", "Requests moved to another backend after a failure.")
+
+
+class NoBackendAvailable(Exception):
+    pass
+
+
+def base_url(url):
+    """
+    "http://host:11434/api/generate" -> "http://host:11434"; a proxy prefix before /api/ is kept.
+    """
+    url = url.rstrip("/")
+    index = url.find("/api/")
+    return url[:index] if index != -1 else url
+
+
+def _retryable(error):
+    """
+    Errors where nothing was generated yet and another backend may do better.
+    """
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code >= 500
+
+
+class Backend:
+    def __init__(self, url, models=None, capacity=BACKEND_DEFAULT_CAPACITY):
+        self.url = base_url(url)
+        self.models = set(models or ["*"])
+        self.capacity = max(1, int(capacity))
+        self.outstanding = 0
+        self.healthy = True
+        self.unhealthy_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+
+    def endpoint(self, path):
+        return f"{self.url}{path}"
+
+    def serves(self, model):
+        return "*" in self.models or model in self.models
+
+    def available(self, now):
+        return self.healthy or now >= self.unhealthy_until
+
+    def load(self):
+        return self.outstanding / self.capacity
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "models": sorted(self.models),
+            "capacity": self.capacity,
+            "outstanding": self.outstanding,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class BackendPool:
+    """
+    Routes each call to the least loaded healthy backend serving the model (outstanding
+    requests relative to capacity, ties rotated). Connection errors, 5xx responses and streams
+    without a first line before the deadline are retried on the next backend. Once a stream has
+    produced output it is never retried, so a client never sees a restarted answer.
+    """
+
+    def __init__(self, backends, first_token_timeout=BACKEND_FIRST_TOKEN_TIMEOUT):
+        self.backends = backends
+        self.first_token_timeout = first_token_timeout
+        self.lock = threading.Lock()
+        self.rotation = itertools.count()
+        self.health_task = None
+
+    @classmethod
+    def from_config(cls, backends=BACKENDS, default_url=None):
+        if not backends:
+            return cls([Backend(default_url)])
+        return cls([
+            Backend(entry["url"], entry.get("models"), entry.get("capacity", BACKEND_DEFAULT_CAPACITY))
+            if isinstance(entry, dict) else Backend(entry)
+            for entry in backends
+        ])
+
+    def pick(self, model, exclude=()):
+        """
+        Reserves a slot on the best backend for the model and returns it, or None.
+        Backends in cooldown are used only when nothing else serves the model.
+        """
+        now = time.monotonic()
+        with self.lock:
+            candidates = [backend for backend in self.backends if backend.serves(model) and backend not in exclude]
+            if not candidates:
+                return None
+            usable = [backend for backend in candidates if backend.available(now)] or candidates
+            offset = next(self.rotation)
+            usable = usable[offset % len(usable):] + usable[:offset % len(usable)]
+            backend = min(usable, key=Backend.load)
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def has_alternative(self, model, tried):
+        return any(backend.serves(model) and backend not in tried for backend in self.backends)
+
+    def release(self, backend):
+        with self.lock:
+            backend.outstanding -= 1
+
+    def mark_failure(self, backend, error):
+        with self.lock:
+            backend.failures += 1
+            backend.healthy = False
+            backend.unhealthy_until = time.monotonic() + BACKEND_FAILURE_COOLDOWN
+            backend.last_error = f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+        logging.warning(f"BackendPool: {backend.url} failed ({backend.last_error}), cooling down.")
+
+    def mark_healthy(self, backend):
+        if not backend.healthy:
+            logging.info(f"BackendPool: {backend.url} is healthy again.")
+        with self.lock:
+            backend.healthy = True
+            backend.unhealthy_until = 0.0
+
+    async def post_json(self, path, payload):
+        model = payload.get("model", "")
+        tried = []
+        while True:
+            backend = self.pick(model, tried)
+            if backend is None:
+                raise NoBackendAvailable(f"No backend available for model '{model}'.")
+            tried.append(backend)
+            try:
+                result = await client_post_json(backend.endpoint(path), payload)
+            except Exception as e:
+                if not _retryable(e):
+                    raise
+                self.mark_failure(backend, e)
+                if not self.has_alternative(model, tried):
+                    raise
+                BACKEND_FAILOVERS.inc()
+                continue
+            finally:
+                self.release(backend)
+            self.mark_healthy(backend)
+            return result
+
+    async def stream_lines(self, path, payload):
+        """
+        Like llm_client.stream_lines, but with failover until the first line arrives.
+        """
+        model = payload.get("model", "")
+        tried = []
+        while True:
+            backend = self.pick(model, tried)
+            if backend is None:
+                raise NoBackendAvailable(f"No backend available for model '{model}'.")
+            tried.append(backend)
+            lines = client_stream_lines(backend.endpoint(path), payload)
+            try:
+                try:
+                    # asyncio.timeout keeps the generator in this task, unlike wait_for
+                    async with asyncio.timeout(self.first_token_timeout):
+                        first = await lines.__anext__()
+                except StopAsyncIteration:
+                    self.mark_healthy(backend)
+                    return
+                except Exception as e:
+                    if not _retryable(e):
+                        raise
+                    self.mark_failure(backend, e)
+                    if not self.has_alternative(model, tried):
+                        raise
+                    BACKEND_FAILOVERS.inc()
+                    continue
+                self.mark_healthy(backend)
+                yield first
+                async for line in lines:
+                    yield line
+                return
+            finally:
+                await lines.aclose()
+                self.release(backend)
+
+    async def check_health(self):
+        client = get_client()
+        for backend in self.backends:
+            try:
+                response = await client.get(backend.endpoint("/api/tags"), timeout=BACKEND_HEALTH_TIMEOUT)
+                response.raise_for_status()
+                self.mark_healthy(backend)
+            except Exception as e:
+                if backend.healthy:
+                    self.mark_failure(backend, e)
+                else:
+                    with self.lock:
+                        backend.last_error = f"{type(e).__name__}: {e}"
+
+    async def _health_loop(self, interval):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(interval)
+
+    def start_health_checks(self, interval=BACKEND_HEALTH_INTERVAL):
+        if self.health_task is None and interval > 0:
+            self.health_task = asyncio.create_task(self._health_loop(interval))
+
+    async def stop_health_checks(self):
+        if self.health_task is not None:
+            self.health_task.cancel()
+            try:
+                await self.health_task
+            except asyncio.CancelledError:
+                pass
+            self.health_task = None
+
+    def stats(self):
+        with self.lock:
+            return [backend.stats() for backend in self.backends]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_backend_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from LLM_interface.query_llm import API_URL
+            _pool = BackendPool.from_config(default_url=API_URL)
+            logging.info(f"get_backend_pool: Routing over {len(_pool.backends)} backend(s).")
+        return _pool
+
+
+def _backend_samples(key):
+    if _pool is None:
+        return []
+    return [({"backend": stats["url"]}, int(stats[key])) for stats in _pool.stats()]
+
+
+backend_outstanding = CallbackMetric(
+    "llm_backend_outstanding_requests", "Requests in flight per backend.", lambda: _backend_samples("outstanding")
+)
+backend_healthy = CallbackMetric(
+    "llm_backend_healthy", "1 if the backend passed its last check.", lambda: _backend_samples("healthy")
+)
+backend_requests = CallbackMetric(
+    "llm_backend_requests_total", "Requests routed per backend.", lambda: _backend_samples("requests"), kind="counter"
+)
+backend_failures = CallbackMetric(
+    "llm_backend_failures_total", "Failed requests and health checks per backend.", lambda: _backend_samples("failures"), kind="counter"
+)
@@ -0,0 +1,43 @@
+import json
+import logging
+import os
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from .env if available
+
+CONFIG_PATH = "LLM_interface/config.json"
+
+
+def load_config(path=CONFIG_PATH):
+    """
+    Loads config.json if it exists. Missing or broken files fall back to an empty config.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as config_file:
+            return json.load(config_file)
+    except Exception as e:
+        logging.warning(f"Could not load config.json: {e}")
+        return {}
+
+
+config = load_config()
+
+
+def get_setting(key, env_name=None, default=None, cast=None):
+    """
+    Looks a setting up in config.json first, then in the environment, then falls back to default.
+    """
+    value = config.get(key)
+    if value is None and env_name:
+        value = os.getenv(env_name)
+    if value is None:
+        return default
+    if cast is not None:
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            logging.warning(f"get_setting: Invalid value for '{key}': {value!r}, using default {default!r}.")
+            return default
+    return value
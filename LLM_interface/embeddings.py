@@ -0,0 +1,41 @@
+import logging
+from LLM_interface.config import get_setting
+from LLM_interface.llm_client import post_json
+from LLM_interface.backend_pool import base_url, get_backend_pool
+from LLM_interface.query_llm import KEEP_ALIVE
+
+EMBED_MODEL = get_setting("embed_model", "EMBED_MODEL", "nomic-embed-text")
+EMBED_BATCH_SIZE = get_setting("embed_batch_size", "EMBED_BATCH_SIZE", 32, int)
+EMBED_PATH = "/api/embed"
+
+
+async def embed_texts(texts, api_url=None, model_name=None):
+    """
+    Embeds texts through the backend's /api/embed endpoint in batches and returns a float32
+    matrix with one row per text. An explicit api_url is used as given (its /api/... path is
+    replaced); otherwise the backend pool routes the call like any other model.
+    """
+    # numpy is only needed once something is embedded, so it stays off the startup path
+    import numpy as np
+
+    model_name = model_name or EMBED_MODEL
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    batches = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        payload = {"model": model_name, "input": texts[start:start + EMBED_BATCH_SIZE], "keep_alive": KEEP_ALIVE}
+        if api_url:
+            data = await post_json(f"{base_url(api_url)}{EMBED_PATH}", payload)
+        else:
+            data = await get_backend_pool().post_json(EMBED_PATH, payload)
+        embeddings = data.get("embeddings")
+        if not embeddings or len(embeddings) != len(payload["input"]):
+            raise ValueError(f"embed_texts: {model_name} returned {len(embeddings or [])} embeddings for {len(payload['input'])} inputs.")
+        batches.append(np.asarray(embeddings, dtype=np.float32))
+    logging.debug("embed_texts: Embedded %d texts with %s.", len(texts), model_name)
+    return np.vstack(batches)
+
+
+async def embed_text(text, api_url=None, model_name=None):
+    return (await embed_texts([text], api_url, model_name))[0]
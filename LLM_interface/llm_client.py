@@ -0,0 +1,74 @@
+import logging
+import httpx
+from LLM_interface.config import get_setting
+
+# Timeouts (seconds) and pool limits for the shared backend client
+HTTP_CONNECT_TIMEOUT = get_setting("http_connect_timeout", "HTTP_CONNECT_TIMEOUT", 5.0, float)
+HTTP_READ_TIMEOUT = get_setting("http_read_timeout", "HTTP_READ_TIMEOUT", 300.0, float)
+HTTP_WRITE_TIMEOUT = get_setting("http_write_timeout", "HTTP_WRITE_TIMEOUT", 30.0, float)
+HTTP_POOL_TIMEOUT = get_setting("http_pool_timeout", "HTTP_POOL_TIMEOUT", 30.0, float)
+HTTP_MAX_CONNECTIONS = get_setting("http_max_connections", "HTTP_MAX_CONNECTIONS", 100, int)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = get_setting("http_max_keepalive_connections", "HTTP_MAX_KEEPALIVE_CONNECTIONS", 20, int)
+HTTP_KEEPALIVE_EXPIRY = get_setting("http_keepalive_expiry", "HTTP_KEEPALIVE_EXPIRY", 60.0, float)
+
+_client = None
+
+
+def get_client():
+    """
+    Returns the process-wide AsyncClient, creating it on first use.
+    All backend calls share its keep-alive connection pool.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                connect=HTTP_CONNECT_TIMEOUT,
+                read=HTTP_READ_TIMEOUT,
+                write=HTTP_WRITE_TIMEOUT,
+                pool=HTTP_POOL_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+        logging.info(
+            f"get_client: Created shared HTTP client (max_connections={HTTP_MAX_CONNECTIONS}, "
+            f"max_keepalive={HTTP_MAX_KEEPALIVE_CONNECTIONS})."
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logging.info("close_client: Shared HTTP client closed.")
+    _client = None
+
+
+async def post_json(url, payload):
+    """
+    Sends a non-streaming request and returns the decoded JSON body.
+    """
+    response = await get_client().post(url, json=payload)
+    logging.info(f"post_json: Received status {response.status_code} from {url}.")
+    response.raise_for_status()
+    return response.json()
+
+
+async def stream_lines(url, payload):
+    """
+    Sends a streaming request and yields the non-empty NDJSON lines as they arrive.
+    Closing the generator closes the upstream response.
+    """
+    async with get_client().stream("POST", url, json=payload) as response:
+        logging.info(f"stream_lines: Received status {response.status_code} from {url}.")
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line:
+                yield line
+
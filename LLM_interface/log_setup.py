@@ -0,0 +1,135 @@
+import copy
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from LLM_interface.config import get_setting
+from LLM_interface.metrics import Counter
+
+LOG_LEVEL = get_setting("log_level", "LOG_LEVEL", "DEBUG")
+LOG_FILE = get_setting("log_file", "LOG_FILE", "server.log")
+LOG_MAX_BYTES = get_setting("log_max_bytes", "LOG_MAX_BYTES", 10 * 1024 * 1024, int)
+LOG_BACKUP_COUNT = get_setting("log_backup_count", "LOG_BACKUP_COUNT", 5, int)
+# Records waiting for the writer thread; when full, new records are dropped instead of blocking
+LOG_QUEUE_SIZE = get_setting("log_queue_size", "LOG_QUEUE_SIZE", 10000, int)
+# Longer messages (prompts, payloads, file contents) are cut when written
+LOG_MAX_MESSAGE_CHARS = get_setting("log_max_message_chars", "LOG_MAX_MESSAGE_CHARS", 2000, int)
+# Per-chunk loggers emit one record in every N calls
+LOG_SAMPLE_EVERY = get_setting("log_sample_every", "LOG_SAMPLE_EVERY", 100, int)
+LOG_SAMPLE_RATES = get_setting("log_sample_rates", default={})
+# HTTP client libraries log every chunk they read at DEBUG
+LOG_LIBRARY_LEVEL = get_setting("log_library_level", "LOG_LIBRARY_LEVEL", "WARNING")
+LIBRARY_LOGGERS = ("httpcore", "httpx", "multipart", "python_multipart")
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+_listener = None
+_lock = threading.Lock()
+_exception_formatter = logging.Formatter()
+
+
+class TruncatingFormatter(logging.Formatter):
+    def __init__(self, fmt=LOG_FORMAT, max_chars=LOG_MAX_MESSAGE_CHARS):
+        super().__init__(fmt)
+        self.max_chars = max_chars
+
+    def format(self, record):
+        message = record.getMessage()
+        if self.max_chars > 0 and len(message) > self.max_chars:
+            record.msg = f"{message[:self.max_chars]}... [{len(message) - self.max_chars} more chars]"
+            record.args = None
+        return super().format(record)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread after merging their arguments into the message, so
+    a mutable argument is logged as it was at the call. The line format, truncation and
+    file I/O happen on the listener thread.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks are rendered now as well; exc_info holds live frames
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class SampledLogger:
+    """
+    Logger for per-chunk events: only every Nth call reaches the underlying logger.
+    Sampling is approximate under concurrency, which is fine for diagnostics.
+    """
+
+    def __init__(self, name, every=None):
+        self.logger = logging.getLogger(name)
+        self.every = max(1, int(every if every is not None else LOG_SAMPLE_RATES.get(name, LOG_SAMPLE_EVERY)))
+        self.calls = 0
+
+    def debug(self, msg, *args):
+        self.calls += 1
+        if self.calls % self.every == 0 and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"{msg} (1 in {self.every})", *args)
+
+
+def sampled_logger(name, every=None):
+    return SampledLogger(name, every)
+
+
+def configure_logging(level=LOG_LEVEL, log_file=LOG_FILE):
+    """
+    Routes all logging through a bounded queue to a background thread that writes to the
+    console and a size-rotated log file. Safe to call more than once.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        formatter = TruncatingFormatter()
+        handlers = [logging.StreamHandler()]
+        if log_file:
+            handlers.append(RotatingFileHandler(
+                log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+            ))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(NonBlockingQueueHandler(log_queue))
+        root.setLevel(level)
+        for name in LIBRARY_LOGGERS:
+            logging.getLogger(name).setLevel(LOG_LIBRARY_LEVEL)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    Flushes queued records and stops the writer thread.
+    """
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
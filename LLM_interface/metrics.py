@@ -0,0 +1,198 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 500)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in items) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self):
+        return []
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self.values = {}
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class CallbackMetric(Metric):
+    """
+    A metric read from existing state when /metrics is scraped, so the hot path pays nothing.
+    fn returns a number or a list of (labels, value) pairs.
+    """
+
+    def __init__(self, name, help_text, fn, kind="gauge"):
+        super().__init__(name, help_text)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        try:
+            result = self.fn()
+        except Exception as e:
+            logging.warning(f"CallbackMetric: Collecting {self.name} failed: {e}")
+            return []
+        if not isinstance(result, list):
+            result = [({}, result)]
+        return [f"{self.name}{_format_labels(_label_key(labels))} {_format_value(value)}" for labels, value in result]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self.lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self.series.items()]
+        lines = []
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, {'le': _format_value(float(bound))})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+def render_metrics():
+    """
+    Renders every registered metric in the Prometheus text exposition format.
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Request pipeline metrics
+STAGE_SECONDS = Histogram(
+    "llm_stage_duration_seconds",
+    "Time spent in each stage of handling a prompt.",
+)
+STAGE_ERRORS = Counter("llm_stage_errors_total", "Errors raised per stage.")
+TTFT_SECONDS = Histogram("llm_time_to_first_token_seconds", "Time from request start to the first answer token.")
+TTFB_SECONDS = Histogram("llm_time_to_first_byte_seconds", "Time from request start to the first byte sent to the client.")
+TOKENS_PER_SECOND = Histogram("llm_tokens_per_second", "Answer generation speed per stream.", buckets=RATE_BUCKETS)
+STREAM_TOKENS = Counter("llm_stream_tokens_total", "Answer tokens streamed to clients.")
+
+
+@contextmanager
+def span(stage, function="", model=""):
+    """
+    Times a block into llm_stage_duration_seconds and counts exceptions raised from it.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage, function=function, model=model)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, function=function, model=model)
+
+
+def observe_stage(stage, seconds, function="", model=""):
+    STAGE_SECONDS.observe(seconds, stage=stage, function=function, model=model)
+
+
+def record_error(stage, function="", model=""):
+    STAGE_ERRORS.inc(stage=stage, function=function, model=model)
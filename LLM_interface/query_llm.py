@@ -1,37 +1,34 @@
 import json
-import requests
+import time
 import logging
-import os
-from dotenv import load_dotenv
+import httpx
+from LLM_interface.config import get_setting
+from LLM_interface.llm_client import post_json, stream_lines
+from LLM_interface.backend_pool import get_backend_pool, NoBackendAvailable
+from LLM_interface.single_flight import SINGLE_FLIGHT_ENABLED, flight_key, single_flight
+from LLM_interface.log_setup import sampled_logger
 
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
-
-load_dotenv()  # Load environment variables from .env if available
+# Per-chunk events are sampled so DEBUG logging stays cheap while streaming
+chunk_log = sampled_logger("llm.stream")
 
 AVAILABLE_FUNCTIONS = {
     "handle_path": "If the user only gives a path, detect if it is a file or folder.",
-    "read_file": "Read the contents of a file.",
+    "read_file": "Read the contents of a file. Optional parameters: explain (true to explain the content) and preview (head, tail or sample) for large files.",
     "write_file": "Write or update a file with given content.",
     "list_folder": "List folder structure and explain project.",
+    "folder_question": "Answer a question about the contents of files in a folder. Parameters: path and question.",
     "general_question": "Answer general questions. Parameter should be /:/ to keep consistency."
 }
 
-# Try loading from config.json if exists
-CONFIG_PATH = "LLM_interface/config.json"
-config = {}
-if os.path.exists(CONFIG_PATH):
-    try:
-        with open(CONFIG_PATH, "r") as config_file:
-            config = json.load(config_file)
-    except Exception as e:
-        logging.warning(f"Could not load config.json: {e}")
-
-# Fallback to environment variables if no config is provided
-MODEL_NAME = config.get("model_name", os.getenv("MODEL_NAME", "llama3.1:70b"))
-API_URL = config.get("api_url", os.getenv("API_URL", "http://localhost:11434/api/generate"))
+# config.json first, then environment variables, then defaults
+MODEL_NAME = get_setting("model_name", "MODEL_NAME", "llama3.1:70b")
+API_URL = get_setting("api_url", "API_URL", "http://localhost:11434/api/generate")
+# How long the backend keeps the model loaded after a request (Ollama duration string or seconds)
+KEEP_ALIVE = get_setting("keep_alive", "OLLAMA_KEEP_ALIVE", "30m")
+GENERATE_PATH = "/api/generate"
 
-def preprocess_prompt_with_functions(user_prompt):
-    system_directive = f"""
+def build_decision_system_prompt():
+    return f"""
     You are a multi-functional assistant. You can:
     1. Use the following functions:
     {json.dumps(AVAILABLE_FUNCTIONS, indent=2)}
@@ -57,79 +54,149 @@ def preprocess_prompt_with_functions(user_prompt):
         ]
     }}
     """
-    return f"{system_directive}\n\nUser Prompt: {user_prompt}"
 
-def process_streamed_responses(response):
-    chunk_count = 0
-    for chunk in response.iter_lines(decode_unicode=True):
-        if chunk is not None:
-            chunk_count += 1
-            logging.debug(f"process_streamed_responses: Received chunk #{chunk_count}: {chunk[:100]}...")
-            yield chunk + "\n"
-    logging.info(f"process_streamed_responses: Total {chunk_count} chunks received.")
+# Built once: an identical system prompt on every decision call lets the backend reuse its cached prefix
+DECISION_SYSTEM_PROMPT = build_decision_system_prompt()
 
-def query_llm_function_decision(api_url, model_name, prompt, stream=True):
-    # If not provided, fallback to global
-    if not api_url:
-        api_url = API_URL
+def decision_prompt(user_prompt):
+    """
+    The per-request part of the decision call; the directive travels as DECISION_SYSTEM_PROMPT.
+    """
+    return f"User Prompt: {user_prompt}"
+
+def preprocess_prompt_with_functions(user_prompt):
+    # Flat single-prompt form, for backends without a separate system prompt
+    return f"{DECISION_SYSTEM_PROMPT}\n\n{decision_prompt(user_prompt)}"
+
+def build_payload(model_name, prompt, stream, system=None, context=None, options=None):
+    """
+    Builds an /api/generate payload. keep_alive is always sent so the model stays loaded between requests.
+    """
+    payload = {"model": model_name, "prompt": prompt, "stream": stream, "keep_alive": KEEP_ALIVE}
+    if system:
+        payload["system"] = system
+    if context:
+        payload["context"] = context
+    if options:
+        payload["options"] = options
+    return payload
+
+def generate_stream(api_url, payload):
+    """
+    An explicit api_url (the form field) is used as given; otherwise the backend pool picks
+    the endpoint and fails over between backends.
+    """
+    if api_url:
+        return stream_lines(api_url, payload)
+    return get_backend_pool().stream_lines(GENERATE_PATH, payload)
+
+async def generate_json(api_url, payload):
+    if api_url:
+        return await post_json(api_url, payload)
+    return await get_backend_pool().post_json(GENERATE_PATH, payload)
+
+def shared_generate_stream(api_url, payload):
+    """
+    Identical concurrent generations share one upstream stream (see LLM_interface/single_flight.py).
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        return generate_stream(api_url, payload)
+    return single_flight.stream(flight_key(api_url, payload), lambda: generate_stream(api_url, payload))
+
+async def shared_generate_json(api_url, payload):
+    if not SINGLE_FLIGHT_ENABLED:
+        return await generate_json(api_url, payload)
+    return await single_flight.call(flight_key(api_url, payload), lambda: generate_json(api_url, payload))
+
+async def stream_llm_decision(api_url, model_name, prompt, system=DECISION_SYSTEM_PROMPT):
+    """
+    Streams the decision call token by token. Unlike query_llm_marked_response, request errors
+    propagate to the caller. Closing the generator closes the upstream stream, which stops generation.
+    """
     if not model_name:
         model_name = MODEL_NAME
 
-    headers = {"Content-Type": "application/json"}
-    payload = {"model": model_name, "prompt": prompt, "stream": stream}
-
-    logging.info("query_llm_function_decision: Sending request to LLM for function decision.")
-    logging.debug(f"query_llm_function_decision: Payload: {payload}")
-
-    with requests.post(api_url, headers=headers, json=payload, stream=stream) as response:
-        logging.info(f"query_llm_function_decision: Received status {response.status_code} from LLM.")
-        response.raise_for_status()
-        if stream:
-            decision_text = ""
-            for chunk in process_streamed_responses(response):
-                decision_text += chunk
-            logging.debug(f"query_llm_function_decision: Full decision response: {decision_text}")
-            return decision_text
-        else:
-            data = response.json()
-            return data.get("response", "No response.")
-
-def query_llm_marked_response(api_url, model_name, prompt, stream=True):
+    payload = build_payload(model_name, prompt, True, system=system)
+    logging.info("stream_llm_decision: Streaming function decision from LLM.")
+    async for chunk in generate_stream(api_url, payload):
+        json_chunk = json.loads(chunk)
+        if json_chunk.get("response"):
+            yield json_chunk["response"]
+        if json_chunk.get("done"):
+            break
+
+async def query_llm_text(api_url, model_name, prompt, options=None):
+    """
+    Non-streaming completion used for internal steps such as chunk summaries.
+    """
+    if not model_name:
+        model_name = MODEL_NAME
+
+    payload = build_payload(model_name, prompt, False, options=options)
+    logging.debug("query_llm_text: Sending %d prompt characters to %s.", len(prompt), model_name)
+    data = await shared_generate_json(api_url, payload)
+    return data.get("response", "")
+
+async def warm_model(api_url=None, model_name=None):
+    """
+    Loads the model and prefills the decision system prompt, so the first real request
+    neither waits for a model load nor re-processes the directive.
+    """
+    model_name = model_name or MODEL_NAME
+    payload = build_payload(model_name, decision_prompt(""), False, system=DECISION_SYSTEM_PROMPT, options={"num_predict": 1})
+    if api_url:
+        urls = [api_url]
+    else:
+        # Every backend serving the model keeps its own cache
+        urls = [backend.endpoint(GENERATE_PATH) for backend in get_backend_pool().backends if backend.serves(model_name)]
+    for url in urls:
+        started = time.perf_counter()
+        await post_json(url, payload)
+        logging.info("warm_model: %s warmed on %s in %.0f ms.", model_name, url, (time.perf_counter() - started) * 1000)
+
+def _record_stream_stats(stats, json_chunk):
+    if json_chunk.get("response"):
+        stats["tokens"] = stats.get("tokens", 0) + 1
+        stats.setdefault("first_token_at", time.perf_counter())
+    if json_chunk.get("done"):
+        stats["finished_at"] = time.perf_counter()
+        for key in ("eval_count", "eval_duration", "prompt_eval_count", "prompt_eval_duration", "context"):
+            if key in json_chunk:
+                stats[key] = json_chunk[key]
+
+async def query_llm_marked_response(api_url, model_name, prompt, stream=True, stats=None, context=None):
+    """
+    Yields response tokens as the backend emits them. If a stats dict is given it is filled
+    with the token count, the time of the first token, the backend's eval counters and the
+    returned context, which a follow-up call can pass back as `context` to skip re-prefilling
+    the conversation so far.
+    """
     # If not provided, fallback to global
-    if not api_url:
-        api_url = API_URL
     if not model_name:
         model_name = MODEL_NAME
 
     logging.info("query_llm_marked_response: Preparing to send request for streamed response.")
-    headers = {"Content-Type": "application/json"}
-    payload = {"model": model_name, "prompt": prompt, "stream": stream}
-    logging.debug(f"query_llm_marked_response: Payload: {payload}")
+    payload = build_payload(model_name, prompt, stream, context=context)
+    logging.debug("query_llm_marked_response: Payload: %s", payload)
 
     try:
-        with requests.post(api_url, headers=headers, json=payload, stream=stream) as response:
-            logging.info(f"query_llm_marked_response: LLM responded with status {response.status_code}")
-            response.raise_for_status()
-            chunk_count = 0
-
-            for chunk in response.iter_lines(decode_unicode=True):
-                if chunk:
-                    chunk_count += 1
-                    logging.debug(f"query_llm_marked_response: Raw Chunk #{chunk_count}: {chunk[:100]}...")
-                    try:
-                        json_chunk = json.loads(chunk)
-                        if "response" in json_chunk:
-                            logging.debug(f"query_llm_marked_response: Extracted response: {json_chunk['response'][:100]}...")
-                            yield json_chunk["response"]
-                        else:
-                            logging.warning("query_llm_marked_response: 'response' field missing in chunk.")
-                    except json.JSONDecodeError as e:
-                        logging.error(f"query_llm_marked_response: JSON decoding error: {e}")
-                        yield f"Error decoding chunk: {e}"
+        chunk_count = 0
+        async for chunk in shared_generate_stream(api_url, payload):
+            chunk_count += 1
+            chunk_log.debug("query_llm_marked_response: Raw Chunk #%d: %.100s", chunk_count, chunk)
+            try:
+                json_chunk = json.loads(chunk)
+                if stats is not None:
+                    _record_stream_stats(stats, json_chunk)
+                if "response" in json_chunk:
+                    yield json_chunk["response"]
                 else:
-                    logging.debug("query_llm_marked_response: Received empty chunk.")
+                    logging.warning("query_llm_marked_response: 'response' field missing in chunk.")
+            except json.JSONDecodeError as e:
+                logging.error(f"query_llm_marked_response: JSON decoding error: {e}")
+                yield f"Error decoding chunk: {e}"
 
-            logging.info(f"query_llm_marked_response: Streaming ended after {chunk_count} chunks.")
-    except requests.RequestException as e:
+        logging.info("query_llm_marked_response: Streaming ended after %d chunks.", chunk_count)
+    except (httpx.HTTPError, NoBackendAvailable) as e:
         logging.error(f"query_llm_marked_response: Request failed: {e}")
         yield f"Error during request: {e}"
\ No newline at end of file
@@ -1,85 +1,203 @@
 import os
-from docx import Document
-import PyPDF2
+import re
+import asyncio
+import logging
+import threading
+from LLM_interface.config import get_setting
+from LLM_interface.embeddings import EMBED_MODEL, embed_text, embed_texts
+from Functions.content_index import get_content_index
+from Functions.extractors import extract_text, is_document, is_supported
+from Functions.extraction_pool import extract_many
+from Functions.summarize import CHARS_PER_TOKEN, chunk_text, estimate_tokens
 
+RAG_INDEX_DIR = get_setting("rag_index_dir", "RAG_INDEX_DIR", ".cache/rag")
+RAG_CHUNK_TOKENS = get_setting("rag_chunk_tokens", "RAG_CHUNK_TOKENS", 300, int)
+RAG_CHUNK_OVERLAP_TOKENS = get_setting("rag_chunk_overlap_tokens", "RAG_CHUNK_OVERLAP_TOKENS", 40, int)
+RAG_TOP_K = get_setting("rag_top_k", "RAG_TOP_K", 6, int)
+# Chunks less similar than this to the question are never sent to the model
+RAG_MIN_SCORE = get_setting("rag_min_score", "RAG_MIN_SCORE", 0.0, float)
+# Token budget for the retrieved excerpts in the final prompt
+RAG_CONTEXT_TOKENS = get_setting("rag_context_tokens", "RAG_CONTEXT_TOKENS", 3000, int)
+# Chunks embedded before they are written to the index, so a failure loses little work
+RAG_FLUSH_CHUNKS = 256
 
-def read_file(file_path, include_contents=False):
+SKIPPED_DIRECTORIES = {"__pycache__", "node_modules"}
+
+RAG_PROMPT_HEADER = (
+    "Answer the question using the excerpts below from files in {folder}. "
+    "Mention which files the answer comes from. If the excerpts do not contain the answer, say so.\n\n"
+)
+
+
+def chunk_document(text, max_tokens=RAG_CHUNK_TOKENS, overlap_tokens=RAG_CHUNK_OVERLAP_TOKENS):
     """
-    Reads the contents of a file or the structure of a folder from the given path.
-    Supports .docx (Word), .py (Python), and .pdf (PDF) files for file reading.
-
-    If the path is a folder, it lists all files and optionally reads their contents.
-    
-    Parameters:
-        file_path (str): Path to the file or folder.
-        include_contents (bool): Whether to include the contents of files when reading a folder.
-    
-    Returns:
-        dict or str: For folders, a dictionary with file paths as keys and contents (or None) as values.
-                     For files, the file content as a string.
+    Splits text into line-aligned chunks; each chunk repeats the tail of the previous one
+    so a sentence cut at a boundary is still retrievable.
     """
-    try:
-        # Check if the path is a folder
-        if os.path.isdir(file_path):
-            folder_structure = {}
-            for root, _, files in os.walk(file_path):
-                for file in files:
-                    abs_path = os.path.join(root, file)
-                    if include_contents:
-                        folder_structure[abs_path] = read_file(abs_path)  # Recursively read file contents
-                    else:
-                        folder_structure[abs_path] = None  # Only list the file path
-            return folder_structure
-        
-        # If the path is a file, read its content
-        if file_path.endswith(".docx"):
-            doc = Document(file_path)
-            return "\n".join([para.text for para in doc.paragraphs])
-        elif file_path.endswith(".pdf"):
-            pdf_text = ""
-            with open(file_path, "rb") as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                for page in pdf_reader.pages:
-                    pdf_text += page.extract_text()
-            return pdf_text.strip()
-        elif file_path.endswith(".py"):
-            with open(file_path, "r", encoding="utf-8") as file:
-                return file.read()
-        else:
-            return f"Unsupported file type for reading: {file_path}"
-    
-    except FileNotFoundError:
-        return f"Error: File not found at {file_path}"
-    except Exception as e:
-        return f"Error reading file: {e}"
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    chunks = []
+    previous = ""
+    for piece in chunk_text(text, max_tokens - overlap_tokens):
+        chunks.append(previous[-overlap_chars:] + piece if previous and overlap_chars else piece)
+        previous = piece
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def file_version(stat_result):
+    return f"{stat_result.st_mtime_ns}:{stat_result.st_size}"
+
 
+def supported_files(folder):
+    """
+    Returns {path: stat} for every readable file under folder, skipping hidden entries.
+    """
+    files = {}
+    for root, directories, names in os.walk(folder):
+        directories[:] = [name for name in directories if not name.startswith(".") and name not in SKIPPED_DIRECTORIES]
+        for name in names:
+            path = os.path.join(root, name)
+            if name.startswith(".") or not is_supported(path):
+                continue
+            try:
+                files[path] = os.stat(path)
+            except OSError as e:
+                logging.warning(f"supported_files: Skipping {path}: {e}")
+    return files
 
-def write_file(file_path, content):
+
+def load_texts(paths, stats):
     """
-    Writes or updates a file with the specified content.
-    Supports .docx (Word) and .py (Python) files.
+    Returns {path: text} using the content index first, reading text files inline and
+    extracting documents on the extraction pool. Files that fail are logged and left out.
     """
-    try:
-        if file_path.endswith(".docx"):
-            # Write to Word (.docx) file
-            doc = Document()
-            for line in content.split("\n"):
-                doc.add_paragraph(line)
-            doc.save(file_path)
-            return f"Word file successfully written to {file_path}"
-        
-        elif file_path.endswith(".py"):
-            # Write to Python (.py) file as plain text
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(content)
-            return f"Python file successfully written to {file_path}"
-        
-        elif file_path.endswith(".pdf"):
-            # PDF writing is not natively supported with PyPDF2, return an error
-            return "Error: Writing to PDF files is not supported."
-        
+    index = get_content_index()
+    texts = {}
+    documents = []
+    for path in paths:
+        cached = index.lookup(path, stats[path])
+        if cached is not None:
+            texts[path] = cached
+        elif is_document(path):
+            documents.append(path)
         else:
-            return f"Unsupported file type for writing: {file_path}"
-    
-    except Exception as e:
-        return f"Error writing file: {e}"
\ No newline at end of file
+            try:
+                texts[path] = extract_text(path)
+                index.store(path, texts[path], stats[path])
+            except Exception as e:
+                logging.error(f"load_texts: Error reading file {path}: {e}")
+    for path, text, error in extract_many(documents):
+        if error is not None:
+            logging.error(f"load_texts: Error reading file {path}: {error}")
+        elif text is not None:
+            texts[path] = text
+            index.store(path, text, stats[path])
+    return texts
+
+
+class RagIndex:
+    """
+    Retrieval over the files of local folders. Files are chunked, embedded through the backend
+    and kept in a VectorIndex keyed by path and versioned by mtime and size, so syncing a
+    folder only embeds new or changed files and drops deleted ones.
+    """
+
+    def __init__(self, directory=RAG_INDEX_DIR, embed_model=EMBED_MODEL):
+        from LLM_interface.vector_index import VectorIndex
+        self.embed_model = embed_model
+        self.index = VectorIndex(os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", embed_model)))
+        self.syncing = {}
+
+    async def sync_folder(self, folder, api_url=None):
+        """
+        Brings the index up to date with folder. Concurrent syncs of the same folder share one run.
+        """
+        folder = os.path.abspath(os.path.expanduser(folder))
+        task = self.syncing.get(folder)
+        if task is None:
+            task = self.syncing[folder] = asyncio.create_task(self._sync(folder, api_url))
+            task.add_done_callback(lambda _: self.syncing.pop(folder, None))
+        return await asyncio.shield(task)
+
+    async def _sync(self, folder, api_url):
+        files = await asyncio.to_thread(supported_files, folder)
+        indexed = set(await asyncio.to_thread(self.index.keys, folder + os.sep))
+        removed = indexed - set(files)
+        for path in removed:
+            await asyncio.to_thread(self.index.delete, path)
+        changed = await asyncio.to_thread(self._changed, files)
+        if changed:
+            logging.info(f"RagIndex: Embedding {len(changed)} new or changed files under {folder}.")
+            texts = await asyncio.to_thread(load_texts, changed, files)
+            batch = []
+            for path in changed:
+                if path not in texts:
+                    continue
+                batch.append((path, chunk_document(texts[path] or "")))
+                if sum(len(chunks) for _, chunks in batch) >= RAG_FLUSH_CHUNKS:
+                    await self._add(batch, files, api_url)
+                    batch = []
+            await self._add(batch, files, api_url)
+        return {"folder": folder, "files": len(files), "updated": len(changed), "removed": len(removed)}
+
+    def _changed(self, files):
+        # One index lookup per file, so this runs off the event loop
+        return [path for path, stat_result in files.items() if self.index.version(path) != file_version(stat_result)]
+
+    async def _add(self, batch, files, api_url):
+        all_chunks = [chunk for _, chunks in batch for chunk in chunks]
+        vectors = await embed_texts(all_chunks, api_url, self.embed_model) if all_chunks else []
+        offset = 0
+        for path, chunks in batch:
+            payloads = [{"path": path, "chunk": number, "text": chunk} for number, chunk in enumerate(chunks)]
+            await asyncio.to_thread(
+                self.index.add, path, vectors[offset:offset + len(chunks)], payloads, file_version(files[path])
+            )
+            offset += len(chunks)
+
+    async def delete_path(self, path):
+        return await asyncio.to_thread(self.index.delete, os.path.abspath(path))
+
+    async def search(self, question, folder=None, k=RAG_TOP_K, api_url=None):
+        """
+        Returns up to k {"path", "chunk", "text", "score"} hits, most similar first.
+        """
+        query = await embed_text(question, api_url, self.embed_model)
+        prefix = os.path.abspath(os.path.expanduser(folder)) + os.sep if folder else None
+        hits = await asyncio.to_thread(self.index.search, query, k, prefix, RAG_MIN_SCORE)
+        return [{**payload, "score": round(score, 4)} for score, _, payload in hits]
+
+    async def build_prompt(self, folder, question, api_url=None, k=RAG_TOP_K, budget_tokens=RAG_CONTEXT_TOKENS):
+        """
+        Syncs the folder, retrieves the chunks most relevant to question and returns a prompt
+        holding only those excerpts, within budget_tokens. Also returns the hits.
+        """
+        await self.sync_folder(folder, api_url)
+        hits = await self.search(question, folder, k, api_url)
+        sections = []
+        used = 0
+        for hit in hits:
+            section = f"### {os.path.relpath(hit['path'], folder)} (part {hit['chunk'] + 1})\n{hit['text']}"
+            if sections and used + estimate_tokens(section) > budget_tokens:
+                break
+            sections.append(section)
+            used += estimate_tokens(section)
+        prompt = (
+            RAG_PROMPT_HEADER.format(folder=folder) + "\n\n".join(sections) + f"\n\nQuestion: {question}"
+        )
+        return prompt, hits
+
+    def stats(self):
+        return {"embed_model": self.embed_model, **self.index.stats()}
+
+
+_rag_index = None
+_rag_index_lock = threading.Lock()
+
+
+def get_rag_index():
+    global _rag_index
+    with _rag_index_lock:
+        if _rag_index is None:
+            _rag_index = RagIndex()
+        return _rag_index
@@ -0,0 +1,185 @@
+import json
+import asyncio
+import hashlib
+import logging
+from LLM_interface.config import get_setting
+from LLM_interface.metrics import Counter, CallbackMetric
+
+SINGLE_FLIGHT_ENABLED = get_setting("single_flight_enabled", "SINGLE_FLIGHT_ENABLED", True,
+                                    lambda v: str(v).lower() in ("1", "true", "yes"))
+
+# The shared upstream is read at most this many chunks ahead of its slowest subscriber
+SINGLE_FLIGHT_MAX_AHEAD = get_setting("single_flight_max_ahead", "SINGLE_FLIGHT_MAX_AHEAD", 64, int)
+
+SINGLE_FLIGHT_REQUESTS = Counter(
+    "llm_single_flight_requests_total", "Generation requests by whether they started or joined an upstream call."
+)
+
+
+def flight_key(api_url, payload):
+    """
+    Identical generations share a key: same endpoint choice, model, prompt, system prompt,
+    context and options. keep_alive does not change the output and is left out.
+    """
+    material = {key: value for key, value in payload.items() if key != "keep_alive"}
+    material["api_url"] = api_url or ""
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class StreamFlight:
+    """
+    One upstream stream shared by every subscriber. Items are buffered so a late subscriber
+    replays the prefix before following live output. Reading is paced to the slowest active
+    subscriber: the pump waits while it is max_ahead items ahead of every one of them, so a
+    stalled client pauses the backend instead of letting the generation pile up in memory.
+    """
+
+    def __init__(self, key, source, max_ahead=SINGLE_FLIGHT_MAX_AHEAD):
+        self.key = key
+        self.source = source
+        self.max_ahead = max(1, max_ahead)
+        self.buffer = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.positions = {}
+        self.updated = asyncio.Event()
+        self.advanced = asyncio.Event()
+        self.task = None
+
+    def start(self, on_finish):
+        self.task = asyncio.create_task(self._pump(on_finish))
+
+    async def _pump(self, on_finish):
+        try:
+            async for item in self.source:
+                self.buffer.append(item)
+                self._notify()
+                while self.positions and len(self.buffer) - min(self.positions.values()) >= self.max_ahead:
+                    await self.advanced.wait()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            on_finish(self)
+            if hasattr(self.source, "aclose"):
+                await self.source.aclose()
+
+    def _notify(self):
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    def _advance(self):
+        self.advanced.set()
+        self.advanced = asyncio.Event()
+
+    async def follow(self):
+        reader = object()
+        self.positions[reader] = 0
+        index = 0
+        try:
+            while True:
+                if index < len(self.buffer):
+                    index += 1
+                    yield self.buffer[index - 1]
+                    # The subscriber asked for more, so it has consumed everything up to index
+                    self.positions[reader] = index
+                    self._advance()
+                    continue
+                if self.done:
+                    if self.error is not None and not isinstance(self.error, asyncio.CancelledError):
+                        raise self.error
+                    return
+                await self.updated.wait()
+        finally:
+            del self.positions[reader]
+            self._advance()
+
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight generations. The first request starts the upstream call;
+    identical requests arriving while it runs attach to it. The upstream call is cancelled only
+    when its last subscriber leaves. Finished flights are forgotten: this is not a cache.
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self.calls = {}
+
+    def stream(self, key, start_stream):
+        """
+        Returns an async generator over the shared stream for key. start_stream() creates the
+        upstream async iterator and is only called by the first subscriber.
+        """
+        return self._subscribe(key, start_stream)
+
+    async def _subscribe(self, key, start_stream):
+        flight = self.streams.get(key)
+        if flight is None:
+            flight = StreamFlight(key, start_stream())
+            self.streams[key] = flight
+            flight.start(self._finished)
+            SINGLE_FLIGHT_REQUESTS.inc(kind="stream", role="leader")
+        else:
+            SINGLE_FLIGHT_REQUESTS.inc(kind="stream", role="follower")
+            logging.info(f"SingleFlight: Joined in-flight stream with {len(flight.buffer)} buffered chunks.")
+        flight.subscribers += 1
+        try:
+            async for item in flight.follow():
+                yield item
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                logging.info("SingleFlight: Last subscriber left, cancelling upstream stream.")
+                self._finished(flight)
+                flight.task.cancel()
+
+    def _finished(self, flight):
+        if self.streams.get(flight.key) is flight:
+            del self.streams[flight.key]
+
+    async def call(self, key, start_call):
+        """
+        Awaits the shared result of start_call() for key. Cancelling one waiter leaves the
+        call running for the others; it is cancelled with its last waiter.
+        """
+        entry = self.calls.get(key)
+        if entry is None:
+            task = asyncio.create_task(start_call())
+            entry = self.calls[key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda _: self._call_finished(key, entry))
+            SINGLE_FLIGHT_REQUESTS.inc(kind="call", role="leader")
+        else:
+            SINGLE_FLIGHT_REQUESTS.inc(kind="call", role="follower")
+        entry["waiters"] += 1
+        try:
+            return await asyncio.shield(entry["task"])
+        finally:
+            entry["waiters"] -= 1
+            if entry["waiters"] == 0 and not entry["task"].done():
+                entry["task"].cancel()
+                self._call_finished(key, entry)
+
+    def _call_finished(self, key, entry):
+        if self.calls.get(key) is entry:
+            del self.calls[key]
+
+    def stats(self):
+        return {
+            "streams_in_flight": len(self.streams),
+            "stream_subscribers": sum(flight.subscribers for flight in self.streams.values()),
+            "calls_in_flight": len(self.calls),
+        }
+
+
+single_flight = SingleFlight()
+
+single_flight_in_flight = CallbackMetric(
+    "llm_single_flight_in_flight", "Shared upstream generations currently running.",
+    lambda: [({"kind": kind}, value) for kind, value in single_flight.stats().items()],
+)
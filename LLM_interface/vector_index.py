@@ -0,0 +1,210 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index on disk. Unit-normalized float32 vectors live in a memory-mapped
+    matrix (vectors.f32) that grows by doubling; row metadata lives in SQLite (index.sqlite3).
+    Rows are grouped by key (a file path, a cache namespace) so a key can be replaced or
+    deleted as a whole. Deleted rows are masked out of searches and reused by later adds.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                key TEXT,
+                payload TEXT,
+                alive INTEGER NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS rows_key ON rows(key)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, version TEXT)")
+        self.conn.commit()
+
+        dim = self._meta("dim")
+        self.dim = int(dim) if dim else None
+        self.count = self.conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+        self.vectors = None
+        self.alive = np.zeros(0, dtype=bool)
+        if self.dim:
+            self._open(max(INITIAL_CAPACITY, self.count))
+            alive_rows = [row for (row,) in self.conn.execute("SELECT row FROM rows WHERE alive = 1")]
+            self.alive[alive_rows] = True
+        logging.info(f"VectorIndex: Opened {directory} ({len(self)} vectors, dim={self.dim}).")
+
+    def __len__(self):
+        return int(self.alive[:self.count].sum())
+
+    def _meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _open(self, capacity):
+        """
+        Maps the vector file with room for capacity rows, growing the file if needed.
+        """
+        needed = capacity * self.dim * 4
+        if not os.path.exists(self.vectors_path) or os.path.getsize(self.vectors_path) < needed:
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(needed)
+        capacity = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        if self.vectors is not None:
+            self.vectors.flush()
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive[:capacity]
+        self.alive = alive
+
+    def version(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT version FROM keys WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def keys(self, prefix=""):
+        with self.lock:
+            return [key for (key,) in self.conn.execute("SELECT key FROM keys WHERE key LIKE ? ESCAPE '\\'", (_like_prefix(prefix),))]
+
+    def add(self, key, vectors, payloads, version=None):
+        """
+        Replaces the rows stored under key with the given vectors and JSON-serializable payloads.
+        """
+        if not payloads:
+            # Nothing to store (an empty file), but remember the version so it is not re-processed
+            with self.lock:
+                self._delete_locked(key)
+                self.conn.execute("INSERT OR REPLACE INTO keys VALUES (?, ?)", (key, version))
+                self.conn.commit()
+            return []
+        vectors = normalize_rows(vectors)
+        if len(vectors) != len(payloads):
+            raise ValueError("add: vectors and payloads differ in length.")
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                self._open(INITIAL_CAPACITY)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"add: Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}.")
+
+            self._delete_locked(key)
+            free = [row for (row,) in self.conn.execute("SELECT row FROM rows WHERE alive = 0 LIMIT ?", (len(vectors),))]
+            rows = free + list(range(self.count, self.count + len(vectors) - len(free)))
+            if rows and rows[-1] >= len(self.vectors):
+                self._open(max(len(self.vectors) * 2, rows[-1] + 1))
+            self.vectors[rows] = vectors
+            self.vectors.flush()
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO rows (row, key, payload, alive) VALUES (?, ?, ?, 1)",
+                [(row, key, json.dumps(payload)) for row, payload in zip(rows, payloads)],
+            )
+            self.conn.execute("INSERT OR REPLACE INTO keys VALUES (?, ?)", (key, version))
+            self.conn.commit()
+            self.alive[rows] = True
+            self.count = max(self.count, rows[-1] + 1) if rows else self.count
+            return rows
+
+    def delete(self, key):
+        with self.lock:
+            removed = self._delete_locked(key)
+            self.conn.commit()
+            return removed
+
+    def _delete_locked(self, key):
+        rows = [row for (row,) in self.conn.execute("SELECT row FROM rows WHERE key = ? AND alive = 1", (key,))]
+        if rows:
+            self.alive[rows] = False
+            self.conn.execute("UPDATE rows SET alive = 0, key = NULL, payload = NULL WHERE key = ?", (key,))
+        self.conn.execute("DELETE FROM keys WHERE key = ?", (key,))
+        return len(rows)
+
+    def search(self, query, k=5, prefix=None, min_score=None):
+        """
+        Returns up to k (score, key, payload) tuples by cosine similarity, best first.
+        prefix restricts the search to keys starting with it.
+        """
+        with self.lock:
+            if self.dim is None or self.count == 0:
+                return []
+            query = normalize_rows(query)[0]
+            if query.shape[0] != self.dim:
+                raise ValueError(f"search: Expected a {self.dim}-dimensional query, got {query.shape[0]}.")
+            if prefix:
+                candidates = np.array([row for (row,) in self.conn.execute(
+                    "SELECT row FROM rows WHERE alive = 1 AND key LIKE ? ESCAPE '\\'", (_like_prefix(prefix),)
+                )], dtype=np.int64)
+                if candidates.size == 0:
+                    return []
+                scores = self.vectors[candidates] @ query
+            else:
+                # One pass over the mapped matrix; deleted rows are masked afterwards
+                candidates = np.flatnonzero(self.alive[:self.count])
+                if candidates.size == 0:
+                    return []
+                scores = np.asarray(self.vectors[:self.count] @ query)[candidates]
+            k = min(k, candidates.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for index in top:
+                score = float(scores[index])
+                if min_score is not None and score < min_score:
+                    break
+                key, payload = self.conn.execute(
+                    "SELECT key, payload FROM rows WHERE row = ?", (int(candidates[index]),)
+                ).fetchone()
+                results.append((score, key, json.loads(payload)))
+            return results
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM rows")
+            self.conn.execute("DELETE FROM keys")
+            self.conn.execute("DELETE FROM meta")
+            self.conn.commit()
+            self.vectors = None
+            self.alive = np.zeros(0, dtype=bool)
+            self.dim = None
+            self.count = 0
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "vectors": len(self),
+                "keys": self.conn.execute("SELECT COUNT(*) FROM keys").fetchone()[0],
+                "dim": self.dim,
+                "capacity": 0 if self.vectors is None else len(self.vectors),
+            }
+
+
+def _like_prefix(prefix):
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
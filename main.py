@@ -1,17 +1,79 @@
 # uvicorn main:app --host 127.0.0.1 --port 8000 --reload
 
-import uvicorn
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import Response
+from fastapi.responses import Response, PlainTextResponse
+from fastapi.templating import Jinja2Templates
 from web_app.routes import router
+from LLM_interface.llm_client import close_client
+from LLM_interface.query_llm import MODEL_NAME, warm_model
+from LLM_interface.backend_pool import get_backend_pool
+from LLM_interface.config import get_setting
+from Functions.extraction_pool import shutdown_executor
+from Functions.model_tiers import router_state
+from LLM_interface.metrics import Gauge, render_metrics
+from LLM_interface.log_setup import configure_logging
+import asyncio
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+# Set up logging: queued, size-rotated server.log plus console
+configure_logging()
+
+STARTUP_SECONDS = Gauge("app_startup_seconds", "Time spent importing the app and running its startup hook.")
+FIRST_REQUEST_SECONDS = Gauge("app_first_request_seconds", "Latency of the first request served by this worker.")
+IMPORT_SECONDS = time.perf_counter() - _import_started
+STARTUP_SECONDS.set(IMPORT_SECONDS, phase="import")
+
+WARM_UP_ON_STARTUP = get_setting("warm_up_on_startup", "WARM_UP_ON_STARTUP", True,
+                                 lambda v: str(v).lower() in ("1", "true", "yes"))
+
+async def warm_up():
+    answer_model_warm = False
+    try:
+        await warm_model()
+        answer_model_warm = True
+    except Exception as e:
+        logging.warning(f"warm_up: Could not warm the model: {e}")
+    # The router answers every decision, so its copy of the decision prompt matters most
+    router = router_state.router_for(MODEL_NAME)
+    if router is not None:
+        try:
+            await warm_model(model_name=router)
+        except Exception as e:
+            logging.warning(f"warm_up: Could not warm the router model {router}: {e}")
+            if answer_model_warm:
+                # The backend is up but the router is not (typically not pulled): skip it from the first request
+                router_state.mark_unavailable(router)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Builds the per-process state once (templates, health checks, model warm-up) and tears it down on exit.
+    """
+    started = time.perf_counter()
+    app.state.templates = Jinja2Templates(directory="web_app/templates")
+    # Compile the page now rather than on the first visit
+    app.state.templates.get_template("index.html")
+    app.state.first_request_done = False
+    get_backend_pool().start_health_checks()
+    if WARM_UP_ON_STARTUP:
+        # In the background, so the server accepts requests while the model loads
+        app.state.warm_up_task = asyncio.create_task(warm_up())
+    startup_seconds = time.perf_counter() - started
+    STARTUP_SECONDS.set(startup_seconds, phase="lifespan")
+    logging.info(f"Application startup complete (imports {IMPORT_SECONDS * 1000:.0f} ms, startup {startup_seconds * 1000:.0f} ms).")
+    yield
+    await get_backend_pool().stop_health_checks()
+    await close_client()
+    shutdown_executor()
+    logging.info("Application shutdown.")
 
 # Initialize FastAPI app
-app = FastAPI(title="File Interaction Assistant API", version="1.0")
+app = FastAPI(title="File Interaction Assistant API", version="1.0", lifespan=lifespan)
 
 # Include the router
 app.include_router(router)
@@ -26,19 +88,26 @@ async def cache_headers(request: Request, call_next):
     Middleware to add Cache-Control headers to all HTTP responses.
     Prevents browsers from caching API responses or other dynamic content.
     """
+    started = time.perf_counter()
     response = await call_next(request)
     response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+    if not getattr(request.app.state, "first_request_done", True):
+        # Until the response headers, which is what a client waits for on a fresh worker
+        request.app.state.first_request_done = True
+        elapsed = time.perf_counter() - started
+        FIRST_REQUEST_SECONDS.set(elapsed, path=request.url.path)
+        logging.info(f"First request {request.method} {request.url.path} took {elapsed * 1000:.0f} ms.")
     return response
 
-@app.on_event("startup")
-async def startup_event():
-    logging.info("Application startup complete.")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    logging.info("Application shutdown.")
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, TTFT/TTFB, tokens/sec and cache counters.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
+    import uvicorn
     try:
         logging.info("Starting the server...")
         uvicorn.run(app, host="127.0.0.1", port=8000)
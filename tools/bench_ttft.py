@@ -0,0 +1,145 @@
+"""
+Measures decision-call TTFT against tools/mock_ollama.py, before and after backend cache reuse.
+
+baseline:  the old request shape: the function directive and user prompt in one flat prompt,
+           no keep_alive (the backend default applies) and no warm-up.
+optimized: the directive as a stable system prompt, keep_alive on every call and a warm-up
+           request at startup. Follow-up questions pass the returned context instead of
+           re-sending the conversation.
+
+Idle gaps between rounds are longer than the mock's default keep-alive, a scaled-down
+stand-in for Ollama's 5 minute default on a lightly used server.
+
+    python tools/bench_ttft.py --rounds 5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import mock_ollama
+from LLM_interface import llm_client
+from LLM_interface.query_llm import (
+    decision_prompt,
+    preprocess_prompt_with_functions,
+    stream_llm_decision,
+    query_llm_marked_response,
+    warm_model,
+)
+
+QUESTIONS = [
+    "What is the difference between a process and a thread?",
+    "Read /tmp/notes.txt",
+    "Explain how Python generators work.",
+    "List the folder /tmp/project",
+    "Why is the sky blue?",
+    "Write hello to /tmp/out.txt",
+]
+FOLLOW_UP = "Can you give a shorter version of that?"
+
+
+async def first_token_ms(tokens):
+    started = time.perf_counter()
+    try:
+        async for _ in tokens:
+            return (time.perf_counter() - started) * 1000
+    finally:
+        await tokens.aclose()
+
+
+async def baseline_decision(api_url, model, question):
+    payload = {"model": model, "prompt": preprocess_prompt_with_functions(question), "stream": True}
+
+    async def tokens():
+        async for line in llm_client.stream_lines(api_url, payload):
+            chunk = json.loads(line)
+            if chunk.get("response"):
+                yield chunk["response"]
+
+    return await first_token_ms(tokens())
+
+
+async def optimized_decision(api_url, model, question):
+    return await first_token_ms(stream_llm_decision(api_url, model, decision_prompt(question)))
+
+
+async def answer(api_url, model, prompt, context=None):
+    stats = {}
+    async for _ in query_llm_marked_response(api_url, model, prompt, stats=stats, context=context):
+        pass
+    return stats
+
+
+async def follow_up_ms(api_url, model, question, optimized):
+    stats = await answer(api_url, model, question)
+    started = time.perf_counter()
+    if optimized:
+        follow_up = query_llm_marked_response(api_url, model, FOLLOW_UP, context=stats.get("context"))
+    else:
+        # Without context reuse the whole conversation is sent again as text
+        conversation = f"{question}\n\n{mock_ollama.DEFAULT_ANSWER}\n\n{FOLLOW_UP}"
+        follow_up = query_llm_marked_response(api_url, model, conversation)
+    async for _ in follow_up:
+        break
+    await follow_up.aclose()
+    return (time.perf_counter() - started) * 1000
+
+
+async def run(mode, api_url, model, rounds, idle):
+    optimized = mode == "optimized"
+    if optimized:
+        await warm_model(api_url, model)
+    decisions, follow_ups = [], []
+    for round_index in range(rounds):
+        if round_index:
+            await asyncio.sleep(idle)
+        question = QUESTIONS[round_index % len(QUESTIONS)]
+        decide = optimized_decision if optimized else baseline_decision
+        decisions.append(await decide(api_url, model, question))
+        follow_ups.append(await follow_up_ms(api_url, model, question, optimized))
+    return {"decision_ttft_ms": summarize(decisions), "follow_up_ttft_ms": summarize(follow_ups)}
+
+
+def summarize(values):
+    return {
+        "mean": round(statistics.mean(values), 1),
+        "p50": round(statistics.median(values), 1),
+        "max": round(max(values), 1),
+        "samples": [round(value, 1) for value in values],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--idle", type=float, default=1.5, help="seconds between rounds")
+    parser.add_argument("--default-keep-alive", type=float, default=1.0, help="mock keep-alive when none is sent")
+    parser.add_argument("--load-ms", type=float, default=800.0)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=11436)
+    args = parser.parse_args()
+
+    model = "bench-model"
+    results = {}
+    for offset, mode in enumerate(("baseline", "optimized")):
+        # A fresh mock per mode, so both start with the model unloaded
+        port = args.port + offset
+        server, _ = mock_ollama.start(
+            port, load_ms=args.load_ms, prefill_ms_per_token=args.prefill_ms_per_token,
+            decode_ms_per_token=1.0, default_keep_alive=args.default_keep_alive,
+        )
+        try:
+            results[mode] = await run(mode, f"http://127.0.0.1:{port}/api/generate", model, args.rounds, args.idle)
+        finally:
+            server.shutdown()
+    await llm_client.close_client()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
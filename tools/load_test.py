@@ -0,0 +1,315 @@
+"""
+End-to-end load test for POST /handle-prompt/.
+
+Runs a mixed workload at a fixed concurrency and prints one JSON report: throughput, latency
+and time-to-first-byte percentiles, status codes and errors, overall and per workload, so two
+runs can be compared with a diff or jq.
+
+Workloads:
+  general      general questions (the decision plus a streamed answer)
+  handle_path  a bare path to a file or folder in a synthetic tree (routed without the model)
+  list_folder  "list <folder>" on a synthetic tree (folder explanation)
+  ask_path     a question naming a synthetic folder, which the model has to route
+
+By default the mock backend (tools/mock_ollama.py) and the app (uvicorn main:app) are started
+here, so no GPU is involved:
+
+    python tools/load_test.py --concurrency 16 --requests 400 --mix general=6,handle_path=2,list_folder=2
+    python tools/load_test.py --app-url http://127.0.0.1:8000 --api-url http://gpu-box:11434/api/generate
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools import mock_ollama
+
+QUESTIONS = [
+    "What is the difference between a process and a thread?",
+    "Explain how Python generators work.",
+    "Why is the sky blue?",
+    "How does a hash map handle collisions?",
+    "What does the GIL do in CPython?",
+    "Summarize the CAP theorem.",
+    "When should I use a linked list instead of an array?",
+    "How do TCP retransmissions work?",
+]
+DEFAULT_MIX = "general=6,handle_path=2,list_folder=1,ask_path=1"
+FILE_TEXT = "def handler(event):\n    return {'status': 'ok', 'event': event}\n\n"
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"general", "handle_path", "list_folder", "ask_path"}
+    if unknown:
+        raise SystemExit(f"Unknown workloads: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def build_trees(root, trees, files_per_tree, depth):
+    """
+    Creates synthetic project folders and returns [(folder, [file paths])].
+    """
+    result = []
+    for tree in range(trees):
+        folder = os.path.join(root, f"project_{tree}")
+        paths = []
+        for index in range(files_per_tree):
+            directory = os.path.join(folder, *[f"pkg_{(index + level) % 3}" for level in range(index % (depth + 1))])
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"module_{index}.py" if index % 4 else f"notes_{index}.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(FILE_TEXT * (1 + index % 8))
+            paths.append(path)
+        result.append((folder, paths))
+    return result
+
+
+def make_prompt(workload, trees, rng, sequence, unique):
+    if workload == "general":
+        prompt = rng.choice(QUESTIONS)
+        return f"{prompt} (request {sequence})" if unique else prompt
+    folder, files = rng.choice(trees)
+    if workload == "handle_path":
+        return rng.choice([folder] + files)
+    if workload == "list_folder":
+        return f"list {folder}"
+    return f"Can you explain what the project in {folder} does?"
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(p):
+        # Nearest-rank percentile
+        return round(ordered[max(0, min(len(ordered) - 1, int(-(-p * len(ordered) // 100)) - 1))], 1)
+
+    return {
+        "min": round(ordered[0], 1),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": round(ordered[-1], 1),
+        "mean": round(sum(ordered) / len(ordered), 1),
+    }
+
+
+async def send(client, app_url, form, sse):
+    """
+    Posts one prompt and reads the whole response. Returns a result dict with status,
+    ttfb_ms, latency_ms and error (None when the request succeeded).
+    """
+    headers = {"Accept": "text/event-stream" if sse else "application/json"}
+    started = time.perf_counter()
+    ttfb = None
+    body = []
+    try:
+        async with client.stream("POST", f"{app_url}/handle-prompt/", data=form, headers=headers) as response:
+            async for chunk in response.aiter_text():
+                if ttfb is None and chunk:
+                    ttfb = (time.perf_counter() - started) * 1000
+                body.append(chunk)
+            status = response.status_code
+    except httpx.HTTPError as e:
+        return {"status": None, "ttfb_ms": ttfb, "latency_ms": (time.perf_counter() - started) * 1000,
+                "error": type(e).__name__}
+    text = "".join(body)
+    error = None
+    if status == 429:
+        error = "rejected"
+    elif status != 200:
+        error = f"http_{status}"
+    elif "event: error" in text or "<p>Error" in text:
+        error = "app_error"
+    return {"status": status, "ttfb_ms": ttfb, "latency_ms": (time.perf_counter() - started) * 1000, "error": error}
+
+
+async def run_load(args, trees):
+    weights = parse_mix(args.mix)
+    names = list(weights)
+    rng = random.Random(args.seed)
+    results = []
+    sequence = 0
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    def next_job():
+        nonlocal sequence
+        if deadline is None and sequence >= args.requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        sequence += 1
+        workload = rng.choices(names, weights=[weights[name] for name in names])[0]
+        form = {"user_prompt": make_prompt(workload, trees, rng, sequence, args.unique_prompts),
+                "use_cache": str(args.answer_cache).lower()}
+        if args.api_url:
+            form["api_url"] = args.api_url
+        if args.model:
+            form["model_name"] = args.model
+        return workload, form
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        async def worker():
+            while True:
+                job = next_job()
+                if job is None:
+                    return
+                workload, form = job
+                result = await send(client, args.app_url, form, args.sse)
+                result["workload"] = workload
+                results.append(result)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def summarize(results, elapsed=None):
+    ok = [result for result in results if result["error"] is None]
+    errors = {}
+    statuses = {}
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+        if result["error"]:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    summary = {
+        "requests": len(results),
+        "ok": len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "status_codes": statuses,
+        "latency_ms": percentiles([result["latency_ms"] for result in ok]),
+        "ttfb_ms": percentiles([result["ttfb_ms"] for result in ok if result["ttfb_ms"] is not None]),
+    }
+    if elapsed is not None:
+        summary["duration_s"] = round(elapsed, 2)
+        summary["throughput_rps"] = round(len(ok) / elapsed, 2) if elapsed else 0.0
+    return summary
+
+
+def wait_for_app(app_url, process, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"The app exited with code {process.returncode} during startup.")
+        try:
+            if httpx.get(f"{app_url}/metrics", timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"The app did not come up at {app_url} within {timeout:.0f}s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-url", help="an already running app; by default uvicorn main:app is started")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--api-url", help="backend generate URL sent with each prompt; by default the mock's")
+    parser.add_argument("--model", help="model_name sent with each prompt")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--duration", type=float, help="run for this many seconds instead of a request count")
+    parser.add_argument("--warmup", type=int, default=0, help="requests sent and discarded before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="workload=weight,... (general, handle_path, list_folder, ask_path)")
+    parser.add_argument("--sse", action="store_true", help="request Server-Sent Events like the chat page")
+    parser.add_argument("--unique-prompts", action="store_true", help="make every general question distinct")
+    parser.add_argument("--answer-cache", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--trees", type=int, default=4)
+    parser.add_argument("--tree-files", type=int, default=40)
+    parser.add_argument("--tree-depth", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--mock-port", type=int, default=11437)
+    parser.add_argument("--mock-ttft-ms", type=float, default=100.0)
+    parser.add_argument("--mock-tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-load-ms", type=float, default=500.0)
+    parser.add_argument("--mock-decision", help="canned decision JSON for every decision call")
+    args = parser.parse_args()
+
+    mock = None
+    if not args.api_url:
+        server, mock = mock_ollama.start(
+            args.mock_port, load_ms=args.mock_load_ms, ttft_ms=args.mock_ttft_ms,
+            decode_ms_per_token=1000 / args.mock_tokens_per_sec, error_rate=args.mock_error_rate,
+            decision=args.mock_decision, seed=args.seed,
+        )
+        args.api_url = f"http://127.0.0.1:{args.mock_port}/api/generate"
+
+    process = None
+    if not args.app_url:
+        # The app reads LLM_interface/config.json as usual; prompts carry api_url, so they reach the mock
+        args.app_url = f"http://127.0.0.1:{args.app_port}"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.app_port), "--log-level", "warning"],
+            cwd=ROOT,
+        )
+
+    tree_root = tempfile.mkdtemp(prefix="load_test_trees_")
+    try:
+        if process is not None:
+            wait_for_app(args.app_url, process)
+        trees = build_trees(tree_root, args.trees, args.tree_files, args.tree_depth)
+        if args.warmup:
+            measured = args.requests
+            args.requests = args.warmup
+            asyncio.run(run_load(args, trees))
+            args.requests = measured
+        results, elapsed = asyncio.run(run_load(args, trees))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        shutil.rmtree(tree_root, ignore_errors=True)
+
+    report = {
+        "config": {
+            "app_url": args.app_url,
+            "api_url": args.api_url,
+            "concurrency": args.concurrency,
+            "mix": parse_mix(args.mix),
+            "sse": args.sse,
+            "answer_cache": args.answer_cache,
+            "mock": None if mock is None else {
+                "ttft_ms": mock.ttft_ms, "tokens_per_sec": args.mock_tokens_per_sec,
+                "error_rate": mock.error_rate, "load_ms": mock.load_ms,
+            },
+        },
+        **summarize(results, elapsed),
+        "by_workload": {
+            name: summarize([result for result in results if result["workload"] == name])
+            for name in sorted({result["workload"] for result in results})
+        },
+    }
+    if mock is not None:
+        report["backend_requests"] = len(mock.requests)
+        report["backend_injected_errors"] = mock.errors
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Ollama stand-in for benchmarks and local development.
+
+It models the costs that matter for latency work: loading the model (and unloading it once
+keep_alive expires), prefilling only the part of the prompt that is not already in a slot's
+KV cache, and a fixed time per generated token. Decision prompts get a decision JSON back
+(a canned one, or one routing any absolute path in the prompt to handle_path/list_folder),
+everything else gets a short Markdown answer. /api/embed returns deterministic bag-of-words
+vectors, so paraphrases score close to each other. A share of requests can be failed with
+HTTP 500 to exercise error handling.
+
+    python tools/mock_ollama.py --port 11435 --tokens-per-sec 40 --ttft-ms 200 --error-rate 0.01
+"""
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_DECISION = '{"function": ["general_question"], "parameters": [{"general_question": "Explain it briefly."}]}'
+PATH_PATTERN = re.compile(r"(?<![\w.])(/[^\s'\"`,;]+)")
+LIST_WORDS = re.compile(r"\b(list|folder|directory|tree|project|explain)\b", re.IGNORECASE)
+STOP_WORDS = {"a", "an", "the", "is", "are", "what", "how", "please", "me", "tell", "of", "to", "and", "in", "do", "does"}
+DEFAULT_ANSWER = (
+    "# Answer\n"
+    "Here is a **short** answer with `inline code`. The details follow in a few points, each "
+    "long enough that a follow-up question re-sending this text costs a noticeable prefill.\n"
+    "- first point: what the thing is and where it is used in practice\n"
+    "- second point: how it works under the hood, step by step\n"
+    "- third point: the trade-offs compared to the usual alternatives\n"
+    "```python\nfor item in range(3):\n    print('hello', item)\n```\n"
+    "In short, it depends on the workload, but the defaults are a sensible place to start.\n"
+)
+
+
+def tokenize(text):
+    # Roughly one token per 4 characters, like the estimate used in Functions/summarize.py
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def embed(text, dim):
+    """
+    Hashed bag-of-words vector, unit length. Texts sharing most words get a high cosine similarity.
+    """
+    vector = [0.0] * dim
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word not in STOP_WORDS:
+            vector[int(hashlib.md5(word.rstrip("s").encode()).hexdigest(), 16) % dim] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def routed_decision(user_prompt):
+    """
+    A decision for prompts that name a path: list_folder when the wording asks about a folder,
+    handle_path otherwise. None when the prompt has no absolute path.
+    """
+    match = PATH_PATTERN.search(user_prompt)
+    if not match:
+        return None
+    path = match.group(1).rstrip(".?!)")
+    function = "list_folder" if LIST_WORDS.search(user_prompt) else "handle_path"
+    return json.dumps({"function": [function], "parameters": [{"path": path}]})
+
+
+def parse_duration(value, default):
+    """
+    Parses an Ollama keep_alive value ("30m", "10s", 300, -1) into seconds; negative means forever.
+    """
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"\s*(-?[\d.]+)\s*(ms|s|m|h)?\s*", str(value))
+    if not match:
+        return default
+    number, unit = float(match.group(1)), match.group(2) or "s"
+    return number * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+
+
+class MockModel:
+    """
+    One loaded model: a few KV-cache slots, each remembering the last token sequence it processed.
+    A request goes to the slot sharing the longest prefix with it and only prefills the rest.
+    """
+
+    def __init__(self, slots):
+        self.slots = [[] for _ in range(slots)]
+        self.last_used = [0.0] * slots
+        self.expires_at = None
+        self.lock = threading.Lock()
+
+    def loaded(self, now):
+        return self.expires_at is not None and (self.expires_at < 0 or now < self.expires_at)
+
+    def claim_slot(self, sequence):
+        # Longest shared prefix wins; ties go to the least recently used slot
+        with self.lock:
+            best, best_shared = 0, -1
+            for index, cached in enumerate(self.slots):
+                shared = 0
+                for a, b in zip(cached, sequence):
+                    if a != b:
+                        break
+                    shared += 1
+                if shared > best_shared or (shared == best_shared and self.last_used[index] < self.last_used[best]):
+                    best, best_shared = index, shared
+            self.last_used[best] = time.monotonic()
+            return best, best_shared
+
+
+class MockOllama:
+    def __init__(self, load_ms=1500.0, prefill_ms_per_token=0.5, decode_ms_per_token=5.0,
+                 default_keep_alive=300.0, slots=4, decision=None, answer=DEFAULT_ANSWER,
+                 ttft_ms=0.0, error_rate=0.0, embed_dim=64, embed_ms_per_input=1.0, seed=None,
+                 model_decisions=None):
+        """
+        decision is a fixed decision JSON string; None routes prompts naming a path and
+        answers everything else with DEFAULT_DECISION. model_decisions maps model names to
+        their own fixed decision, for example a router model that produces invalid output.
+        """
+        self.load_ms = load_ms
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.decode_ms_per_token = decode_ms_per_token
+        self.default_keep_alive = default_keep_alive
+        self.slot_count = slots
+        self.decision = decision
+        self.model_decisions = model_decisions or {}
+        self.answer = answer
+        self.ttft_ms = ttft_ms
+        self.error_rate = error_rate
+        self.embed_dim = embed_dim
+        self.embed_ms_per_input = embed_ms_per_input
+        self.random = random.Random(seed)
+        self.errors = 0
+        # Streams the client closed before the end, and the answer tokens it never had to generate
+        self.abandoned = 0
+        self.tokens_abandoned = 0
+        self.models = {}
+        self.vocab = {}
+        self.words = []
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def encode(self, tokens):
+        with self.lock:
+            ids = []
+            for token in tokens:
+                if token not in self.vocab:
+                    self.vocab[token] = len(self.words)
+                    self.words.append(token)
+                ids.append(self.vocab[token])
+            return ids
+
+    def decode(self, ids):
+        with self.lock:
+            return [self.words[i] for i in ids if 0 <= i < len(self.words)]
+
+    def model(self, name):
+        with self.lock:
+            if name not in self.models:
+                self.models[name] = MockModel(self.slot_count)
+            return self.models[name]
+
+    def sequence(self, payload):
+        """
+        The token sequence the backend would evaluate: the returned context of an earlier call,
+        or the templated system prompt, followed by the new prompt.
+        """
+        prompt_tokens = tokenize(f"<user>{payload.get('prompt', '')}</user>")
+        if payload.get("context"):
+            return self.decode(payload["context"]) + prompt_tokens
+        system = payload.get("system")
+        prefix = tokenize(f"<system>{system}</system>") if system else []
+        return prefix + prompt_tokens
+
+    def reply_for(self, payload):
+        text = f"{payload.get('system', '')}{payload.get('prompt', '')}"
+        if "multi-functional" not in text:
+            return self.answer
+        if payload.get("model") in self.model_decisions:
+            return self.model_decisions[payload["model"]]
+        if self.decision is not None:
+            return self.decision
+        user_prompt = payload.get("prompt", "").split("User Prompt:", 1)[-1]
+        return routed_decision(user_prompt) or DEFAULT_DECISION
+
+    def reply_tokens(self, payload):
+        max_tokens = (payload.get("options") or {}).get("num_predict")
+        reply = tokenize(self.reply_for(payload))
+        if max_tokens is not None and max_tokens >= 0:
+            reply = reply[:max_tokens]
+        return reply
+
+    def should_fail(self):
+        with self.lock:
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def embed(self, payload):
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.requests.append(payload)
+        time.sleep(len(inputs) * self.embed_ms_per_input / 1000)
+        return {"model": payload.get("model", ""), "embeddings": [embed(text, self.embed_dim) for text in inputs]}
+
+    def generate(self, payload):
+        """
+        Yields (text, final_stats) pairs; final_stats is set only on the last item.
+        """
+        started = time.perf_counter()
+        self.requests.append(payload)
+        model = self.model(payload.get("model", ""))
+        keep_alive = parse_duration(payload.get("keep_alive"), self.default_keep_alive)
+
+        load_seconds = 0.0
+        now = time.monotonic()
+        if not model.loaded(now):
+            time.sleep(self.load_ms / 1000)
+            load_seconds = self.load_ms / 1000
+            model.slots = [[] for _ in range(self.slot_count)]
+            model.last_used = [0.0] * self.slot_count
+
+        # Like Ollama, the keep-alive timer restarts with every request
+        model.expires_at = -1 if keep_alive < 0 else time.monotonic() + keep_alive
+
+        sequence = self.sequence(payload)
+        slot, shared = model.claim_slot(sequence)
+        prefill_tokens = len(sequence) - shared
+        time.sleep(prefill_tokens * self.prefill_ms_per_token / 1000 + self.ttft_ms / 1000)
+
+        reply = self.reply_tokens(payload)
+        decode_started = time.perf_counter()
+        for token in reply:
+            time.sleep(self.decode_ms_per_token / 1000)
+            yield token, None
+
+        final_sequence = sequence + reply
+        model.slots[slot] = final_sequence
+        model.expires_at = -1 if keep_alive < 0 else time.monotonic() + keep_alive
+        yield "", {
+            "done": True,
+            "context": self.encode(final_sequence),
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": prefill_tokens,
+            "prompt_eval_duration": int(prefill_tokens * self.prefill_ms_per_token * 1e6),
+            "eval_count": len(reply),
+            "eval_duration": int((time.perf_counter() - decode_started) * 1e9),
+        }
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, body, status=200):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_chunk(self, data):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path.startswith("/api/tags"):
+                self.send_json({"models": [{"name": name} for name in mock.models]})
+            else:
+                self.send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self.send_json({"error": "invalid JSON"}, 400)
+                return
+            if not self.path.startswith(("/api/generate", "/api/embed")):
+                self.send_json({"error": "not found"}, 404)
+                return
+            if mock.should_fail():
+                self.send_json({"error": "mock backend failure"}, 500)
+                return
+            if self.path.startswith("/api/embed"):
+                self.send_json(mock.embed(payload))
+                return
+
+            model = payload.get("model", "")
+            if not payload.get("stream", True):
+                text = []
+                for token, final in mock.generate(payload):
+                    text.append(token)
+                self.send_json({"model": model, "response": "".join(text), **final})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            sent = 0
+            try:
+                for token, final in mock.generate(payload):
+                    sent += final is None
+                    chunk = {"model": model, "response": token, "done": False} if final is None else {"model": model, "response": "", **final}
+                    self.send_chunk((json.dumps(chunk) + "\n").encode())
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading, as the decision stream does once the object is complete.
+                # Like Ollama, generation stops with it.
+                with mock.lock:
+                    mock.abandoned += 1
+                    mock.tokens_abandoned += max(0, len(mock.reply_tokens(payload)) - sent)
+
+    return Handler
+
+
+def start(port=11435, host="127.0.0.1", **options):
+    """
+    Starts the mock in a background thread and returns (server, mock).
+    """
+    mock = MockOllama(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, mock
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--load-ms", type=float, default=1500.0)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.5)
+    parser.add_argument("--decode-ms-per-token", type=float, default=5.0)
+    parser.add_argument("--tokens-per-sec", type=float, help="overrides --decode-ms-per-token")
+    parser.add_argument("--ttft-ms", type=float, default=0.0, help="extra delay before the first token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--decision", help="canned decision JSON, or @file to read it from a file")
+    parser.add_argument("--embed-dim", type=int, default=64)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--default-keep-alive", type=float, default=300.0, help="seconds, used when a request sends none")
+    parser.add_argument("--slots", type=int, default=4)
+    args = parser.parse_args()
+
+    decision = args.decision
+    if decision and decision.startswith("@"):
+        with open(decision[1:], "r", encoding="utf-8") as f:
+            decision = f.read()
+    if decision:
+        json.loads(decision)
+    decode_ms_per_token = 1000 / args.tokens_per_sec if args.tokens_per_sec else args.decode_ms_per_token
+
+    server, _ = start(
+        args.port, args.host, load_ms=args.load_ms, prefill_ms_per_token=args.prefill_ms_per_token,
+        decode_ms_per_token=decode_ms_per_token, default_keep_alive=args.default_keep_alive, slots=args.slots,
+        ttft_ms=args.ttft_ms, error_rate=args.error_rate, decision=decision, embed_dim=args.embed_dim, seed=args.seed,
+    )
+    print(f"Mock Ollama listening on http://{args.host}:{args.port}/api/generate (and /api/embed, /api/tags)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Cold start report for a freshly spawned worker.
+
+Each run starts `uvicorn main:app` and measures:
+  ready_ms            process spawn until the port accepts connections (imports plus lifespan)
+  first/second page   GET / on the new worker, then again
+  first/second prompt POST /handle-prompt/ answered by tools/mock_ollama.py, then again
+The app's own app_startup_seconds (import, lifespan) and app_first_request_seconds gauges are read
+from /metrics, and `python -X importtime` lists the slowest imports. The report is JSON, with the
+median of all runs.
+
+    python tools/startup_timing.py --runs 3 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools import mock_ollama
+
+PROMPT = "Why is the sky blue?"
+
+
+def import_times(top):
+    """
+    Returns the slowest imports of main by cumulative time, from python -X importtime.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative) / 1000, name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(ms, 1)} for ms, name in rows[:top]]
+
+
+def wait_for_port(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"The app exited with code {process.returncode} during startup.")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.01)
+    raise SystemExit(f"The app did not listen on port {port} within {timeout:.0f}s.")
+
+
+def timed(method, url, **kwargs):
+    started = time.perf_counter()
+    response = httpx.request(method, url, timeout=120.0, **kwargs)
+    response.raise_for_status()
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def scrape(app_url, names):
+    values = {}
+    for line in httpx.get(f"{app_url}/metrics", timeout=10.0).text.splitlines():
+        if line.startswith(names):
+            key, _, value = line.rpartition(" ")
+            values[key] = round(float(value) * 1000, 1)
+    return values
+
+
+def run_once(port, api_url):
+    app_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], cwd=ROOT,
+    )
+    try:
+        wait_for_port(port, process, 60.0)
+        result = {"ready_ms": round((time.perf_counter() - started) * 1000, 1)}
+        result["first_page_ms"] = timed("GET", f"{app_url}/")
+        result["second_page_ms"] = timed("GET", f"{app_url}/")
+        form = {"user_prompt": PROMPT, "api_url": api_url, "use_cache": "false"}
+        result["first_prompt_ms"] = timed("POST", f"{app_url}/handle-prompt/", data=form)
+        result["second_prompt_ms"] = timed("POST", f"{app_url}/handle-prompt/", data=form)
+        result["app_metrics_ms"] = scrape(app_url, ("app_startup_seconds", "app_first_request_seconds"))
+        return result
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--mock-port", type=int, default=11438)
+    parser.add_argument("--top-imports", type=int, default=15)
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    # A mock without load or decode cost, so the prompt timings show the app's own first-request overhead
+    mock_ollama.start(args.mock_port, load_ms=0, prefill_ms_per_token=0, decode_ms_per_token=0)
+    api_url = f"http://127.0.0.1:{args.mock_port}/api/generate"
+
+    runs = [run_once(args.port, api_url) for _ in range(args.runs)]
+    keys = [key for key in runs[0] if key != "app_metrics_ms"]
+    report = {
+        "runs": runs,
+        "median": {key: round(statistics.median(run[key] for run in runs), 1) for key in keys},
+        "slowest_imports": import_times(args.top_imports),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
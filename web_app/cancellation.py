@@ -0,0 +1,196 @@
+import uuid
+import asyncio
+import logging
+from LLM_interface.config import get_setting
+from LLM_interface.metrics import CallbackMetric, Counter
+
+# Answer length assumed for a model until completed answers have been seen
+CANCEL_EXPECTED_ANSWER_TOKENS = get_setting("cancel_expected_answer_tokens", "CANCEL_EXPECTED_ANSWER_TOKENS", 400, int)
+# Weight of the newest completed answer in the running average of answer lengths
+CANCEL_ANSWER_TOKENS_ALPHA = 0.1
+
+REQUESTS_CANCELLED = Counter("llm_requests_cancelled_total", "Requests stopped early, by reason and stage.")
+CANCEL_TOKENS_GENERATED = Counter(
+    "llm_cancel_tokens_generated_total", "Answer tokens generated for requests that were then cancelled."
+)
+CANCEL_TOKENS_SAVED = Counter(
+    "llm_cancel_tokens_saved_total", "Estimated answer tokens the backend did not generate because of a cancel."
+)
+
+_END = object()
+
+
+class RequestCancelled(Exception):
+    def __init__(self, reason):
+        super().__init__(f"Request cancelled ({reason}).")
+        self.reason = reason
+
+
+class CancelHandle:
+    """
+    The cancel state of one request. cancel() may come from the cancel endpoint or from the
+    disconnect watcher; the first reason wins.
+    """
+
+    def __init__(self, request_id):
+        self.id = request_id
+        self.reason = None
+        self.event = asyncio.Event()
+        self.watcher = None
+        # Admission ticket, so GET /requests/{id} can report the queue position
+        self.ticket = None
+
+    @property
+    def cancelled(self):
+        return self.reason is not None
+
+    def cancel(self, reason):
+        if self.reason is None:
+            self.reason = reason
+            self.event.set()
+            logging.info(f"CancelHandle: Request {self.id} cancelled ({reason}).")
+
+    def watch_disconnect(self, request):
+        """
+        Waits for http.disconnect in the background. The form body has been read by now, so the
+        next message the server delivers is the disconnect.
+        """
+        async def watch():
+            while True:
+                message = await request.receive()
+                if message["type"] == "http.disconnect":
+                    self.cancel("disconnect")
+                    return
+
+        self.watcher = asyncio.create_task(watch())
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.cancel()
+
+
+class CancelRegistry:
+    """
+    Requests in flight by request id, so POST /requests/{id}/cancel can reach them.
+    """
+
+    def __init__(self):
+        self.handles = {}
+        self.answer_tokens = {}
+
+    def register(self, request_id=None):
+        handle = CancelHandle(request_id or uuid.uuid4().hex)
+        self.handles[handle.id] = handle
+        return handle
+
+    def release(self, handle):
+        handle.close()
+        if self.handles.get(handle.id) is handle:
+            del self.handles[handle.id]
+
+    def cancel(self, request_id, reason="client"):
+        handle = self.handles.get(request_id)
+        if handle is None:
+            return False
+        handle.cancel(reason)
+        return True
+
+    def record_answer(self, model, tokens):
+        """
+        Tracks a running average of completed answer lengths, used to estimate tokens saved.
+        """
+        previous = self.answer_tokens.get(model)
+        if previous is None:
+            self.answer_tokens[model] = float(tokens)
+        else:
+            self.answer_tokens[model] = previous + CANCEL_ANSWER_TOKENS_ALPHA * (tokens - previous)
+
+    def record_cancel(self, reason, stage, model, tokens_generated=0):
+        """
+        Counts a cancel. The backend stops when its stream is closed, so the tokens saved are the
+        expected answer length minus what was already generated.
+        """
+        REQUESTS_CANCELLED.inc(reason=reason, stage=stage, model=model)
+        expected = self.answer_tokens.get(model, CANCEL_EXPECTED_ANSWER_TOKENS)
+        saved = max(0, round(expected) - tokens_generated)
+        CANCEL_TOKENS_GENERATED.inc(tokens_generated, model=model)
+        CANCEL_TOKENS_SAVED.inc(saved, model=model)
+        logging.info(
+            f"CancelRegistry: {stage} cancelled ({reason}) after {tokens_generated} tokens, about {saved} tokens saved."
+        )
+
+
+cancel_registry = CancelRegistry()
+
+requests_in_flight = CallbackMetric(
+    "llm_requests_cancellable", "Requests in flight that can be cancelled by id.", lambda: len(cancel_registry.handles)
+)
+
+
+async def first_or_cancel(awaitable, handle):
+    """
+    Awaits awaitable unless the request is cancelled first, in which case the work is cancelled
+    and RequestCancelled is raised.
+    """
+    task = asyncio.ensure_future(awaitable)
+    waiter = asyncio.ensure_future(handle.event.wait())
+    try:
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            raise RequestCancelled(handle.reason)
+        return task.result()
+    finally:
+        waiter.cancel()
+        if not task.done():
+            task.cancel()
+
+
+async def cancellable(events, handle, on_cancel=None):
+    """
+    Forwards an async iterator, consumed in a task of its own so a cancel interrupts it at
+    whatever it is waiting on, including an upstream read. Cancelling closes the upstream
+    response, and closing it is what stops the backend generating. After an explicit cancel
+    on_cancel(reason) may return a last item for the client; a disconnected client gets nothing.
+    """
+    queue = asyncio.Queue(maxsize=1)
+
+    async def pump():
+        try:
+            async for item in events:
+                await queue.put((item, None))
+        except Exception as e:
+            await queue.put((None, e))
+            return
+        finally:
+            # A cancel can land while the producer waits on the queue, outside the iterator
+            if hasattr(events, "aclose"):
+                await events.aclose()
+        await queue.put((_END, None))
+
+    producer = asyncio.create_task(pump())
+    waiter = asyncio.ensure_future(handle.event.wait())
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                break
+            item, error = getter.result()
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+        if on_cancel is not None and handle.reason != "disconnect":
+            yield on_cancel(handle.reason)
+    finally:
+        waiter.cancel()
+        if not producer.done():
+            producer.cancel()
@@ -1,57 +1,257 @@
 from fastapi import APIRouter, HTTPException, Request, Form
 from fastapi.responses import StreamingResponse, JSONResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
+import json
+import time
 import asyncio
 import logging
+from html import escape
 from Functions.functions import llm_decision
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    filename="server.log",
-    filemode="a",
-)
+from Functions.decision_cache import decision_cache
+from Functions.model_tiers import router_state
+from Functions.answer_cache import get_answer_cache
+from Functions.sessions import session_store
+from LLM_interface.backend_pool import get_backend_pool
+from LLM_interface.admission import QueueFull, get_admission_queue, admission_stats
+from LLM_interface.query_llm import MODEL_NAME
+from LLM_interface.metrics import observe_stage, record_error
+from web_app.streaming import StreamMetrics, coalesce, sse_event
+from web_app.cancellation import RequestCancelled, cancel_registry, cancellable, first_or_cancel
 
 router = APIRouter()
 router.mount("/static", StaticFiles(directory="web_app/static"), name="static")
 
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    from fastapi.templating import Jinja2Templates
-    templates = Jinja2Templates(directory="web_app/templates")
-    return templates.TemplateResponse("index.html", {"request": request})
+    # Built once in the app's lifespan hook
+    return request.app.state.templates.TemplateResponse(request, "index.html")
+
+def decision_html(decision):
+    # Same fallback chat.js uses for JSON responses without html_response
+    return decision.get("html_response") or f"<pre>{escape(json.dumps(decision.get('detailed_info', {}), indent=2))}</pre>"
+
+async def decide_with_progress(**kwargs):
+    """
+    Runs llm_decision and yields ("progress", (event, html)) for partial output as it arrives,
+    then ("decision", decision). Progress may be reported from worker threads.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    task = asyncio.create_task(
+        llm_decision(**kwargs, progress=lambda event, html: loop.call_soon_threadsafe(queue.put_nowait, (event, html)))
+    )
+    try:
+        while not task.done():
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield "progress", getter.result()
+            else:
+                getter.cancel()
+        while not queue.empty():
+            yield "progress", queue.get_nowait()
+        yield "decision", task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+
+def cancelled_response(request_id, reason):
+    return JSONResponse(
+        headers={"X-Request-ID": request_id},
+        content={"html_response": "<p>Request cancelled.</p>", "detailed_info": {"cancelled": reason}},
+    )
+
+def streamed_tokens(metrics):
+    return metrics.backend_stats.get("tokens", 0) if metrics is not None else 0
+
+def busy_response(error):
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(error.retry_after)},
+        content={
+            "html_response": f"<p>The server is busy. Please retry in {error.retry_after} seconds.</p>",
+            "detailed_info": {"retry_after": error.retry_after},
+        },
+    )
 
 @router.post("/handle-prompt/", response_class=JSONResponse)
 async def handle_prompt(
+    request: Request,
     user_prompt: str = Form(...),
     api_url: str = Form(None),
-    model_name: str = Form(None)
+    model_name: str = Form(None),
+    priority: int = Form(0),
+    use_cache: bool = Form(True),
+    session_id: str = Form(None),
+    request_id: str = Form(None)
 ):
-    # Pass the api_url and model_name down to llm_decision
-    decision = llm_decision(user_prompt, api_url=api_url, model_name=model_name)
+    started_at = time.perf_counter()
+    model = model_name or MODEL_NAME
+    session = session_store.get(session_id) if session_id else None
+    try:
+        ticket = get_admission_queue(model).enqueue(priority)
+    except QueueFull as e:
+        logging.warning(f"handle_prompt: Rejecting request, {e}")
+        return busy_response(e)
+
+    # Cancelled by POST /requests/{id}/cancel or when the client goes away
+    handle = cancel_registry.register(request_id)
+    handle.watch_disconnect(request)
+    handle.ticket = ticket
+
+    if "text/event-stream" in request.headers.get("accept", ""):
+        async def stream_events():
+            metrics = None
+            stage = "queue"
+            try:
+                yield sse_event(json.dumps({"request_id": handle.id}), event="request")
+                # Queued clients see their position instead of a static placeholder
+                async for position in ticket.positions():
+                    yield sse_event(json.dumps({"position": position}), event="queue")
+                stage = "decision"
+                yield sse_event("Thinking...", event="status")
+                # Pass the api_url and model_name down to llm_decision
+                decision = None
+                async for kind, value in decide_with_progress(
+                    user_prompt=user_prompt, api_url=api_url, model_name=model_name, use_cache=use_cache, session=session
+                ):
+                    if kind == "progress":
+                        # Partial output, such as the folder outline, is shown while the answer is prepared
+                        yield sse_event(value[1], event=value[0])
+                    else:
+                        decision = value
+                if "stream_generator" not in decision:
+                    yield sse_event(decision_html(decision), event="html")
+                    yield sse_event(json.dumps({"total_ms": round((time.perf_counter() - started_at) * 1000, 1)}), event="done")
+                    observe_stage("request", time.perf_counter() - started_at, model=model)
+                    return
+                stage = "answer"
+                metrics = StreamMetrics(started_at, decision.get("stream_stats"), model=model)
+                async for chunk in coalesce(decision["stream_generator"]):
+                    metrics.record(chunk)
+                    yield sse_event(chunk, event="html")
+                yield sse_event(json.dumps(metrics.summary()), event="done")
+            except (asyncio.CancelledError, GeneratorExit):
+                cancel_registry.record_cancel(handle.reason or "disconnect", stage, model, streamed_tokens(metrics))
+                raise
+            except Exception as e:
+                record_error("stream", model=model)
+                logging.error(f"handle_prompt: Error during streaming: {e}")
+                yield sse_event(f"<p>Error: {str(e)}</p>", event="error")
+            finally:
+                ticket.release()
+                cancel_registry.release(handle)
+                if metrics is not None:
+                    metrics.log("handle_prompt")
+
+        return StreamingResponse(
+            cancellable(stream_events(), handle, on_cancel=lambda reason: sse_event(reason, event="cancelled")),
+            media_type="text/event-stream",
+            headers={"X-Accel-Buffering": "no", "X-Request-ID": handle.id},
+        )
+
+    stage = "queue"
+    try:
+        await first_or_cancel(ticket.wait(), handle)
+        stage = "decision"
+        # Pass the api_url and model_name down to llm_decision
+        decision = await first_or_cancel(
+            llm_decision(user_prompt, api_url=api_url, model_name=model_name, use_cache=use_cache, session=session),
+            handle,
+        )
+    except RequestCancelled as e:
+        ticket.release()
+        cancel_registry.release(handle)
+        cancel_registry.record_cancel(e.reason, stage, model)
+        return cancelled_response(handle.id, e.reason)
+    except BaseException:
+        ticket.release()
+        cancel_registry.release(handle)
+        raise
 
     if "stream_generator" in decision:
         logging.info("handle_prompt: Streaming response detected.")
+        metrics = StreamMetrics(started_at, decision.get("stream_stats"), model=model)
 
         async def stream_response():
             try:
-                # Before actual chunks, yield "Thinking..."
+                # Before actual chunks, yield "Thinking..."; the queue wait is over by now and
+                # plain clients poll GET /requests/{id} for their position while it lasts
                 yield "Thinking..."
-                # After "Thinking..." is shown, stream the actual response word by word
-                for chunk in decision["stream_generator"]:
-                    words = chunk.split()
-                    for word in words:
-                        yield f"{word} "
-                        await asyncio.sleep(0.01)
+                # Chunks are forwarded as soon as they are rendered
+                async for chunk in coalesce(decision["stream_generator"]):
+                    metrics.record(chunk)
+                    yield chunk
                 logging.info("handle_prompt: Finished streaming all chunks.")
+            except (asyncio.CancelledError, GeneratorExit):
+                cancel_registry.record_cancel(handle.reason or "disconnect", "answer", model, streamed_tokens(metrics))
+                raise
             except Exception as e:
+                record_error("stream", model=metrics.model)
                 logging.error(f"handle_prompt: Error during streaming: {e}")
                 yield f"<p>Error: {str(e)}</p>"
+            finally:
+                ticket.release()
+                cancel_registry.release(handle)
+                metrics.log("handle_prompt")
 
-        return StreamingResponse(stream_response(), media_type="text/html")
+        return StreamingResponse(
+            cancellable(stream_response(), handle, on_cancel=lambda reason: "<p>Request cancelled.</p>"),
+            media_type="text/html",
+            headers={"X-Request-ID": handle.id},
+        )
     else:
+        ticket.release()
+        cancel_registry.release(handle)
         logging.info("handle_prompt: Returning normal JSON response.")
+        observe_stage("request", time.perf_counter() - started_at, model=model)
         return JSONResponse(content={
             "html_response": decision.get("html_response", ""),
             "detailed_info": decision.get("detailed_info", {})
-        })
\ No newline at end of file
+        })
+
+@router.get("/requests/{request_id}", response_class=JSONResponse)
+async def request_status(request_id: str):
+    # Non-SSE responses only start once a slot is granted, so queued clients poll here instead
+    handle = cancel_registry.handles.get(request_id)
+    if handle is None:
+        raise HTTPException(status_code=404, detail="Unknown or finished request")
+    ticket = handle.ticket
+    position = ticket.queue.position(ticket) if ticket is not None else 0
+    return JSONResponse(content={"request_id": request_id, "queued": position > 0, "position": position})
+
+@router.post("/requests/{request_id}/cancel", response_class=JSONResponse)
+async def cancel_request(request_id: str):
+    if not cancel_registry.cancel(request_id):
+        raise HTTPException(status_code=404, detail="Unknown or finished request")
+    return JSONResponse(content={"cancelled": request_id})
+
+@router.get("/decision-cache/stats", response_class=JSONResponse)
+async def decision_cache_stats():
+    return JSONResponse(content=decision_cache.stats())
+
+@router.get("/decision-tiers/stats", response_class=JSONResponse)
+async def decision_tier_stats():
+    return JSONResponse(content=router_state.stats())
+
+@router.get("/answer-cache/stats", response_class=JSONResponse)
+async def answer_cache_stats():
+    return JSONResponse(content=get_answer_cache().stats())
+
+@router.get("/sessions/stats", response_class=JSONResponse)
+async def sessions_stats():
+    return JSONResponse(content=session_store.stats())
+
+@router.delete("/sessions/{session_id}", response_class=JSONResponse)
+async def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown session")
+    return JSONResponse(content={"deleted": session_id})
+
+@router.get("/backends/stats", response_class=JSONResponse)
+async def backend_stats():
+    return JSONResponse(content=get_backend_pool().stats())
+
+@router.get("/admission/stats", response_class=JSONResponse)
+async def admission_queue_stats():
+    return JSONResponse(content=admission_stats())
@@ -15,6 +15,104 @@ function copyToClipboard(content) {
         });
 }
 
+function escapeHtml(text) {
+    const div = document.createElement("div");
+    div.innerText = text;
+    return div.innerHTML;
+}
+
+function newId() {
+    // randomUUID only exists in secure contexts (https or localhost)
+    return window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// One server-side session per tab, so follow-up questions keep their context
+function sessionId() {
+    let id = sessionStorage.getItem('sessionId');
+    if (!id) {
+        id = newId();
+        sessionStorage.setItem('sessionId', id);
+    }
+    return id;
+}
+
+// The request being answered, so the Stop button can cancel it on the server
+let currentRequestId = null;
+const stopButton = document.getElementById("stop-button");
+
+stopButton.addEventListener("click", () => {
+    if (!currentRequestId) return;
+    fetch(`/requests/${encodeURIComponent(currentRequestId)}/cancel`, { method: "POST" })
+        .catch((err) => console.error("Failed to cancel request:", err));
+});
+
+function parseSseEvent(rawEvent) {
+    let event = "message";
+    const data = [];
+    for (const line of rawEvent.split("\n")) {
+        if (line.startsWith("event:")) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+            data.push(line.slice(5).replace(/^ /, ""));
+        }
+    }
+    return { event, data: data.join("\n") };
+}
+
+async function renderEventStream(response, botMessage, chatWindow) {
+    // The server sends partial HTML fragments, so the whole answer is re-rendered from one string
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder("utf-8");
+    let pending = "";
+    let html = "";
+    let outline = null;
+    let cancelled = false;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        pending += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = pending.indexOf("\n\n")) !== -1) {
+            const { event, data } = parseSseEvent(pending.slice(0, boundary));
+            pending = pending.slice(boundary + 2);
+
+            if (event === "status") {
+                botMessage.innerHTML = `<span>${data}</span>`;
+            } else if (event === "queue") {
+                const { position } = JSON.parse(data);
+                botMessage.innerHTML = `<span>Waiting in queue (position ${position})...</span>`;
+            } else if (event === "outline") {
+                // Folder outline fragments are appended as they arrive, above the answer
+                if (!outline) {
+                    outline = document.createElement("div");
+                    outline.classList.add("message", "bot", "folder-outline");
+                    chatWindow.insertBefore(outline, botMessage);
+                }
+                outline.insertAdjacentHTML("beforeend", data);
+            } else if (event === "outline_reset") {
+                // The decision was escalated and the outline so far belonged to a discarded step
+                if (outline) {
+                    outline.remove();
+                    outline = null;
+                }
+            } else if (event === "html" || event === "error") {
+                html += data;
+                botMessage.innerHTML = html;
+            } else if (event === "cancelled") {
+                cancelled = true;
+            } else if (event === "done" && DEBUG_MODE) {
+                console.debug("Stream metrics:", JSON.parse(data));
+            }
+            chatWindow.scrollTop = chatWindow.scrollHeight;
+        }
+    }
+    return cancelled;
+}
+
 document.getElementById("chat-form").addEventListener("submit", async (event) => {
     event.preventDefault();
 
@@ -67,46 +165,43 @@ document.getElementById("chat-form").addEventListener("submit", async (event) =>
 
     const api = localStorage.getItem('apiUrl') || '';
     const model = localStorage.getItem('modelName') || '';
+    const useCache = localStorage.getItem('useCache') !== 'false';
+    const requestId = newId();
+    currentRequestId = requestId;
+    stopButton.style.display = "";
+    let cancelled = false;
 
     try {
         const response = await fetch("/handle-prompt/", {
             method: "POST",
             headers: {
                 "Content-Type": "application/x-www-form-urlencoded",
+                "Accept": "text/event-stream, application/json",
             },
-            body: `user_prompt=${encodeURIComponent(inputValue)}&api_url=${encodeURIComponent(api)}&model_name=${encodeURIComponent(model)}`,
+            body: `user_prompt=${encodeURIComponent(inputValue)}&api_url=${encodeURIComponent(api)}&model_name=${encodeURIComponent(model)}&use_cache=${useCache}&session_id=${encodeURIComponent(sessionId())}&request_id=${encodeURIComponent(requestId)}`,
         });
 
+        if (response.status === 429) {
+            const retryAfter = response.headers.get("Retry-After") || "a few";
+            botMessage.innerHTML = `<span>The server is busy. Please retry in ${escapeHtml(retryAfter)} seconds.</span>`;
+            return;
+        }
         if (!response.ok) {
             throw new Error(`Server returned status ${response.status}`);
         }
 
-        // Initially set to empty
-        botMessage.innerHTML = "";
-
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder("utf-8");
-        let isFirstChunk = true;
-
-        while (true) {
-            const { value, done } = await reader.read();
-            if (done) break;
-
-            if (value) {
-                const chunk = decoder.decode(value, { stream: true });
-                if (isFirstChunk) {
-                    // The first chunk might be "Thinking..."
-                    // Clear the bot message and then append
-                    botMessage.innerHTML = "";
-                    isFirstChunk = false;
-                }
-                // Append the chunk in a span for proper alignment
-                botMessage.innerHTML += `<span>${chunk}</span>`;
-                chatWindow.scrollTop = chatWindow.scrollHeight;
-            }
+        const contentType = response.headers.get("Content-Type") || "";
+        if (contentType.includes("application/json")) {
+            const data = await response.json();
+            botMessage.innerHTML = data.html_response || `<pre>${escapeHtml(JSON.stringify(data.detailed_info, null, 2))}</pre>`;
+            cancelled = Boolean(data.detailed_info && data.detailed_info.cancelled);
+        } else {
+            cancelled = await renderEventStream(response, botMessage, chatWindow);
         }
 
-        botMessage.innerHTML += "<br><span class='response-complete'>Response complete.</span>";
+        botMessage.innerHTML += cancelled
+            ? "<br><span class='response-complete'>Response cancelled.</span>"
+            : "<br><span class='response-complete'>Response complete.</span>";
     } catch (error) {
         console.error("Error during fetch:", error);
         const errorMessage = document.createElement("div");
@@ -114,6 +209,10 @@ document.getElementById("chat-form").addEventListener("submit", async (event) =>
         errorMessage.innerText = "Error: Unable to process your request.";
         chatWindow.appendChild(errorMessage);
     } finally {
+        if (currentRequestId === requestId) {
+            currentRequestId = null;
+            stopButton.style.display = "none";
+        }
         resetInputHeight();
         chatWindow.scrollTop = chatWindow.scrollHeight;
     }
@@ -141,6 +240,13 @@ userInput.addEventListener("keydown", (event) => {
     }
 });
 
+document.getElementById("new-chat").addEventListener("click", () => {
+    fetch(`/sessions/${encodeURIComponent(sessionId())}`, { method: "DELETE" })
+        .catch((err) => console.error("Failed to delete session:", err));
+    sessionStorage.removeItem('sessionId');
+    document.getElementById("chat-window").innerHTML = "";
+});
+
 window.addEventListener("error", (event) => {
     if (DEBUG_MODE) console.error("Uncaught error:", event.message);
 });
@@ -200,6 +306,7 @@ function updateModelHistoryList() {
 
 changeModelButton.addEventListener('click', () => {
     updateModelHistoryList();
+    document.getElementById('cache-input').checked = localStorage.getItem('useCache') !== 'false';
     modelModal.style.display = 'flex';
 });
 
@@ -208,6 +315,7 @@ closeModelButton.addEventListener('click', () => {
 });
 
 saveModelSettingsButton.addEventListener('click', () => {
+    localStorage.setItem('useCache', document.getElementById('cache-input').checked);
     const apiInput = document.getElementById('api-input').value.trim();
     const modelInput = document.getElementById('model-input').value.trim();
     if (apiInput && modelInput) {
@@ -0,0 +1,146 @@
+import json
+import time
+import asyncio
+import logging
+from LLM_interface.config import get_setting
+from web_app.cancellation import cancel_registry
+from LLM_interface.metrics import TTFB_SECONDS, TTFT_SECONDS, TOKENS_PER_SECOND, STREAM_TOKENS, observe_stage
+
+# Coalescing: flush once this many bytes are buffered or the oldest buffered chunk is this old
+STREAM_COALESCE_BYTES = get_setting("stream_coalesce_bytes", "STREAM_COALESCE_BYTES", 256, int)
+STREAM_COALESCE_MS = get_setting("stream_coalesce_ms", "STREAM_COALESCE_MS", 25.0, float)
+# Chunks buffered between the backend reader and the client writer before the reader pauses
+STREAM_QUEUE_SIZE = get_setting("stream_queue_size", "STREAM_QUEUE_SIZE", 64, int)
+
+_END = object()
+
+
+def sse_event(data: str, event: str = None) -> str:
+    """
+    Formats one Server-Sent Event. Multi-line data is split over several data: fields.
+    """
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+class StreamMetrics:
+    """
+    Per-stream timing: time to first byte sent to the client and backend tokens/sec.
+    """
+
+    def __init__(self, started_at=None, backend_stats=None, model=""):
+        self.started_at = started_at or time.perf_counter()
+        self.backend_stats = backend_stats if backend_stats is not None else {}
+        self.model = model
+        self.first_byte_at = None
+        self.bytes_sent = 0
+        self.chunks_sent = 0
+
+    def record(self, chunk: str):
+        if self.first_byte_at is None:
+            self.first_byte_at = time.perf_counter()
+        self.bytes_sent += len(chunk)
+        self.chunks_sent += 1
+
+    def summary(self):
+        now = time.perf_counter()
+        stats = self.backend_stats
+        tokens = stats.get("eval_count", stats.get("tokens", 0))
+        if stats.get("eval_duration"):
+            tokens_per_sec = tokens / (stats["eval_duration"] / 1e9)
+        elif stats.get("first_token_at"):
+            elapsed = stats.get("finished_at", now) - stats["first_token_at"]
+            tokens_per_sec = tokens / elapsed if elapsed > 0 else 0.0
+        else:
+            tokens_per_sec = 0.0
+        return {
+            "ttfb_ms": round((self.first_byte_at - self.started_at) * 1000, 1) if self.first_byte_at else None,
+            "ttft_ms": round((stats["first_token_at"] - self.started_at) * 1000, 1) if stats.get("first_token_at") else None,
+            "total_ms": round((now - self.started_at) * 1000, 1),
+            "tokens": tokens,
+            # Small on session follow-ups that reuse the backend context
+            "prompt_tokens": stats.get("prompt_eval_count"),
+            "tokens_per_sec": round(tokens_per_sec, 1),
+            "bytes": self.bytes_sent,
+            "chunks": self.chunks_sent,
+        }
+
+    def log(self, label: str):
+        """
+        Logs the summary and exports it to /metrics. Call once, when the stream ends.
+        """
+        summary = self.summary()
+        if summary["ttfb_ms"] is not None:
+            TTFB_SECONDS.observe(summary["ttfb_ms"] / 1000, model=self.model)
+        if summary["ttft_ms"] is not None:
+            TTFT_SECONDS.observe(summary["ttft_ms"] / 1000, model=self.model)
+        if summary["tokens"]:
+            TOKENS_PER_SECOND.observe(summary["tokens_per_sec"], model=self.model)
+            STREAM_TOKENS.inc(summary["tokens"], model=self.model)
+            if "finished_at" in self.backend_stats:
+                # Completed answers calibrate the tokens-saved estimate for cancelled ones
+                cancel_registry.record_answer(self.model, summary["tokens"])
+        observe_stage("request", summary["total_ms"] / 1000, model=self.model)
+        logging.info(f"{label}: Stream finished {json.dumps(summary)}")
+
+
+async def coalesce(source, min_bytes=STREAM_COALESCE_BYTES, max_delay_ms=STREAM_COALESCE_MS, queue_size=STREAM_QUEUE_SIZE):
+    """
+    Forwards chunks from an async iterator, merging small ones by size or age.
+    The first chunk is forwarded immediately. The reader runs ahead of the writer by at most
+    queue_size chunks, so a slow client pauses reading from the backend instead of buffering it all.
+    """
+    queue = asyncio.Queue(maxsize=queue_size)
+
+    async def pump():
+        try:
+            async for chunk in source:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_END)
+
+    reader = asyncio.create_task(pump())
+    max_delay = max_delay_ms / 1000
+    buffered = []
+    buffered_bytes = 0
+    first = True
+    try:
+        while True:
+            if buffered:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=max(0.0, flush_at - time.perf_counter()))
+                except asyncio.TimeoutError:
+                    yield "".join(buffered)
+                    buffered, buffered_bytes = [], 0
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if first or min_bytes <= 0:
+                first = False
+                yield item
+                continue
+            if not buffered:
+                flush_at = time.perf_counter() + max_delay
+            buffered.append(item)
+            buffered_bytes += len(item)
+            if buffered_bytes >= min_bytes:
+                yield "".join(buffered)
+                buffered, buffered_bytes = [], 0
+        if buffered:
+            yield "".join(buffered)
+    finally:
+        reader.cancel()
+        try:
+            await reader
+        except asyncio.CancelledError:
+            pass
+        if hasattr(source, "aclose"):
+            await source.aclose()